@@ -0,0 +1,63 @@
+"""
+Loading synthetic catalogs into a MemoryRepository, one add_game at a time
+against load_games, which populate uses and which sorts once at the end.
+
+Run from the project directory:
+    python -m benchmarks.bulk_load
+"""
+import random
+from time import perf_counter
+
+from games.adapters.repository.memoryrepo import MemoryRepository
+from games.domainmodel.model import Game, Genre, Publisher
+
+SIZES = (10_000, 100_000, 1_000_000)
+# one at a time is quadratic, bigger catalogs take too long
+ONE_AT_A_TIME_LIMIT = 100_000
+
+GENRES = [Genre(f"genre{number}") for number in range(30)]
+PUBLISHERS = [Publisher(f"publisher{number}") for number in range(5000)]
+
+
+def make_games(count: int) -> list[Game]:
+    rng = random.Random(count)
+    games = []
+    for game_id in rng.sample(range(count * 10), count):
+        game = Game(game_id, f"title {rng.random():.12f}")
+        game.add_genre(rng.choice(GENRES))
+        game.add_genre(rng.choice(GENRES))
+        game.publisher = rng.choice(PUBLISHERS)
+        games.append(game)
+    return games
+
+
+def one_at_a_time(repo: MemoryRepository, games: list[Game]):
+    for game in games:
+        repo.add_game(game)
+        for genre in game.genres:
+            repo.add_genre(genre)
+        repo.add_publisher(game.publisher)
+
+
+def seconds(load, games: list[Game]) -> float:
+    repo = MemoryRepository()
+    started = perf_counter()
+    load(repo, games)
+    elapsed = perf_counter() - started
+    assert repo.get_number_of_games() == len(games)
+    return elapsed
+
+
+def main():
+    for size in SIZES:
+        games = make_games(size)
+        bulk = seconds(lambda repo, games: repo.load_games(games), games)
+        line = f"{size:>9} games   load_games: {bulk:6.2f}s"
+        if size <= ONE_AT_A_TIME_LIMIT:
+            single = seconds(one_at_a_time, games)
+            line += f"   add_game each: {single:6.2f}s   ({single / bulk:.1f}x)"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
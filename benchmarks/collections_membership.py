@@ -0,0 +1,55 @@
+"""
+Cost of filling and emptying 10k-element domain collections, a plain list
+with an `in` check before each write against the OrderedSet they now use.
+
+Run from the project directory:
+    python -m benchmarks.collections_membership
+"""
+import timeit
+
+from games.domainmodel.model import Game, OrderedSet, Review, User
+
+SIZE = 10_000
+REPEAT = 1
+
+
+def fill_and_empty_list(items: list):
+    collection = []
+    for item in items:
+        if item not in collection:
+            collection.append(item)
+    for item in items:
+        if item in collection:
+            collection.remove(item)
+
+
+def fill_and_empty_ordered_set(items: list):
+    collection = OrderedSet()
+    for item in items:
+        if item not in collection:
+            collection.append(item)
+    for item in items:
+        if item in collection:
+            collection.remove(item)
+
+
+def time_per_item(run, items: list) -> float:
+    seconds = timeit.timeit(lambda: run(items), number=REPEAT)
+    return seconds / (REPEAT * len(items))
+
+
+def main():
+    user = User("reviewer", "password1")
+    games = [Game(game_id, f"game{game_id}") for game_id in range(SIZE)]
+    reviews = [Review(user, game, 5, "good") for game in games]
+
+    print(f"{SIZE} elements, add each then remove each")
+    for name, items in (("games (wishlist)", games), ("reviews", reviews)):
+        list_cost = time_per_item(fill_and_empty_list, items)
+        set_cost = time_per_item(fill_and_empty_ordered_set, items)
+        print(f"{name:<17} list: {list_cost * 1e9:10.0f} ns/item   "
+              f"OrderedSet: {set_cost * 1e9:6.0f} ns/item   ({list_cost / set_cost:.0f}x)")
+
+
+if __name__ == '__main__':
+    main()
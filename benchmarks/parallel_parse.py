@@ -0,0 +1,47 @@
+"""
+Parsing the catalog with one worker against several, on copies of the bundled
+csv with new AppIDs. A speedup needs as many free cores as workers, the parent
+still unpickles and interns every game the workers send back.
+
+Run from the project directory:
+    python -m benchmarks.parallel_parse
+"""
+import os
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from benchmarks.snapshot_load import write_catalog
+from games.adapters.datareader.csvdatareader import GameFileCSVReader
+
+COPIES = (10, 50)
+WORKERS = (1, 2, 4)
+REPEAT = 3
+
+
+def best_of(csv_path: Path, workers: int) -> float:
+    times = []
+    for _ in range(REPEAT):
+        started = perf_counter()
+        for _ in GameFileCSVReader(csv_path).iter_games(workers):
+            pass
+        times.append(perf_counter() - started)
+    return min(times)
+
+
+def main():
+    print(f"{os.cpu_count()} cpus")
+    with tempfile.TemporaryDirectory() as directory:
+        for copies in COPIES:
+            csv_path = Path(directory) / f"games{copies}.csv"
+            write_catalog(csv_path, copies)
+            games = sum(1 for _ in GameFileCSVReader(csv_path).iter_games())
+
+            sequential = best_of(csv_path, 1)
+            timings = "   ".join(f"{workers} workers: {best_of(csv_path, workers):6.3f}s"
+                                 for workers in WORKERS if workers > 1)
+            print(f"{games:>7} games   1 worker: {sequential:6.3f}s   {timings}")
+
+
+if __name__ == '__main__':
+    main()
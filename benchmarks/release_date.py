@@ -0,0 +1,46 @@
+"""
+Per-row cost of parsing release dates, strptime against the cached parser.
+
+Run from the project directory:
+    python -m benchmarks.release_date
+"""
+import csv
+import timeit
+from datetime import datetime
+
+from games.domainmodel.model import RELEASE_DATE_FORMAT, parse_release_date
+from utils import get_project_root
+
+REPEAT = 20
+
+
+def load_release_dates() -> list[str]:
+    path = get_project_root() / "games" / "adapters" / "data" / "games.csv"
+    with open(path, 'r', encoding='utf-8-sig') as file:
+        return [row["Release date"] for row in csv.DictReader(file)]
+
+
+def time_per_row(parse, dates: list[str]) -> float:
+    seconds = timeit.timeit(lambda: [parse(date) for date in dates], number=REPEAT)
+    return seconds / (REPEAT * len(dates))
+
+
+def main():
+    dates = load_release_dates()
+
+    strptime_cost = time_per_row(lambda date: datetime.strptime(date, RELEASE_DATE_FORMAT), dates)
+
+    # uncached fast path, every date parsed from scratch
+    uncached_cost = time_per_row(parse_release_date.__wrapped__, dates)
+
+    parse_release_date.cache_clear()
+    cached_cost = time_per_row(parse_release_date, dates)
+
+    print(f"{len(dates)} rows, {len(set(dates))} distinct dates")
+    print(f"strptime:            {strptime_cost * 1e9:8.0f} ns/row")
+    print(f"fast path, no cache: {uncached_cost * 1e9:8.0f} ns/row")
+    print(f"fast path, cached:   {cached_cost * 1e9:8.0f} ns/row")
+
+
+if __name__ == '__main__':
+    main()
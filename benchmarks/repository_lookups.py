@@ -0,0 +1,60 @@
+"""
+Point lookups in a MemoryRepository of 1M games and 1M users: the dict
+indexes it uses now against binary searching a sorted list with a throwaway
+domain object, the way it used to.
+
+Run from the project directory:
+    python -m benchmarks.repository_lookups
+"""
+import random
+import timeit
+from bisect import bisect_left
+
+from games.adapters.repository.memoryrepo import MemoryRepository
+from games.domainmodel.model import Game, User
+
+SIZE = 1_000_000
+LOOKUPS = 100_000
+REPEAT = 3
+
+
+def bisect_game(games: list, game_id: int):
+    target_game = Game(game_id, "")
+    index = bisect_left(games, target_game)
+    return games[index] if index < len(games) and games[index] == target_game else None
+
+
+def bisect_user(users: list, username: str):
+    target_user = User(username, 'dummy_password')
+    index = bisect_left(users, target_user)
+    return users[index] if index < len(users) and users[index] == target_user else None
+
+
+def time_per_lookup(lookup, keys: list) -> float:
+    seconds = timeit.timeit(lambda: [lookup(key) for key in keys], number=REPEAT)
+    return seconds / (REPEAT * len(keys))
+
+
+def main():
+    games = [Game(game_id, f"game{game_id}") for game_id in range(SIZE)]
+    users = [User(f"user{number:07}", "password1") for number in range(SIZE)]
+    repo = MemoryRepository(games=list(games), users=users)
+
+    game_ids = random.sample(range(SIZE), LOOKUPS)
+    usernames = [f"user{number:07}" for number in random.sample(range(SIZE), LOOKUPS)]
+    titles = [f"GAME{game_id}" for game_id in game_ids]
+
+    print(f"{SIZE} games and users, {LOOKUPS} random lookups")
+    for name, before, after, keys in (
+            ("game by id", lambda key: bisect_game(games, key), repo.get_game_by_id, game_ids),
+            ("user by name", lambda key: bisect_user(users, key), repo.get_user, usernames)):
+        bisect_cost = time_per_lookup(before, keys)
+        dict_cost = time_per_lookup(after, keys)
+        print(f"{name:<15} bisect: {bisect_cost * 1e9:6.0f} ns   dict: {dict_cost * 1e9:4.0f} ns   "
+              f"({bisect_cost / dict_cost:.0f}x)")
+    # used to be a scan of every game
+    print(f"{'game by title':<15} dict: {time_per_lookup(repo.get_game_by_title, titles) * 1e9:4.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Loading the catalog from a snapshot against parsing the csv, on the bundled
+csv and on bigger copies of it with new AppIDs.
+
+Run from the project directory:
+    python -m benchmarks.snapshot_load
+"""
+import csv
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+from games.adapters.datareader.csvdatareader import GameFileCSVReader
+from games.adapters.datareader.snapshot import load_snapshot, save_snapshot
+from utils import get_project_root
+
+COPIES = (1, 10, 50)
+REPEAT = 3
+
+
+def write_catalog(path: Path, copies: int):
+    """The bundled csv repeated copies times, every copy with its own AppIDs"""
+    source = get_project_root() / "games" / "adapters" / "data" / "games.csv"
+    with open(source, 'r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        rows = list(reader)
+    app_id = header.index("AppID")
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for copy in range(copies):
+            for row in rows:
+                row = list(row)
+                row[app_id] = str(int(row[app_id]) + copy * 10_000_000)
+                writer.writerow(row)
+
+
+def best_of(load) -> float:
+    times = []
+    for _ in range(REPEAT):
+        started = perf_counter()
+        load()
+        times.append(perf_counter() - started)
+    return min(times)
+
+
+def parse(csv_path: Path):
+    reader = GameFileCSVReader(csv_path)
+    reader.read_csv_file()
+    return reader.dataset_of_games
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        for copies in COPIES:
+            csv_path = Path(directory) / f"games{copies}.csv"
+            snapshot_path = Path(directory) / f"games{copies}.snapshot"
+            write_catalog(csv_path, copies)
+            games = parse(csv_path)
+            save_snapshot(snapshot_path, csv_path, games)
+
+            parse_time = best_of(lambda: parse(csv_path))
+            snapshot_time = best_of(lambda: load_snapshot(snapshot_path, csv_path))
+            assert len(load_snapshot(snapshot_path, csv_path)[0]) == len(games)
+            print(f"{len(games):>7} games   parse: {parse_time:6.3f}s   snapshot: {snapshot_time:6.3f}s   "
+                  f"({parse_time / snapshot_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
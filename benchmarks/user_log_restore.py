@@ -0,0 +1,82 @@
+"""
+Restarting memory mode with saved user data: replaying an activity log of
+every registration, review and wishlist change, against reading a
+checkpoint of the final state plus an empty log. 10k users sign up and
+review two games each, the rest of the events are wishlist changes, so the
+log keeps growing while the state it adds up to stays about the same size.
+
+Run from the project directory:
+    python -m benchmarks.user_log_restore
+"""
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from games.adapters.repository.activitylog import ActivityLog
+from games.adapters.repository.memoryrepo import MemoryRepository
+from games.domainmodel.model import Game, Review, User
+
+EVENT_COUNTS = (100_000, 300_000, 1_000_000)
+CATALOG_SIZE = 1000
+USERS = 10_000
+
+
+def make_repo() -> MemoryRepository:
+    return MemoryRepository(games=[Game(game_id, f"game{game_id}") for game_id in range(CATALOG_SIZE)])
+
+
+def write_activity(log_path: str, event_count: int):
+    repo = make_repo()
+    activity_log = ActivityLog(log_path, sync_interval=60)
+    repo.attach_activity_log(activity_log)
+    rng = random.Random(event_count)
+    users = [User(f"user{number}", "password1") for number in range(USERS)]
+    for user in users:
+        repo.add_user(user)
+        for game_id in rng.sample(range(CATALOG_SIZE), 2):
+            game = repo.get_game_by_id(game_id)
+            repo.add_review(Review(user, game, rng.randint(0, 5), "a review"), user, game)
+    for _ in range(event_count - 3 * USERS):
+        user = rng.choice(users)
+        game = repo.get_game_by_id(rng.randrange(CATALOG_SIZE))
+        if game in user.favourite_games:
+            repo.remove_from_wishlist(user, game)
+        else:
+            repo.add_to_wishlist(user, game)
+    activity_log.close()
+
+
+def restore_seconds(log_path: str) -> float:
+    repo = make_repo()
+    started = perf_counter()
+    activity_log = ActivityLog(log_path, sync_interval=0)
+    repo.attach_activity_log(activity_log)
+    elapsed = perf_counter() - started
+    activity_log.close()
+    return elapsed
+
+
+def main():
+    for event_count in EVENT_COUNTS:
+        with tempfile.TemporaryDirectory() as directory:
+            log_path = os.path.join(directory, "users.log")
+            write_activity(log_path, event_count)
+            log_size = os.path.getsize(log_path)
+            from_log = restore_seconds(log_path)
+
+            activity_log = ActivityLog(log_path, sync_interval=0)
+            started = perf_counter()
+            activity_log.checkpoint()
+            checkpointing = perf_counter() - started
+            activity_log.close()
+            checkpoint_size = os.path.getsize(activity_log.checkpoint_path)
+            from_checkpoint = restore_seconds(log_path)
+
+        print(f"{event_count:>9} events   log: {log_size / 1e6:6.1f} MB {from_log:6.2f}s   "
+              f"checkpoint: {checkpoint_size / 1e6:6.1f} MB {from_checkpoint:6.2f}s   "
+              f"({from_log / from_checkpoint:.1f}x, took {checkpointing:.2f}s to write)")
+
+
+if __name__ == '__main__':
+    main()
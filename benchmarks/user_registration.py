@@ -0,0 +1,68 @@
+"""
+Registering users in memory mode: the sorted list with insort and a
+throwaway User per lookup that MemoryRepository used to keep, against the
+UserDirectory it uses now. Also the cost of the "is this name free?"
+check for names that aren't taken: the directory's dict against the Bloom
+filter DatabaseRepository keeps in front of its username query.
+
+Run from the project directory:
+    python -m benchmarks.user_registration
+"""
+import timeit
+from bisect import bisect_left, insort_left
+from time import perf_counter
+
+from games.adapters.repository.userdirectory import BloomFilter, UserDirectory
+from games.domainmodel.model import User
+
+SIZES = (10_000, 100_000, 1_000_000)
+# the sorted list is quadratic, bigger sizes take too long
+SORTED_LIST_LIMIT = 100_000
+CHECKS = 100_000
+REPEAT = 3
+
+
+def register_in_sorted_list(users: list[User]):
+    registered = []
+    for user in users:
+        target_user = User(user.username, 'dummy_password')
+        index = bisect_left(registered, target_user)
+        if index == len(registered) or registered[index] != target_user:
+            insort_left(registered, user)
+
+
+def register_in_directory(users: list[User]) -> UserDirectory:
+    directory = UserDirectory()
+    for user in users:
+        if not directory.might_exist(user.username) or directory.get(user.username) is None:
+            directory.add(user)
+    return directory
+
+
+def seconds(register, users: list[User]) -> float:
+    started = perf_counter()
+    register(users)
+    return perf_counter() - started
+
+
+def main():
+    for size in SIZES:
+        users = [User(f"user{number:07}", "password1") for number in range(size - 1, -1, -1)]
+        line = f"{size:>9} sign-ups   UserDirectory: {seconds(register_in_directory, users):6.2f}s"
+        if size <= SORTED_LIST_LIMIT:
+            line += f"   sorted list: {seconds(register_in_sorted_list, users):6.2f}s"
+        print(line)
+
+    directory = register_in_directory(users)
+    usernames = BloomFilter(capacity=2 * len(users))
+    for user in users:
+        usernames.add(user.username)
+    free_names = [f"newcomer{number}" for number in range(CHECKS)]
+    for name, check in (("dict lookup", lambda username: not directory.might_exist(username)),
+                        ("bloom filter", lambda username: not usernames.might_contain(username))):
+        cost = timeit.timeit(lambda: [check(username) for username in free_names], number=REPEAT)
+        print(f"free name check, {name:<13} {cost / (REPEAT * CHECKS) * 1e9:5.0f} ns")
+
+
+if __name__ == '__main__':
+    main()
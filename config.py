@@ -13,6 +13,32 @@ class Config:
     REPOSITORY = environ.get('REPOSITORY')
     SQLALCHEMY_DATABASE_URI = environ.get('SQLALCHEMY_DATABASE_URI')
 
+    # load the csv into an empty database when the app starts, turn off to load it with `flask catalog load`
+    catalog_load_on_startup_value = environ.get('CATALOG_LOAD_ON_STARTUP') or 'true'
+    CATALOG_LOAD_ON_STARTUP = catalog_load_on_startup_value.strip().lower() == 'true'
+
+    # games written per transaction when loading the catalog into the database
+    CATALOG_BATCH_SIZE = int(environ.get('CATALOG_BATCH_SIZE') or 1000)
+
+    # parsed catalog cache for memory mode, empty means always parse the csv
+    CATALOG_SNAPSHOT_PATH = environ.get('CATALOG_SNAPSHOT_PATH')
+
+    # seconds between checks for rows appended to the csv in memory mode, 0 turns it off
+    CATALOG_RELOAD_INTERVAL = float(environ.get('CATALOG_RELOAD_INTERVAL') or 0)
+
+    # users, reviews and wishlists are saved to this log in memory mode, empty means they're lost on restart
+    USER_LOG_PATH = environ.get('USER_LOG_PATH')
+
+    # seconds between fsyncs of the user log, 0 syncs every write
+    USER_LOG_SYNC_INTERVAL = float(environ.get('USER_LOG_SYNC_INTERVAL') or 1)
+
+    # records written to the user log before they're folded into its checkpoint, 0 never checkpoints
+    USER_LOG_CHECKPOINT_RECORDS = int(environ.get('USER_LOG_CHECKPOINT_RECORDS') or 10000)
+
+    # keep game descriptions in a memory mapped file in memory mode
+    lazy_descriptions_value = environ.get('LAZY_DESCRIPTIONS') or ''
+    LAZY_DESCRIPTIONS = lazy_descriptions_value.strip().lower() == 'true'
+
     # convert string to boolean value
     echo_value = environ.get('SQLALCHEMY_ECHO')
     SQLALCHEMY_ECHO = False
@@ -1,5 +1,7 @@
 """Initialize Flask app."""
 
+import atexit
+
 from flask import Flask
 
 import games.adapters.repository.abstractrepo as repo
@@ -7,7 +9,11 @@ import games.adapters.repository.databaserepo
 from games.adapters.repository.memoryrepo import MemoryRepository
 from games.adapters.repository.databaserepo import DatabaseRepository
 from games.adapters.datareader.csvdatareader import GameFileCSVReader
+from games.adapters.datareader.incremental import IncrementalCSVReader
+from games.adapters.datareader.textstore import TextStore
+from games.adapters.repository.activitylog import ActivityLog
 from os.path import exists, join, dirname, abspath
+from threading import Event, Thread
 
 from games.context_processors import sidebar_context
 
@@ -15,7 +21,7 @@ from sqlalchemy import create_engine, inspect
 from sqlalchemy.orm import sessionmaker, clear_mappers
 from sqlalchemy.pool import NullPool
 
-from games.adapters.repository.orm import map_model_to_tables, metadata
+from games.adapters.repository.orm import map_model_to_tables, metadata, upgrade_schema
 
 def create_app(test_config=None):
     """Construct the core application."""
@@ -46,12 +52,44 @@ def create_app(test_config=None):
                 exit()
             directory_depth += 1
 
+    # where `flask catalog load` reads from by default
+    app.config['CATALOG_DATA_PATH'] = data_source_path
+
+    catalog_reader = None
+
     if app.config['REPOSITORY'] == 'memory':
         # create memory repository
         repo.repo_instance = MemoryRepository()
 
-        # import game data from source into repo
-        repo.populate(data_source_path, repo.repo_instance)
+        # keep descriptions in a memory mapped file instead of on the heap
+        text_store = TextStore() if app.config['LAZY_DESCRIPTIONS'] else None
+        if text_store is not None:
+            atexit.register(text_store.close)
+
+        snapshot_path = app.config['CATALOG_SNAPSHOT_PATH'] or None
+        if app.config['CATALOG_RELOAD_INTERVAL'] > 0:
+            catalog_reader = IncrementalCSVReader(data_source_path, text_store=text_store)
+            if snapshot_path is not None:
+                # the reader takes note of the rows first, so any appended
+                # while the snapshot loads are read again rather than missed
+                catalog_reader.skip_existing()
+                repo.populate(data_source_path, repo.repo_instance, snapshot_path=snapshot_path,
+                              text_store=text_store)
+            else:
+                # the reader does the first load too, so it knows where the file ended
+                repo.reload(catalog_reader, repo.repo_instance)
+        else:
+            # import game data from source into repo
+            repo.populate(data_source_path, repo.repo_instance, snapshot_path=snapshot_path,
+                          text_store=text_store)
+
+        # users, reviews and wishlists from earlier runs, once the games they refer to are loaded
+        if app.config['USER_LOG_PATH']:
+            activity_log = ActivityLog(app.config['USER_LOG_PATH'],
+                                       sync_interval=app.config['USER_LOG_SYNC_INTERVAL'],
+                                       checkpoint_every=app.config['USER_LOG_CHECKPOINT_RECORDS'])
+            repo.repo_instance.attach_activity_log(activity_log)
+            atexit.register(activity_log.close)
 
     elif app.config['REPOSITORY'] == 'database':
         database_uri = app.config['SQLALCHEMY_DATABASE_URI']
@@ -63,7 +101,6 @@ def create_app(test_config=None):
 
         # run without database instance
         if len(inspect(database_engine).get_table_names()) == 0 or app.config['TESTING'] == 'True':
-            print('REPOPULATING DATABASE')
             clear_mappers()
             metadata.create_all(database_engine)
             # clear data
@@ -72,10 +109,18 @@ def create_app(test_config=None):
                     connection.execute(table.delete())
 
             map_model_to_tables()
-            repo.populate(data_source_path, repo.repo_instance)
-            print('REPOPULATING DATABASE... FINISHED')
+            # otherwise the catalog is loaded separately with `flask catalog load`
+            if app.config['CATALOG_LOAD_ON_STARTUP']:
+                print('REPOPULATING DATABASE')
+                repo.populate(data_source_path, repo.repo_instance, batch_size=app.config['CATALOG_BATCH_SIZE'])
+                print('REPOPULATING DATABASE... FINISHED')
 
         else:
+            # a database from an older version gets the columns it's missing
+            added_columns = upgrade_schema(database_engine)
+            if added_columns:
+                print(f"Added {', '.join(added_columns)} to the database. "
+                      f"Run `flask catalog load --refresh` to fill in the stored games' new details")
             map_model_to_tables()
 
     with app.app_context():
@@ -103,6 +148,9 @@ def create_app(test_config=None):
         from .wishlist import wishlist
         app.register_blueprint(wishlist.wishlist_blueprint)
 
+        from .cli import catalog_cli
+        app.cli.add_command(catalog_cli)
+
         @app.before_request
         def before_flask_http_request_function():
             if isinstance(repo.repo_instance, games.adapters.repository.databaserepo.DatabaseRepository):
@@ -113,4 +161,27 @@ def create_app(test_config=None):
             if isinstance(repo.repo_instance, games.adapters.repository.databaserepo.DatabaseRepository):
                 repo.repo_instance.close_session()
 
+        if catalog_reader is not None:
+            _start_catalog_reloader(app, catalog_reader, repo.repo_instance)
+
     return app
+
+
+def _start_catalog_reloader(app, catalog_reader: IncrementalCSVReader, repository):
+    """
+    Pick up rows appended to the csv every CATALOG_RELOAD_INTERVAL seconds, in
+    a background thread so no request waits for a reload
+    """
+    interval = app.config['CATALOG_RELOAD_INTERVAL']
+    stopped = Event()
+
+    def reload_catalog():
+        while not stopped.wait(interval):
+            try:
+                repo.reload(catalog_reader, repository)
+            except Exception:
+                # the next interval tries again
+                app.logger.exception("Failed to reload the catalog")
+
+    Thread(target=reload_catalog, name='catalog-reload', daemon=True).start()
+    atexit.register(stopped.set)
@@ -1,49 +1,148 @@
+import ast
 import csv
+import io
+import mmap
 import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator
 
-from games.domainmodel.model import Genre, Game, Publisher
+from games.domainmodel.model import Game, Platform
+from games.domainmodel.registry import EntityRegistry
+from games.adapters.datareader.textstore import TextStore
+from games.adapters.datareader.rejects import InvalidRowError, RejectedRowReport
+
+# each worker gets a few chunks so a slow chunk doesn't hold up the others
+CHUNKS_PER_WORKER = 4
+# a big file is cut into more chunks than that, about this many bytes each
+CHUNK_SIZE = 4 << 20
+# chunks queued per worker while the caller takes the games
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+# how much of a file count_byte copies out at a time
+COUNT_BLOCK_SIZE = 1 << 20
+
+# developer names can contain ", " (e.g. "Beep Games, Inc."), only a bare comma separates them
+DEVELOPER_SEPARATOR = re.compile(r',(?! )')
+PLATFORM_COLUMNS = (("Windows", Platform.WINDOWS), ("Mac", Platform.MAC), ("Linux", Platform.LINUX))
 
 
 class GameFileCSVReader:
-    def __init__(self, filename):
+    def __init__(self, filename, registry: EntityRegistry = None, text_store: TextStore = None,
+                 strict: bool = False, rejects: RejectedRowReport = None):
         self.__filename = filename
+        # genres and publishers are shared between games through the registry
+        self.__registry = registry if registry is not None else EntityRegistry()
+        # if given, descriptions are kept in the store instead of on the heap
+        self.__text_store = text_store
+        # strict stops at the first invalid row, otherwise invalid rows are skipped
+        # and, if there is a report, written to it
+        self.__strict = strict
+        self.__rejects = rejects
         self.__dataset_of_games = []
         self.__dataset_of_publishers = set()
         self.__dataset_of_genres = set()
+        # counts for the last iter_games() run
+        self.__rows_read = 0
+        self.__rows_rejected = 0
+
+    def read_csv_file(self, workers: int = 1):
+        for game in self.iter_games(workers):
+            self.__dataset_of_publishers.add(game.publisher)
+            for genre in game.genres:
+                self.__dataset_of_genres.add(genre)
+            self.__dataset_of_games.append(game)
+
+    def iter_rows(self) -> Iterator[dict]:
+        """Yield raw csv rows one at a time, without keeping them around"""
+        for _, row in self.__iter_numbered_rows():
+            yield row
 
-    def read_csv_file(self):
-        if not os.path.exists(self.__filename):
-            print(f"path {self.__filename} does not exist!")
+    def __iter_numbered_rows(self) -> Iterator[tuple[int, dict]]:
+        """Yield (line number the row starts on, row)"""
+        if not csv_file_exists(self.__filename):
             return
         with open(self.__filename, 'r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    game_id = int(row["AppID"])
-                    title = row["Name"]
-                    game = Game(game_id, title)
-                    game.release_date = row["Release date"]
-                    game.price = float(row["Price"])
-                    game.description = row["About the game"]
-                    game.image_url = row["Header image"]
-                    game.website_url = row["Website"]
-
-                    publisher = Publisher(row["Publishers"])
-                    self.__dataset_of_publishers.add(publisher)
-                    game.publisher = publisher
-
-                    genre_names = row["Genres"].split(",")
-                    for genre_name in genre_names:
-                        genre = Genre(genre_name.strip())
-                        self.__dataset_of_genres.add(genre)
-                        game.add_genre(genre)
-
-                    self.__dataset_of_games.append(game)
-
-                except ValueError as e:
-                    print(f"Skipping row due to invalid data: {e}")
-                except KeyError as e:
-                    print(f"Skipping row due to missing key: {e}")
+            yield from _numbered_rows(csv.DictReader(file), 1)
+
+    def iter_games(self, workers: int = 1) -> Iterator[Game]:
+        """
+        Yield games one at a time, each with its publisher and genres attached.
+        Nothing is accumulated, so the caller decides what to keep.
+
+        With more than one worker the file is parsed in parallel chunks, and
+        games still come out in file order.
+
+        Raises InvalidRowError at the first invalid row in strict mode
+        """
+        self.__rows_read = 0
+        self.__rows_rejected = 0
+        if workers > 1:
+            yield from self.__iter_games_parallel(workers)
+        else:
+            for game in create_games(self.__iter_numbered_rows(), self.__registry, self.__text_store,
+                                     self.__reject):
+                self.__rows_read += 1
+                yield game
+
+    def __reject(self, row: dict, error: InvalidRowError):
+        self.__rows_read += 1
+        self.__rows_rejected += 1
+        if self.__rejects is not None:
+            self.__rejects.add_error(error, row)
+        if self.__strict:
+            raise error
+
+    def __iter_games_parallel(self, workers: int) -> Iterator[Game]:
+        if not csv_file_exists(self.__filename) or os.path.getsize(self.__filename) == 0:
+            return
+        # the chunks are found through a map of the file, the parent never
+        # holds the whole file, and the workers read their own ranges
+        with open(self.__filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            header_start = len(UTF8_BOM) if data[:len(UTF8_BOM)] == UTF8_BOM else 0
+            header_end = next_record_start(data, header_start, header_start)
+            header = data[header_start:header_end].decode('utf-8')
+            fieldnames = next(csv.reader(io.StringIO(header, newline=None)), None)
+            if fieldnames is None:
+                return
+
+            parts = max(workers * CHUNKS_PER_WORKER, (len(data) - header_end) // CHUNK_SIZE)
+            boundaries = find_record_boundaries(data, header_end, parts)
+            # line each chunk starts on, for reporting rejected rows
+            start_lines = [count_byte(data, b'\n', 0, boundaries[0]) + 1]
+            for start, end in zip(boundaries, boundaries[1:-1]):
+                start_lines.append(start_lines[-1] + count_byte(data, b'\n', start, end))
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # only a few chunks per worker are queued at a time, so parsed games
+            # don't pile up here when the caller is slower than the workers.
+            # Results are taken in submission order, so the merge is deterministic
+            in_flight = deque()
+            for start, end, start_line in zip(boundaries, boundaries[1:], start_lines):
+                in_flight.append(executor.submit(_parse_byte_range, self.__filename, start, end, start_line,
+                                                 fieldnames))
+                if len(in_flight) >= workers * CHUNKS_IN_FLIGHT_PER_WORKER:
+                    yield from self.__merge(*in_flight.popleft().result())
+            while in_flight:
+                yield from self.__merge(*in_flight.popleft().result())
+
+    def __merge(self, games: list[Game], rejected: list[tuple[int, InvalidRowError, dict]]) -> Iterator[Game]:
+        # rejected rows are reported between the games around them, so strict
+        # mode stops with every game before the invalid row yielded
+        position = 0
+        for games_before, error, row in rejected:
+            yield from self.__take(games[position:games_before])
+            position = games_before
+            self.__reject(row, error)
+        yield from self.__take(games[position:])
+
+    def __take(self, games: list[Game]) -> Iterator[Game]:
+        for game in games:
+            self.__rows_read += 1
+            # each worker had its own registry, swap in this reader's shared objects
+            self.__registry.intern_game(game)
+            store_description(game, self.__text_store)
+            yield game
 
     def get_unique_games_count(self):
         return len(self.__dataset_of_games)
@@ -65,3 +164,195 @@ class GameFileCSVReader:
     @property
     def dataset_of_genres(self) -> set:
         return self.__dataset_of_genres
+
+    @property
+    def registry(self) -> EntityRegistry:
+        return self.__registry
+
+    @property
+    def rows_read(self) -> int:
+        """Rows the last iter_games() went through, including rejected ones"""
+        return self.__rows_read
+
+    @property
+    def rows_rejected(self) -> int:
+        """Rows the last iter_games() skipped because they were invalid"""
+        return self.__rows_rejected
+
+
+UTF8_BOM = b'\xef\xbb\xbf'
+
+
+def csv_file_exists(filename) -> bool:
+    """Says so if the file is missing, the readers then have nothing to read"""
+    if os.path.exists(filename):
+        return True
+    print(f"path {filename} does not exist!")
+    return False
+
+
+def find_record_boundaries(data: bytes, start: int, parts: int) -> list[int]:
+    """
+    Split data[start:] into about `parts` byte ranges that each begin on a csv
+    record. Returns the offsets, starting with `start` and ending with len(data).
+    data can be bytes or a read-only mmap of the file
+    """
+    size = len(data)
+    step = max((size - start) // max(parts, 1), 1)
+    boundaries = [start]
+
+    while boundaries[-1] + step < size:
+        next_start = next_record_start(data, boundaries[-1], boundaries[-1] + step)
+        if next_start >= size:
+            break
+        boundaries.append(next_start)
+
+    boundaries.append(size)
+    return boundaries
+
+
+def next_record_start(data: bytes, record_start: int, position: int) -> int:
+    """
+    Return the offset of the first record beginning at or after `position`,
+    or len(data) if there isn't one. `record_start` must be a known record
+    boundary at or before `position`.
+
+    A newline only ends a record when it is outside a quoted field. Quotes
+    inside a field are escaped as "", so the count of quote characters since
+    a record boundary is odd exactly when we're inside a quoted field
+    """
+    newline = data.find(b'\n', position)
+    if newline == -1:
+        return len(data)
+    quotes = count_byte(data, b'"', record_start, newline)
+    # newline is inside a quoted multi-line field, keep looking
+    while quotes % 2 == 1:
+        next_newline = data.find(b'\n', newline + 1)
+        if next_newline == -1:
+            return len(data)
+        quotes += count_byte(data, b'"', newline, next_newline)
+        newline = next_newline
+    return newline + 1
+
+
+def count_byte(data: bytes, byte: bytes, start: int, end: int) -> int:
+    """data.count(byte, start, end), for an mmap too, which has no count()"""
+    # copies a block at a time, so counting over a whole file stays small
+    return sum(data[block:min(block + COUNT_BLOCK_SIZE, end)].count(byte)
+               for block in range(start, end, COUNT_BLOCK_SIZE))
+
+
+def _parse_byte_range(filename: str, start: int, end: int, start_line: int,
+                      fieldnames: list[str]) -> tuple[list[Game], list[tuple[int, InvalidRowError, dict]]]:
+    """
+    Worker for parallel parsing, turns one record-aligned byte range into
+    games. Returns the games and the rejected rows, each with the number of
+    games that came before it and its error
+    """
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+    # newline=None translates line endings the same way a text mode open() does
+    reader = csv.DictReader(io.StringIO(text, newline=None), fieldnames=fieldnames)
+    games = []
+    rejected = []
+    for game in create_games(_numbered_rows(reader, start_line), EntityRegistry(),
+                             on_reject=lambda row, error: rejected.append((len(games), error, row))):
+        games.append(game)
+    return games, rejected
+
+
+def _numbered_rows(reader: csv.DictReader, first_line: int) -> Iterator[tuple[int, dict]]:
+    """Pair each row with the line it starts on, given the line the reader's text starts on"""
+    # reads the header, if the reader has one to read
+    reader.fieldnames
+    # line_num counts the lines read so far, rows can span several lines
+    lines_before_row = reader.line_num
+    for row in reader:
+        yield first_line + lines_before_row, row
+        lines_before_row = reader.line_num
+
+
+def create_games(numbered_rows: Iterable[tuple[int, dict]], registry: EntityRegistry, text_store: TextStore = None,
+                 on_reject: Callable[[dict, InvalidRowError], None] = None) -> Iterator[Game]:
+    """
+    Turn (line number, row) pairs into games, handing rows that aren't valid
+    games to on_reject, or raising InvalidRowError if there is no on_reject
+    """
+    for line, row in numbered_rows:
+        try:
+            yield create_game(row, registry, text_store)
+        except InvalidRowError as e:
+            e.line = line
+            if on_reject is None:
+                raise
+            on_reject(row, e)
+
+
+def create_game(row: dict, registry: EntityRegistry, text_store: TextStore = None) -> Game:
+    """Raises InvalidRowError, naming the column at fault, if the row isn't a valid game"""
+    column = "AppID"
+    try:
+        game_id = int(row["AppID"])
+        column = "Name"
+        game = Game(game_id, row["Name"])
+        column = "Release date"
+        game.release_date = row["Release date"]
+        column = "Price"
+        game.price = float(row["Price"])
+        column = "About the game"
+        game.description = row["About the game"]
+        column = "Header image"
+        game.image_url = row["Header image"]
+        column = "Website"
+        game.website_url = row["Website"]
+
+        column = "Publishers"
+        game.publisher = registry.publisher(row["Publishers"])
+
+        column = "Genres"
+        genre_names = row["Genres"].split(",")
+        for genre_name in genre_names:
+            game.add_genre(registry.genre(genre_name))
+    except KeyError:
+        raise InvalidRowError(column, "missing column") from None
+    except (ValueError, TypeError, AttributeError) as e:
+        if row.get(column) is None:
+            # a short row, DictReader fills the missing fields with None
+            raise InvalidRowError(column, "missing value") from None
+        raise InvalidRowError(column, str(e)) from e
+
+    # optional columns, older files without them still load
+    game.tags = (row.get("Tags") or "").split(",")
+    game.categories = (row.get("Categories") or "").split(",")
+    game.developers = DEVELOPER_SEPARATOR.split(row.get("Developers") or "")
+    game.supported_languages = parse_language_list(row.get("Supported languages") or "")
+    game.platforms = parse_platforms(row)
+
+    store_description(game, text_store)
+    return game
+
+
+def parse_language_list(languages: str) -> list[str]:
+    """Supported languages are written like a python list, e.g. "['English', 'French']" """
+    try:
+        parsed = ast.literal_eval(languages)
+    except (ValueError, SyntaxError):
+        return languages.split(",")
+    if isinstance(parsed, (list, tuple)):
+        return [language for language in parsed if isinstance(language, str)]
+    return []
+
+
+def parse_platforms(row: dict) -> Platform:
+    platforms = Platform(0)
+    for column, platform in PLATFORM_COLUMNS:
+        if (row.get(column) or "").strip().lower() == "true":
+            platforms |= platform
+    return platforms
+
+
+def store_description(game: Game, text_store: TextStore = None):
+    """Move a freshly parsed game's description into the text store, if there is one"""
+    if text_store is not None and game.description is not None:
+        game.description = text_store.add(game.description)
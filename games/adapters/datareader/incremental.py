@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import csv
+import hashlib
+import io
+import os
+
+from games.adapters.datareader.csvdatareader import UTF8_BOM, create_game, csv_file_exists, next_record_start
+from games.adapters.datareader.textstore import TextStore
+from games.adapters.datareader.rejects import InvalidRowError, RejectedRowReport
+from games.domainmodel.model import Game
+from games.domainmodel.registry import EntityRegistry
+
+
+def _digest(record: bytes) -> bytes:
+    return hashlib.blake2b(record, digest_size=16).digest()
+
+
+class IncrementalCSVReader:
+    """
+    Reads a games csv file that keeps growing. Each call to read_changes()
+    returns only the games that were appended or changed since the last call.
+
+    The reader remembers the byte offset just past the last ingested record
+    and a content hash per row. If the file only grew, just the new bytes are
+    read, and an appended row for an AppID that was seen before counts as a
+    change to that game. If the file was rewritten (it shrank, or the last
+    ingested record no longer matches) or a rescan is asked for, the whole
+    file is read again and only rows whose hash changed are returned. Rows
+    removed from the file are not reported. Invalid rows are skipped, and
+    written to the rejects report if there is one
+    """
+
+    def __init__(self, filename, registry: EntityRegistry = None, text_store: TextStore = None,
+                 rejects: RejectedRowReport = None):
+        self.__filename = filename
+        self.__registry = registry if registry is not None else EntityRegistry()
+        self.__text_store = text_store
+        self.__rejects = rejects
+
+        self.__fieldnames = None
+        self.__offset = 0
+        # line number of the record at the offset
+        self.__line = 1
+        # (start, end, hash) of the last ingested record, or of the header
+        self.__last_record = None
+        # AppID -> hash of the row it was last ingested from
+        self.__row_hashes: dict[str, bytes] = {}
+        # counts for the last read_changes() call
+        self.__rows_read = 0
+        self.__rows_rejected = 0
+
+    @property
+    def offset(self) -> int:
+        return self.__offset
+
+    @property
+    def registry(self) -> EntityRegistry:
+        return self.__registry
+
+    @property
+    def filename(self):
+        return self.__filename
+
+    @property
+    def rows_read(self) -> int:
+        """New or changed rows the last read_changes() went through, including rejected ones"""
+        return self.__rows_read
+
+    @property
+    def rows_rejected(self) -> int:
+        """Rows the last read_changes() skipped because they were invalid"""
+        return self.__rows_rejected
+
+    def read_changes(self, rescan: bool = False) -> list[Game]:
+        self.__rows_read = 0
+        self.__rows_rejected = 0
+        if not csv_file_exists(self.__filename):
+            return []
+
+        with open(self.__filename, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            if rescan or self.__fieldnames is None or not self.__is_append_only(file, size):
+                file.seek(0)
+                return self.__rescan(file.read())
+
+            if size == self.__offset:
+                return []
+            file.seek(self.__offset)
+            return self.__ingest(file.read(size - self.__offset), self.__offset)
+
+    def skip_existing(self):
+        """
+        Take every row now in the file as already read, without building its
+        game, when the catalog was loaded some other way, e.g. from a
+        snapshot. Later calls to read_changes() return only what changes after
+        """
+        if not csv_file_exists(self.__filename):
+            return
+
+        with open(self.__filename, 'rb') as file:
+            self.__rescan(file.read(), build_games=False)
+
+    def __is_append_only(self, file, size: int) -> bool:
+        """True if everything up to the offset is still what was ingested before"""
+        if size < self.__offset:
+            return False
+        start, end, record_hash = self.__last_record
+        file.seek(start)
+        return _digest(file.read(end - start)) == record_hash
+
+    def __rescan(self, data: bytes, build_games: bool = True) -> list[Game]:
+        header_start = len(UTF8_BOM) if data.startswith(UTF8_BOM) else 0
+        header_end = next_record_start(data, header_start, header_start)
+        header = data[header_start:header_end]
+        if header.strip() == b'' or header.count(b'"') % 2 == 1:
+            return []
+
+        self.__fieldnames = next(csv.reader(io.StringIO(header.decode('utf-8'), newline=None)))
+        self.__offset = header_end
+        self.__line = 1 + header.count(b'\n')
+        self.__last_record = (header_start, header_end, _digest(header))
+        return self.__ingest(data[header_end:], header_end, build_games)
+
+    def __ingest(self, data: bytes, base_offset: int, build_games: bool = True) -> list[Game]:
+        """
+        Parse the complete records in data, which starts at base_offset in the
+        file. Without build_games the rows are only remembered
+        """
+        changed_games = []
+
+        position = 0
+        while position < len(data):
+            record_end = next_record_start(data, position, position)
+            record = data[position:record_end]
+            row = next(csv.DictReader(io.StringIO(record.decode('utf-8', errors='replace'), newline=None),
+                                      fieldnames=self.__fieldnames), None)
+            if not _is_complete(record, row):
+                # the writer is still in the middle of this record, pick it up next time
+                break
+
+            record_hash = _digest(record)
+            line = self.__line
+            self.__line += record.count(b'\n')
+            self.__offset = base_offset + record_end
+            self.__last_record = (base_offset + position, base_offset + record_end, record_hash)
+            position = record_end
+
+            if row is None:
+                continue
+            app_id = row.get("AppID")
+            if self.__row_hashes.get(app_id) == record_hash:
+                continue
+            if not build_games:
+                self.__row_hashes[app_id] = record_hash
+                continue
+
+            self.__rows_read += 1
+            try:
+                game = create_game(row, self.__registry, self.__text_store)
+            except InvalidRowError as e:
+                self.__rows_rejected += 1
+                if self.__rejects is not None:
+                    e.line = line
+                    self.__rejects.add_error(e, row)
+                continue
+
+            self.__row_hashes[app_id] = record_hash
+            changed_games.append(game)
+
+        return changed_games
+
+
+def _is_complete(record: bytes, row: dict | None) -> bool:
+    if record.count(b'"') % 2 == 1:
+        # ends inside a quoted field
+        return False
+    if record.endswith(b'\n'):
+        return True
+    # the last line of the file may have no newline, take it only if no field is missing
+    return row is not None and None not in row.values()
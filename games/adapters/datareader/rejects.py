@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+from collections import Counter
+
+
+class InvalidRowError(ValueError):
+    """A csv row that can't be turned into a game, and the column that's at fault"""
+
+    def __init__(self, column: str | None, reason: str, line: int | None = None):
+        super().__init__(column, reason)
+        self.column = column
+        self.reason = reason
+        # filled in by whoever knows where the row was
+        self.line = line
+
+    def __str__(self):
+        if self.line is None:
+            return f"column {self.column}: {self.reason}"
+        return f"line {self.line}, column {self.column}: {self.reason}"
+
+
+class RejectedRowReport:
+    """
+    Collects the rows an ingest run skipped. Each one is streamed as a line of
+    json (line number, column, reason and the raw row) to the sidecar file if
+    a path is given, so bad rows can be fixed in bulk afterwards; counts by
+    column are kept either way. Use as a context manager, or call close()
+    """
+
+    def __init__(self, path=None):
+        self.__path = path
+        self.__file = None
+        self.__rejected = 0
+        self.__by_column: Counter = Counter()
+
+    def add(self, line: int | None, column: str | None, reason: str, row: dict | None = None):
+        self.__rejected += 1
+        self.__by_column[column] += 1
+        if self.__path is None:
+            return
+        if self.__file is None:
+            # only created once there is something to report
+            self.__file = open(self.__path, 'w', encoding='utf-8')
+        record = {'line': line, 'column': column, 'reason': reason, 'row': _json_row(row)}
+        self.__file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def add_error(self, error: InvalidRowError, row: dict | None = None):
+        self.add(error.line, error.column, error.reason, row)
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def rejected(self) -> int:
+        return self.__rejected
+
+    @property
+    def by_column(self) -> dict:
+        """Column -> how many rows were rejected because of it"""
+        return dict(self.__by_column)
+
+    def summary(self) -> str:
+        if self.__rejected == 0:
+            return "no rows rejected"
+        columns = ", ".join(f"{column} {count}" for column, count in self.__by_column.most_common())
+        return f"{self.__rejected} rows rejected ({columns})"
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _json_row(row: dict | None) -> dict | None:
+    if row is None:
+        return None
+    # DictReader keeps surplus fields in a list under the key None
+    return {('extra fields' if key is None else key): value for key, value in row.items()}
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import gc
+import hashlib
+import os
+import pickle
+
+from games.domainmodel.model import Game, Genre, Publisher
+
+# bump whenever the domain model or the snapshot layout changes, so old
+# snapshots are rebuilt instead of unpickled into the wrong shape
+SNAPSHOT_VERSION = 6
+SNAPSHOT_MAGIC = b'GAMESNAP'
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def csv_fingerprint(csv_path) -> tuple:
+    """Size, mtime and content hash of the csv file a snapshot was built from"""
+    stat = os.stat(csv_path)
+    digest = hashlib.sha256()
+    with open(csv_path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+def load_snapshot(snapshot_path, csv_path) -> tuple[list[Game], set[Genre], set[Publisher]] | None:
+    """
+    Returns the games, genres and publishers saved in the snapshot, or None if
+    there is no snapshot or it was built from a different csv file or version
+    """
+    try:
+        with open(snapshot_path, 'rb') as file:
+            if file.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                return None
+            version, fingerprint = pickle.load(file)
+            if version != SNAPSHOT_VERSION:
+                return None
+
+            # cheap checks first, only hash the csv if size and mtime match
+            stat = os.stat(csv_path)
+            if fingerprint[:2] != (stat.st_size, stat.st_mtime_ns):
+                return None
+            if fingerprint != csv_fingerprint(csv_path):
+                return None
+
+            catalog = _load_without_gc(file)
+            return catalog['games'], catalog['genres'], catalog['publishers']
+    except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError, AttributeError, KeyError):
+        return None
+
+
+def _load_without_gc(file):
+    """
+    Unpickle with the cyclic garbage collector paused. The catalog is built
+    in one go and holds no garbage, but the collector would scan it over and
+    over while it grows
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.load(file)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def save_snapshot(snapshot_path, csv_path, games: list[Game]):
+    """
+    Write the parsed games, with their genres and publishers, to snapshot_path.
+    Nothing is written if the csv file doesn't exist, there's nothing to
+    check the snapshot against
+    """
+    try:
+        fingerprint = csv_fingerprint(csv_path)
+    except FileNotFoundError:
+        return
+
+    genres = set()
+    publishers = set()
+    for game in games:
+        genres.update(game.genres)
+        publishers.add(game.publisher)
+
+    catalog = {
+        'games': games,
+        'genres': genres,
+        'publishers': publishers,
+    }
+
+    # write then rename, so a crash never leaves a half written snapshot behind
+    temp_path = f'{snapshot_path}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(SNAPSHOT_MAGIC)
+        pickle.dump((SNAPSHOT_VERSION, fingerprint), file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(catalog, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, snapshot_path)
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import mmap
+import tempfile
+import threading
+
+
+class TextStore:
+    """
+    Keeps long texts (game descriptions) out of the heap. Texts are appended
+    to an unnamed temporary file and read back through a memory map, so only
+    the pages that are actually shown get loaded, and the OS can drop them
+    again under memory pressure
+    """
+
+    def __init__(self, directory=None):
+        # unnamed, so each process has its own file and it's gone when the process exits
+        self.__file = tempfile.TemporaryFile(dir=directory)
+        self.__size = 0
+        self.__map = None
+        self.__lock = threading.Lock()
+
+    def add(self, text: str) -> LazyText:
+        data = text.encode('utf-8')
+        with self.__lock:
+            offset = self.__size
+            self.__file.write(data)
+            self.__size += len(data)
+        return LazyText(self, offset, len(data))
+
+    def read(self, offset: int, length: int) -> str:
+        if length == 0:
+            return ''
+        # reads share the lock with remapping, so a map is never closed part way through a read
+        with self.__lock:
+            if self.__file.closed:
+                raise ValueError("the text store is closed")
+            if self.__map is None or offset + length > len(self.__map):
+                self.__remap()
+            data = self.__map[offset:offset + length]
+        return data.decode('utf-8')
+
+    def close(self):
+        """Unmap and delete the file, reading a text afterwards raises ValueError"""
+        with self.__lock:
+            if self.__map is not None:
+                self.__map.close()
+                self.__map = None
+            self.__file.close()
+
+    def __remap(self):
+        """Map the whole file, called with the lock held"""
+        self.__file.flush()
+        old_map = self.__map
+        self.__map = mmap.mmap(self.__file.fileno(), self.__size, access=mmap.ACCESS_READ)
+        if old_map is not None:
+            # LazyTexts only hold offsets, nothing else points into the old map
+            old_map.close()
+
+    def __len__(self):
+        return self.__size
+
+
+class LazyText:
+    """Where a text lives in a TextStore, read only when it's asked for"""
+    __slots__ = ('__store', '__offset', '__length')
+
+    def __init__(self, store: TextStore, offset: int, length: int):
+        self.__store = store
+        self.__offset = offset
+        self.__length = length
+
+    def resolve(self) -> str:
+        return self.__store.read(self.__offset, self.__length)
+
+    def __str__(self):
+        return self.resolve()
+
+    def __repr__(self):
+        return f'<LazyText {self.__offset}+{self.__length}>'
+
+    def __reduce__(self):
+        # the store is private to this process, so pickles carry the text itself
+        return str, (self.resolve(),)
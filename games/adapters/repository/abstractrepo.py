@@ -1,11 +1,20 @@
 import abc
-from games.domainmodel.model import Genre, Game, Publisher, User, Review
-from typing import List
-from games.adapters.datareader.csvdatareader import GameFileCSVReader
+from contextlib import nullcontext
+from datetime import date
+from games.domainmodel.model import Genre, Game, Publisher, User, Review, Platform
+from typing import List, Iterable, Sequence
+from games.adapters.datareader.csvdatareader import GameFileCSVReader, store_description
+from games.adapters.datareader.textstore import TextStore
+from games.adapters.datareader.rejects import RejectedRowReport
+from games.adapters.datareader.snapshot import load_snapshot, save_snapshot
+from games.adapters.datareader.incremental import IncrementalCSVReader
 
 
 repo_instance = None
 
+# games written per transaction when loading the catalog in bulk
+DEFAULT_BATCH_SIZE = 1000
+
 
 class AbstractRepository(abc.ABC):
     # storing
@@ -21,6 +30,46 @@ class AbstractRepository(abc.ABC):
     def add_publisher(self, game: Publisher):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def update_game(self, game: Game):
+        """
+        Replace the details of the stored game that has the same id, keeping its
+        reviews. Adds the game if there isn't one
+        """
+        raise NotImplementedError
+
+    def load_games(self, games: Iterable[Game], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """
+        Add a stream of games, and their genres and publishers the first time
+        they are seen. Returns how many games were added. Repositories that can
+        write many rows at once override this and use batch_size
+        """
+        count = 0
+        seen_genres = set()
+        seen_publishers = set()
+        for game in games:
+            if self.add_game(game) is not False:
+                count += 1
+
+            for genre in game.genres:
+                if genre not in seen_genres:
+                    seen_genres.add(genre)
+                    self.add_genre(genre)
+
+            publisher = game.publisher
+            if publisher is not None and publisher not in seen_publishers:
+                seen_publishers.add(publisher)
+                self.add_publisher(publisher)
+        return count
+
+    def batch_writes(self):
+        """
+        Context for a batch of catalog writes that readers should see all at
+        once, e.g. a reload. Repositories that write each change as it comes
+        have nothing to do
+        """
+        return nullcontext()
+
     # retrieving
     @abc.abstractmethod
     def get_publisher(self, publisher_name: str) -> Publisher:
@@ -34,7 +83,7 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_games(self) -> List[Game]:
+    def get_games(self) -> Sequence[Game]:
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -46,7 +95,7 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_games_by_genre(self, genre: Genre) -> List[Game]:
+    def get_games_by_genre(self, genre: Genre) -> Sequence[Game]:
         """
         returns all games with the genre, ordered alphabetically
         returns empty list if genre doesn't have any games
@@ -54,20 +103,39 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_games_by_publisher(self, publisher: Publisher) -> List[Game]:
+    def get_games_by_publisher(self, publisher: Publisher) -> Sequence[Game]:
         """
         returns all games with the publisher, ordered alphabetically
         returns empty list if publisher doesn't have any games
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_games_by_tags(self, tags: List[str], platforms: Platform = Platform(0)) -> List[Game]:
+        """
+        returns all games that have every one of the tags (case-insensitive)
+        and run on all of the platforms, ordered alphabetically
+        returns empty list if no game matches
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_games_by_release_range(self, start: date, end: date) -> List[Game]:
+        """
+        returns the games released on or after start and before end, ordered
+        by release date, then alphabetically. start and end are dates, a
+        datetime only counts for its day
+        returns empty list if no game was released then
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_number_of_games(self) -> int:
         raise NotImplementedError
 
     @abc.abstractmethod
-    def add_user(self, user: User):
-        """Add new user to a list of users"""
+    def add_user(self, user: User) -> bool:
+        """Add new user to a list of users, returns False if the username is taken"""
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -75,6 +143,18 @@ class AbstractRepository(abc.ABC):
         """Returns user with matching username, or none"""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_users(self) -> Sequence[User]:
+        """Returns every user, ordered by username"""
+        raise NotImplementedError
+
+    def user_might_exist(self, username: str) -> bool:
+        """
+        Cheap check before get_user: False means there is definitely no user
+        with this name. Repositories without a faster way than get_user say True
+        """
+        return True
+
     @abc.abstractmethod
     def add_to_wishlist(self, user: User, game: Game):
         raise NotImplementedError
@@ -88,18 +168,87 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
 
-def populate(path, repo: AbstractRepository):
-    reader = GameFileCSVReader(path)
-    reader.read_csv_file()
-
-    games = reader.dataset_of_games
+def populate(path, repo: AbstractRepository, snapshot_path=None, text_store: TextStore = None,
+             batch_size: int = DEFAULT_BATCH_SIZE, rejects: RejectedRowReport = None):
+    """
+    Stream games from the csv file into the repo. Genres and publishers are
+    added the first time they are seen, so the parsed catalog is never held
+    in memory alongside the repository's own copy. batch_size is how many
+    games the repo may write at once.
+
+    If snapshot_path is given, the parsed catalog is loaded from that snapshot
+    when it is still up-to-date with the csv, or rebuilt and saved otherwise.
+    If text_store is given, game descriptions are kept there instead of in memory.
+    Invalid rows are skipped, and written to rejects if it's given
+    """
+    if snapshot_path is not None:
+        populate_from_snapshot(path, repo, snapshot_path, text_store, batch_size, rejects)
+        return
+
+    reader = GameFileCSVReader(path, text_store=text_store, rejects=rejects)
+    repo.load_games(reader.iter_games(), batch_size)
+    _report_rejected_rows(path, reader)
+
+
+def populate_from_snapshot(path, repo: AbstractRepository, snapshot_path, text_store: TextStore = None,
+                           batch_size: int = DEFAULT_BATCH_SIZE, rejects: RejectedRowReport = None):
+    catalog = load_snapshot(snapshot_path, path)
+    if catalog is None:
+        # missing or stale, parse the csv and save a fresh snapshot
+        reader = GameFileCSVReader(path, rejects=rejects)
+        reader.read_csv_file()
+        _report_rejected_rows(path, reader)
+        save_snapshot(snapshot_path, path, reader.dataset_of_games)
+        catalog = reader.dataset_of_games, reader.dataset_of_genres, reader.dataset_of_publishers
+
+    games, genres, publishers = catalog
     for game in games:
-        repo.add_game(game)
-
-    genres = reader.dataset_of_genres
-    for genre in genres:
-        repo.add_genre(genre)
-
-    publishers = reader.dataset_of_publishers
-    for publisher in publishers:
-        repo.add_publisher(publisher)
+        # snapshots hold descriptions as plain text
+        store_description(game, text_store)
+    repo.load_games(games, batch_size)
+
+
+def _report_rejected_rows(path, reader: GameFileCSVReader | IncrementalCSVReader):
+    # one line for the whole file, the rows themselves go to the rejects report
+    if reader.rows_rejected > 0:
+        print(f"Skipped {reader.rows_rejected} of {reader.rows_read} rows in {path}, they aren't valid games")
+
+
+def reload(reader: IncrementalCSVReader, repo: AbstractRepository, rescan: bool = False) -> int:
+    """
+    Feed the games appended to or changed in the csv file since the reader's
+    last call into the repo. New games go in as one batch through load_games,
+    only the ones already stored are updated one by one. Returns how many
+    games were added or updated
+    """
+    games = reader.read_changes(rescan)
+    _report_rejected_rows(reader.filename, reader)
+    if not games:
+        return 0
+
+    # readers see the whole reload at once, not each game as it goes in
+    with repo.batch_writes():
+        new_games = []
+        new_game_ids = set()
+        changed_games = []
+        for game in games:
+            # a game can be appended twice in one read, the later row updates the first
+            if game.game_id in new_game_ids or repo.get_game_by_id(game.game_id) is not None:
+                changed_games.append(game)
+            else:
+                new_game_ids.add(game.game_id)
+                new_games.append(game)
+        repo.load_games(new_games)
+
+        for game in changed_games:
+            repo.update_game(game)
+
+            for genre in game.genres:
+                if repo.get_genre(genre.genre_name) is None:
+                    repo.add_genre(genre)
+
+            publisher = game.publisher
+            if publisher is not None and repo.get_publisher(publisher.publisher_name) is None:
+                repo.add_publisher(publisher)
+
+    return len(games)
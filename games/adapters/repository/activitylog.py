@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import pickle
+import threading
+import uuid
+from datetime import datetime
+from typing import Iterable, Iterator
+
+from games.domainmodel.model import Game, Review, User
+
+# bump whenever the checkpoint layout changes, older checkpoints are then
+# converted by _load_checkpoint, or refused rather than misread
+CHECKPOINT_VERSION = 2
+CHECKPOINT_MAGIC = b'USERSNAP'
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityLog:
+    """
+    Append only log of the user data MemoryRepository keeps, so it survives
+    a restart: registrations, reviews and wishlist changes, one line of json
+    each. Lines are handed to the OS as they're written, which is enough to
+    survive the process dying. fsync, which survives a power cut, is batched:
+    a background thread syncs every sync_interval seconds if anything was
+    written, or every write is synced when sync_interval is 0.
+
+    Once checkpoint_every records have been written the same thread folds
+    them into a checkpoint, path + '.snapshot', which keeps just the final
+    state: each user with their reviews and wishlist. The log then starts
+    again empty, so a restart reads the checkpoint and a short tail instead
+    of every change ever made
+    """
+
+    def __init__(self, path, sync_interval: float = 1.0, checkpoint_every: int = 0):
+        self.__path = path
+        self.__checkpoint_path = f'{path}.snapshot'
+        # the log being folded into the checkpoint
+        self.__sealed_path = f'{path}.compacting'
+        self.__sync_interval = sync_interval
+        self.__checkpoint_every = checkpoint_every
+        self.__lock = threading.Lock()
+        self.__checkpoint_lock = threading.Lock()
+        self.__skipped = 0
+
+        if os.path.exists(self.__sealed_path):
+            # a checkpoint was cut short, finish it
+            self.__compact()
+        _drop_torn_tail(path)
+        self.__since_checkpoint = _count_lines(path)
+        self.__file = self.__open_segment()
+        self.__unsynced = False
+        self.__checkpoint_wanted = False
+
+        self.__closed = False
+        self.__wake = threading.Event()
+        self.__worker = None
+        if sync_interval > 0 or checkpoint_every > 0:
+            self.__worker = threading.Thread(target=self.__work, name='activity-log', daemon=True)
+            self.__worker.start()
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def checkpoint_path(self):
+        return self.__checkpoint_path
+
+    @property
+    def skipped(self) -> int:
+        """Lines records() couldn't read"""
+        return self.__skipped
+
+    def records(self) -> Iterator[dict]:
+        """Every record, oldest first: the checkpoint's, then the log written since"""
+        yield from _checkpoint_records(_load_checkpoint(self.__checkpoint_path)[0])
+        for record in self.__read_segment(self.__path):
+            if record.get('op') != 'segment':
+                yield record
+
+    def append(self, record: dict):
+        """
+        Write the record, raising OSError if it couldn't be, e.g. when the
+        disk is full. A record that fails leaves nothing of itself in the log
+        """
+        line = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with self.__lock:
+            # not tell(), which a failed write may have left past the end
+            end = self.__file.seek(0, os.SEEK_END)
+            try:
+                # unbuffered, so a failed line isn't left in a buffer for the next write to flush
+                written = 0
+                while written < len(line):
+                    written += self.__file.write(line[written:])
+                if self.__sync_interval > 0:
+                    self.__unsynced = True
+                else:
+                    os.fsync(self.__file.fileno())
+            except OSError:
+                os.ftruncate(self.__file.fileno(), end)
+                raise
+            self.__since_checkpoint += 1
+            if self.__checkpoint_every and self.__since_checkpoint >= self.__checkpoint_every \
+                    and not self.__checkpoint_wanted:
+                self.__checkpoint_wanted = True
+                self.__wake.set()
+
+    def sync(self):
+        """fsync anything written since the last sync"""
+        with self.__lock:
+            if self.__unsynced and not self.__file.closed:
+                os.fsync(self.__file.fileno())
+                self.__unsynced = False
+
+    def checkpoint(self):
+        """
+        Fold everything logged so far into the checkpoint and start the log
+        again. Appends only wait for the log file to be swapped, not for the
+        checkpoint to be written
+        """
+        with self.__checkpoint_lock:
+            if os.path.exists(self.__sealed_path):
+                # the last checkpoint failed part way, e.g. the disk was full
+                self.__compact()
+            with self.__lock:
+                os.fsync(self.__file.fileno())
+                self.__file.close()
+                os.replace(self.__path, self.__sealed_path)
+                self.__file = self.__open_segment()
+                self.__unsynced = False
+                self.__since_checkpoint = 0
+                self.__checkpoint_wanted = False
+            self.__compact()
+
+    def close(self):
+        self.__closed = True
+        self.__wake.set()
+        if self.__worker is not None:
+            self.__worker.join()
+        self.sync()
+        with self.__lock:
+            self.__file.close()
+
+    def __work(self):
+        while True:
+            self.__wake.wait(self.__sync_interval if self.__sync_interval > 0 else None)
+            self.__wake.clear()
+            if self.__closed:
+                return
+            # nothing may end this thread, or syncs and checkpoints would quietly stop
+            try:
+                self.sync()
+            except Exception:
+                logger.exception("Failed to sync %s", self.__path)
+            if self.__checkpoint_wanted:
+                try:
+                    self.checkpoint()
+                except Exception:
+                    # the records are safe in the log, the next checkpoint tries again
+                    self.__checkpoint_wanted = False
+                    logger.exception("Failed to checkpoint %s", self.__path)
+
+    def __open_segment(self):
+        file = open(self.__path, 'ab', buffering=0)
+        if file.tell() == 0:
+            # tells a checkpoint whether it already holds this log, if a
+            # crash came between writing the checkpoint and removing the log
+            file.write((json.dumps({'op': 'segment', 'id': uuid.uuid4().hex}) + '\n').encode('utf-8'))
+        return file
+
+    def __compact(self):
+        """Fold the sealed log into the checkpoint, then drop it"""
+        state, folded_segment = _load_checkpoint(self.__checkpoint_path)
+        records = self.__read_segment(self.__sealed_path)
+        header = next(records, None)
+        segment = header.get('id') if header is not None and header.get('op') == 'segment' else None
+        if segment is None or segment != folded_segment:
+            if header is not None and segment is None:
+                _fold(state, header)
+            for record in records:
+                _fold(state, record)
+            _save_checkpoint(self.__checkpoint_path, state, segment)
+        records.close()
+        os.remove(self.__sealed_path)
+
+    def __read_segment(self, path) -> Iterator[dict]:
+        try:
+            file = open(path, encoding='utf-8')
+        except FileNotFoundError:
+            return
+        with file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    self.__skipped += 1
+                    continue
+                if isinstance(record, dict):
+                    yield record
+                else:
+                    self.__skipped += 1
+
+
+def _fold(state: dict, record: dict):
+    """
+    Apply a record to the checkpoint state: username -> [password, {(game id,
+    comment): (rating, time)}, {game id: None} for the wishlist in order]. The
+    same rules as replaying it into a repository: a user can review a game
+    more than once, but of two reviews with the same comment, which are equal,
+    the first is the one kept
+    """
+    try:
+        op = record['op']
+        if op == 'user':
+            state.setdefault(record['user'], [record['password'], {}, {}])
+            return
+        user = state.get(record['user'])
+        if user is None:
+            return
+        if op == 'review':
+            user[1].setdefault((record['game'], record['comment']), (record['rating'], record.get('time')))
+        elif op == 'wish':
+            user[2].setdefault(record['game'], None)
+        elif op == 'unwish':
+            user[2].pop(record['game'], None)
+    except (KeyError, TypeError):
+        pass
+
+
+def _checkpoint_records(state: dict) -> Iterable[dict]:
+    for username, (password, reviews, wishlist) in state.items():
+        yield {'op': 'user', 'user': username, 'password': password}
+        for (game_id, comment), (rating, time) in reviews.items():
+            yield {'op': 'review', 'user': username, 'game': game_id,
+                   'rating': rating, 'comment': comment, 'time': time}
+        for game_id in wishlist:
+            yield {'op': 'wish', 'user': username, 'game': game_id}
+
+
+def _load_checkpoint(path) -> tuple[dict, str | None]:
+    """The checkpoint's state, and the id of the last log folded into it"""
+    try:
+        with open(path, 'rb') as file:
+            if file.read(len(CHECKPOINT_MAGIC)) != CHECKPOINT_MAGIC:
+                raise ValueError(f"{path} is not a user data checkpoint")
+            version, folded_segment = pickle.load(file)
+            if version == 1:
+                # reviews were keyed by game alone, one per user and game
+                return {username: [password, {(game_id, comment): (rating, time)
+                                              for game_id, (rating, comment, time) in reviews.items()}, wishlist]
+                        for username, (password, reviews, wishlist) in pickle.load(file).items()}, folded_segment
+            if version != CHECKPOINT_VERSION:
+                raise ValueError(f"{path} is checkpoint version {version}, expected {CHECKPOINT_VERSION}")
+            return pickle.load(file), folded_segment
+    except FileNotFoundError:
+        return {}, None
+
+
+def _save_checkpoint(path, state: dict, folded_segment: str | None):
+    # write, sync then rename, so a crash never leaves a half written checkpoint behind
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(CHECKPOINT_MAGIC)
+        pickle.dump((CHECKPOINT_VERSION, folded_segment), file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_path, path)
+
+
+def _count_lines(path) -> int:
+    try:
+        with open(path, 'rb') as file:
+            return sum(block.count(b'\n') for block in iter(lambda: file.read(1 << 20), b''))
+    except FileNotFoundError:
+        return 0
+
+
+def _drop_torn_tail(path):
+    """Cut off a last line the process died part way through writing, so new lines don't run on from it"""
+    try:
+        with open(path, 'rb+') as file:
+            size = file.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            file.seek(size - 1)
+            if file.read(1) == b'\n':
+                return
+            # walk back to the last complete line
+            position = size
+            while position > 0:
+                block_start = max(position - 4096, 0)
+                file.seek(block_start)
+                block = file.read(position - block_start)
+                newline = block.rfind(b'\n')
+                if newline != -1:
+                    file.truncate(block_start + newline + 1)
+                    return
+                position = block_start
+            file.truncate(0)
+    except FileNotFoundError:
+        pass
+
+
+def user_record(user: User) -> dict:
+    return {'op': 'user', 'user': user.username, 'password': user.password}
+
+
+def review_record(review: Review) -> dict:
+    return {'op': 'review', 'user': review.user.username, 'game': review.game.game_id,
+            'rating': review.rating, 'comment': review.comment, 'time': review.time.isoformat()}
+
+
+def wishlist_record(user: User, game: Game, added: bool) -> dict:
+    return {'op': 'wish' if added else 'unwish', 'user': user.username, 'game': game.game_id}
+
+
+def review_time(record: dict) -> datetime | None:
+    try:
+        return datetime.fromisoformat(record['time'])
+    except (KeyError, TypeError, ValueError):
+        return None
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
-from sqlalchemy import func
+from datetime import date, datetime
+from itertools import islice
 
-from games.adapters.repository.abstractrepo import AbstractRepository
-from games.domainmodel.model import Genre, Game, Publisher, User, Review
-from typing import List
+from sqlalchemy import delete, func, insert, select
 
-from sqlalchemy.orm import scoped_session
+from games.adapters.repository.abstractrepo import AbstractRepository, DEFAULT_BATCH_SIZE
+from games.domainmodel.model import Genre, Game, Publisher, User, Review, Platform
+from games.adapters.repository.orm import (
+    game_table, genre_table, publisher_table, game_genre_table, game_tag_table, user_table, tag_rows
+)
+from games.adapters.repository.userdirectory import BloomFilter, normalize_username
+from typing import List, Iterable
 
+from sqlalchemy.orm import scoped_session
 
 class SessionContextManager:
     def __init__(self, session_factory):
@@ -31,17 +37,20 @@ class SessionContextManager:
         self.__session.rollback()
 
     def reset_session(self):
-        self.close_current_session()
-        self.__session = scoped_session(self.__session_factory)
+        # scoped_session keeps a session per thread, dropping this thread's
+        # means the next use starts a fresh one without touching other
+        # threads' requests
+        self.__session.remove()
 
     def close_current_session(self):
-        if self.__session is not None:
-            self.__session.close()
+        self.__session.remove()
 
 
 class DatabaseRepository(AbstractRepository):
     def __init__(self, session_factory):
         self.__scm = SessionContextManager(session_factory)
+        # every stored username, loaded on first use by user_might_exist
+        self.__usernames: BloomFilter | None = None
 
     def close_session(self):
         self.__scm.close_current_session()
@@ -65,8 +74,73 @@ class DatabaseRepository(AbstractRepository):
     def add_game(self, game: Game):
         with self.__scm as scm:
             scm.session.merge(game)
+            _store_game_tags(scm.session, game)
             scm.commit()
 
+    def update_game(self, game: Game):
+        with self.__scm as scm:
+            existing_game = scm.session.get(Game, game.game_id)
+            if existing_game is None:
+                scm.session.merge(game)
+            else:
+                # merging the whole game would also overwrite its reviews, only copy the details
+                if game.publisher is not None:
+                    game.publisher = scm.session.merge(game.publisher)
+                genres = game.genres
+                for index, genre in enumerate(genres):
+                    genres[index] = scm.session.merge(genre)
+                existing_game.update_details(game)
+            _store_game_tags(scm.session, game)
+            scm.commit()
+
+    def load_games(self, games: Iterable[Game], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """
+        Insert games with Core executemany, one transaction per batch, instead
+        of a merge and commit per object. Games, genres and publishers that are
+        already stored are left as they are
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be a positive integer!")
+
+        with self.__scm as scm:
+            session = scm.session
+            known_game_ids = set(session.scalars(select(game_table.c.gameID)))
+            known_genres = set(session.scalars(select(genre_table.c.genreName)))
+            known_publishers = set(session.scalars(select(publisher_table.c.publisherName)))
+
+            count = 0
+            games = iter(games)
+            while batch := list(islice(games, batch_size)):
+                game_rows, genre_rows, publisher_rows, game_genre_rows, game_tag_rows = [], [], [], [], []
+                for game in batch:
+                    if game.game_id in known_game_ids:
+                        continue
+                    known_game_ids.add(game.game_id)
+                    game_rows.append(_game_row(game))
+                    game_tag_rows.extend(tag_rows(game.game_id, game.tags))
+
+                    publisher = game.publisher
+                    if publisher is not None and publisher.publisher_name not in known_publishers:
+                        known_publishers.add(publisher.publisher_name)
+                        publisher_rows.append({'publisherName': publisher.publisher_name})
+
+                    for genre_name in dict.fromkeys(genre.genre_name for genre in game.genres):
+                        if genre_name not in known_genres:
+                            known_genres.add(genre_name)
+                            genre_rows.append({'genreName': genre_name})
+                        game_genre_rows.append({'gameID': game.game_id, 'genreName': genre_name})
+
+                # parents first, so foreign keys hold within the batch
+                for table, rows in ((publisher_table, publisher_rows), (genre_table, genre_rows),
+                                    (game_table, game_rows), (game_genre_table, game_genre_rows),
+                                    (game_tag_table, game_tag_rows)):
+                    if rows:
+                        session.execute(insert(table), rows)
+                scm.commit()
+                count += len(game_rows)
+
+        return count
+
     def add_publisher(self, publisher: Publisher):
         with self.__scm as scm:
             scm.session.merge(publisher)
@@ -96,18 +170,70 @@ class DatabaseRepository(AbstractRepository):
         games = self.__scm.session.query(Game).filter(Game.publisher == publisher).all()
         return games
 
+    def get_games_by_tags(self, tags: List[str], platforms: Platform = Platform(0)) -> List[Game]:
+        query = self.__scm.session.query(Game)
+        if platforms:
+            # a bitwise & can't use the index, the bitmasks that include the platforms can
+            query = query.filter(Game._Game__platforms.in_(_platform_masks(platforms)))
+        for tag in tags:
+            tagged = select(game_tag_table.c.gameID).where(game_tag_table.c.tag == tag.strip().lower())
+            query = query.filter(Game._Game__game_id.in_(tagged))
+        return query.order_by(func.lower(Game._Game__game_title)).all()
+
+    def get_games_by_release_range(self, start: date, end: date) -> List[Game]:
+        if not isinstance(start, date) or not isinstance(end, date):
+            return []
+        # the column holds plain dates, a datetime wouldn't compare as one
+        start = start.date() if isinstance(start, datetime) else start
+        end = end.date() if isinstance(end, datetime) else end
+        release_date = Game._Game__release_date
+        return (self.__scm.session.query(Game)
+                .filter(release_date >= start, release_date < end)
+                .order_by(release_date, func.lower(Game._Game__game_title), Game._Game__game_id)
+                .all())
+
     def get_number_of_games(self) -> int:
         return self.__scm.session.query(Game).count()
 
     def add_user(self, user: User):
         with self.__scm as scm:
+            # by primary key, which is indexed. Another process may have taken
+            # the name since user_might_exist said it was free
+            if scm.session.get(User, user.username) is not None:
+                return False
             scm.session.merge(user)
             scm.commit()
+        if self.__usernames is not None:
+            if len(self.__usernames) >= self.__usernames.capacity:
+                # reloaded with room to spare next time it's needed
+                self.__usernames = None
+            else:
+                self.__usernames.add(user.username)
+        return True
+
+    def user_might_exist(self, username: str) -> bool:
+        """
+        Checked against a Bloom filter of the usernames, so registering a
+        new name doesn't need get_user's case-insensitive query, which
+        can't use the primary key index
+        """
+        if not isinstance(username, str):
+            return False
+        if self.__usernames is None:
+            with self.__scm as scm:
+                usernames = scm.session.execute(select(user_table.c.username)).scalars().all()
+            self.__usernames = BloomFilter(capacity=max(2 * len(usernames), 1024))
+            for stored_username in usernames:
+                self.__usernames.add(stored_username)
+        return self.__usernames.might_contain(normalize_username(username))
 
     def get_user(self, username: str) -> User | None:
         user = self.__scm.session.query(User).filter(func.lower(User._User__username) == username.lower()).first()
         return user
 
+    def get_users(self) -> List[User]:
+        return self.__scm.session.query(User).order_by(User._User__username).all()
+
     def add_to_wishlist(self, user: User, game: Game):
         with self.__scm as scm:
             user.add_favourite_game(game)
@@ -120,6 +246,46 @@ class DatabaseRepository(AbstractRepository):
 
     def add_review(self, review: Review, user: User, game: Game):
         with self.__scm as scm:
-            user.add_review(review)
-            game.add_review(review)
+            # loading the reviews collections must not flush the new review
+            # first, or it's already in game.reviews and misses the rating totals
+            with scm.session.no_autoflush:
+                game.add_review(review)
+                user.add_review(review)
             scm.commit()
+
+
+def _game_row(game: Game) -> dict:
+    return {
+        'gameID': game.game_id,
+        'title': game.title,
+        'price': game.price,
+        'releaseDate': game.release_date,
+        'description': game.description,
+        'imageURL': game.image_url,
+        'websiteURL': game.website_url,
+        'publisherName': game.publisher.publisher_name if game.publisher is not None else None,
+        'platforms': game.platforms,
+        'tags': game.tag_ids,
+        'categories': game.categories,
+        'developers': game.developers,
+        'supportedLanguages': game.supported_languages,
+        'ratingCount': game.rating_count,
+        'ratingSum': game.rating_sum,
+        'ratingHistogram': game.rating_histogram,
+    }
+
+
+def _store_game_tags(session, game: Game):
+    """Replace the game's GameTag rows with its current tags"""
+    # the game's row goes in first, GameTag refers to it
+    session.flush()
+    session.execute(delete(game_tag_table).where(game_tag_table.c.gameID == game.game_id))
+    rows = tag_rows(game.game_id, game.tags)
+    if rows:
+        session.execute(insert(game_tag_table), rows)
+
+
+def _platform_masks(platforms: Platform) -> list[int]:
+    """Every platforms bitmask that includes all of the given platforms"""
+    platforms = int(platforms)
+    return [mask for mask in range(int(sum(Platform)) + 1) if mask & platforms == platforms]
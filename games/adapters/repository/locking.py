@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from threading import Condition, Lock, get_ident
+from typing import Callable
+
+
+class ReadWriteLock:
+    """
+    Any number of readers at once, or one writer. Waiting writers go ahead
+    of new readers so a steady stream of reads can't starve them. The
+    writing thread may take the lock again, for reading or writing, e.g.
+    when one bulk write calls another. on_write_done, if given, is called
+    as the outermost write ends, while the writer still holds the lock
+    """
+
+    def __init__(self, on_write_done: Callable[[], None] = None):
+        self.__on_write_done = on_write_done
+        self.__condition = Condition(Lock())
+        self.__readers = 0
+        self.__writer: int | None = None
+        self.__write_depth = 0
+        self.__writers_waiting = 0
+        # built once, a write is taken for every game added one at a time
+        self.__reading = _Held(self.acquire_read, self.release_read)
+        self.__writing = _Held(self.acquire_write, self.release_write)
+
+    def read(self) -> _Held:
+        """with lock.read(): ..."""
+        return self.__reading
+
+    def write(self) -> _Held:
+        """with lock.write(): ..."""
+        return self.__writing
+
+    def acquire_read(self):
+        if self.__writer == get_ident():
+            # the writer already excludes everyone else
+            return
+        with self.__condition:
+            while self.__writer is not None or self.__writers_waiting:
+                self.__condition.wait()
+            self.__readers += 1
+
+    def release_read(self):
+        # a thread holding a read lock can't become the writer, so if it is
+        # the writer its acquire_read didn't take anything
+        if self.__writer == get_ident():
+            return
+        with self.__condition:
+            self.__readers -= 1
+            if not self.__readers:
+                self.__condition.notify_all()
+
+    def acquire_write(self):
+        me = get_ident()
+        with self.__condition:
+            if self.__writer != me:
+                self.__writers_waiting += 1
+                try:
+                    while self.__writer is not None or self.__readers:
+                        self.__condition.wait()
+                finally:
+                    self.__writers_waiting -= 1
+                self.__writer = me
+            self.__write_depth += 1
+
+    def release_write(self):
+        try:
+            # only the writer changes the depth, so it can be read without the condition
+            if self.__write_depth == 1 and self.__on_write_done is not None:
+                self.__on_write_done()
+        finally:
+            with self.__condition:
+                self.__write_depth -= 1
+                if not self.__write_depth:
+                    self.__writer = None
+                    self.__condition.notify_all()
+
+
+class _Held:
+    """Context manager for one side of a ReadWriteLock, shared by every thread"""
+    __slots__ = ('__acquire', '__release')
+
+    def __init__(self, acquire, release):
+        self.__acquire = acquire
+        self.__release = release
+
+    def __enter__(self):
+        self.__acquire()
+
+    def __exit__(self, *exc_info):
+        self.__release()
@@ -1,146 +1,609 @@
 from __future__ import annotations
 
-from games.adapters.repository.abstractrepo import AbstractRepository
-from games.domainmodel.model import Genre, Game, Publisher, User, Review
+from games.adapters.repository.abstractrepo import AbstractRepository, DEFAULT_BATCH_SIZE
+from games.domainmodel.model import Genre, Game, Publisher, User, Review, Platform, TAGS, search_key
+from games.domainmodel.registry import EntityRegistry
+from games.adapters.repository.userdirectory import UserDirectory
+from games.adapters.repository.locking import ReadWriteLock
+from games.adapters.repository.activitylog import (
+    ActivityLog, review_record, review_time, user_record, wishlist_record
+)
 
-from typing import List
+from typing import Iterable, List
+from datetime import date
 from bisect import bisect_left, insort_left
+from collections.abc import Sequence
+from operator import attrgetter
+from threading import Lock
+
+# alphabetical, ignoring case and accents, games with the same title by id
+TITLE_ORDER = attrgetter('title_key', 'game_id')
+
+
+# each platform with its plain int flag, cheaper to test than the enum
+PLATFORM_FLAGS = tuple((platform, int(platform)) for platform in Platform)
+
+
+class ReadOnlyView(Sequence):
+    """
+    A read only sequence over one published version of a catalog list, so
+    handing it out costs nothing. Compares equal to a list or tuple with the
+    same items; slicing gives a plain list or tuple
+    """
+    __slots__ = ('__items',)
+
+    def __init__(self, items: Sequence):
+        self.__items = items
+
+    def __getitem__(self, index):
+        return self.__items[index]
+
+    def __len__(self) -> int:
+        return len(self.__items)
+
+    def __iter__(self):
+        return iter(self.__items)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ReadOnlyView):
+            other = other.__items
+        if not isinstance(other, (list, tuple)):
+            return NotImplemented
+        return len(self.__items) == len(other) and all(a == b for a, b in zip(self.__items, other))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self.__items))
+
+
+NO_GAMES = ReadOnlyView(())
+
+
+class CatalogVersion:
+    """
+    One published state of the title ordered catalog lists, never changed
+    once published. Writers change the repository's working lists, and
+    publish a new version as their write ends, sharing every list that
+    didn't change with the one before
+    """
+    __slots__ = ('games', 'genres', 'games_by_genre', 'games_by_publisher', 'games_by_release', 'release_days')
+
+    def __init__(self, games: ReadOnlyView = NO_GAMES, genres: ReadOnlyView = NO_GAMES,
+                 games_by_genre: dict[Genre, ReadOnlyView] = None,
+                 games_by_publisher: dict[Publisher, ReadOnlyView] = None,
+                 games_by_release: tuple[Game, ...] = (), release_days: tuple[int, ...] = ()):
+        self.games = games
+        self.genres = genres
+        self.games_by_genre = games_by_genre if games_by_genre is not None else {}
+        self.games_by_publisher = games_by_publisher if games_by_publisher is not None else {}
+        # the games with a release date by day then title, and the day of each to bisect
+        self.games_by_release = games_by_release
+        self.release_days = release_days
 
 
 class MemoryRepository(AbstractRepository):
-    def __init__(self, genres=[], games=[], users=[], publishers=[]):
-        self.__genres = genres
-        self.__games = games
-        self.__users = users
-        self.__publishers = publishers
+    """
+    Safe to share between request threads. Catalog writes (loading and
+    reloading games, genres and publishers) hold the catalog lock
+    exclusively. The title ordered lists readers get come from an immutable
+    CatalogVersion that each write publishes before it lets go of the lock:
+    reading one takes no lock, and a game added while a search walks the
+    list can't upset the search. Point lookups are single dict
+    accesses, which the GIL makes atomic, so they take no lock either, and
+    queries that walk the indexes share it. User, review and wishlist
+    writes are serialised by their own lock, so they never wait for catalog
+    readers
+    """
+
+    def __init__(self, genres=None, games=None, users=None, publishers=None):
+        self.__catalog_lock = ReadWriteLock(on_write_done=self.__publish_changes)
+        self.__user_lock = Lock()
+        self.__genres = genres if genres is not None else []
+
+        # one shared Genre/Publisher object per name across the whole catalog
+        self.__registry = EntityRegistry()
+        for index, genre in enumerate(self.__genres):
+            self.__genres[index] = self.__registry.intern_genre(genre)
+
+        # primary indexes, every point lookup is one dict access. Genres and
+        # publishers are keyed by search_key, case and accents don't matter
+        self.__genres_by_key: dict[str, Genre] = {genre.name_key: genre for genre in self.__genres}
+        self.__publishers_by_key: dict[str, Publisher] = {}
+        for publisher in publishers or ():
+            self.__publishers_by_key.setdefault(publisher.name_key, self.__registry.intern_publisher(publisher))
+        self.__users = UserDirectory(users or ())
+        # where user writes are saved, see attach_activity_log
+        self.__activity_log: ActivityLog | None = None
+        self.__games_by_id: dict[int, Game] = {}
+        # title key -> the game with that title and the lowest id
+        self.__games_by_title_key: dict[str, Game] = {}
+        # tag id / platform flag -> {game id: game}, so tag and platform queries never scan the catalog
+        self.__games_by_tag: dict[int, dict[int, Game]] = {}
+        # lowercased tag name -> ids of every spelling of it
+        self.__tag_ids_by_name: dict[str, set[int]] = {}
+        self.__games_by_platform: dict[Platform, dict[int, Game]] = {platform: {} for platform in Platform}
+        # genre / publisher -> its games in title order
+        self.__games_by_genre: dict[Genre, list[Game]] = {}
+        self.__games_by_publisher: dict[Publisher, list[Game]] = {}
+        # the games in title order, kept sorted as games are added or retitled
+        self.__games_by_title: list[Game] = []
+        # the games with a release date by day then title, and the day of each
+        self.__games_by_release: list[Game] = []
+        self.__release_days: list[int] = []
+
+        # what changed in the lists above since the catalog was last published
+        self.__titles_changed = False
+        self.__release_changed = False
+        self.__genre_list_changed = True
+        self.__changed_genres: set[Genre] = set()
+        self.__changed_publishers: set[Publisher] = set()
+        self.__catalog = CatalogVersion()
+        self.add_games(games or ())
+
+    @property
+    def registry(self) -> EntityRegistry:
+        return self.__registry
+
+    @property
+    def catalog(self) -> CatalogVersion:
+        """
+        The current catalog version. A reader that needs several lists to
+        agree with each other takes them all from one version
+        """
+        return self.__catalog
+
+    def batch_writes(self):
+        """
+        Catalog writes made in this context are published together when it
+        ends, e.g. a reload's new and changed games. Holds the catalog lock
+        """
+        return self.__catalog_lock.write()
+
+    def __publish_changes(self):
+        """Publish what the write that is ending changed, called with the catalog lock held"""
+        if (self.__titles_changed or self.__release_changed or self.__genre_list_changed
+                or self.__changed_genres or self.__changed_publishers):
+            self.__publish()
+
+    def __publish(self):
+        catalog = self.__catalog
+        games = ReadOnlyView(tuple(self.__games_by_title)) if self.__titles_changed else catalog.games
+        genres = ReadOnlyView(tuple(self.__genres)) if self.__genre_list_changed else catalog.genres
+        games_by_genre = catalog.games_by_genre
+        if self.__changed_genres:
+            games_by_genre = dict(games_by_genre)
+            for genre in self.__changed_genres:
+                games_by_genre[genre] = ReadOnlyView(tuple(self.__games_by_genre.get(genre, ())))
+        games_by_publisher = catalog.games_by_publisher
+        if self.__changed_publishers:
+            games_by_publisher = dict(games_by_publisher)
+            for publisher in self.__changed_publishers:
+                games_by_publisher[publisher] = ReadOnlyView(tuple(self.__games_by_publisher.get(publisher, ())))
+        games_by_release, release_days = catalog.games_by_release, catalog.release_days
+        if self.__release_changed:
+            games_by_release, release_days = tuple(self.__games_by_release), tuple(self.__release_days)
+        # one assignment, a reader sees either the old version or the new one
+        self.__catalog = CatalogVersion(games, genres, games_by_genre, games_by_publisher,
+                                        games_by_release, release_days)
+        self.__titles_changed = self.__release_changed = self.__genre_list_changed = False
+        self.__changed_genres = set()
+        self.__changed_publishers = set()
+
+    def load_games(self, games: Iterable[Game], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Bulk add the games and their genres and publishers, everything is sorted once at the end"""
+        with self.__catalog_lock.write():
+            added, genres, publishers = self.__add_games(games)
+            self.add_genres(genres)
+            self.add_publishers(publisher for publisher in publishers if publisher is not None)
+            return added
 
     def add_genre(self, genre: Genre):
-        if isinstance(genre, Genre) and self.get_genre(genre.genre_name) is None:
-            insort_left(self.__genres, genre)
-            return True
-        else:
-            return False
+        with self.__catalog_lock.write():
+            if isinstance(genre, Genre) and genre.name_key not in self.__genres_by_key:
+                genre = self.__registry.intern_genre(genre)
+                insort_left(self.__genres, genre)
+                self.__genres_by_key[genre.name_key] = genre
+                self.__genre_list_changed = True
+                return True
+            else:
+                return False
+
+    def add_genres(self, genres: Iterable[Genre]) -> int:
+        """add_genre for many genres, the genre list is sorted once instead of per genre"""
+        with self.__catalog_lock.write():
+            added = 0
+            for genre in genres:
+                if isinstance(genre, Genre) and genre.name_key not in self.__genres_by_key:
+                    genre = self.__registry.intern_genre(genre)
+                    self.__genres.append(genre)
+                    self.__genres_by_key[genre.name_key] = genre
+                    added += 1
+            if added:
+                self.__genres.sort()
+                self.__genre_list_changed = True
+            return added
 
-    def get_genres(self) -> List[Genre]:
-        return self.__genres
+    def get_genres(self) -> ReadOnlyView:
+        return self.catalog.genres
 
     def get_genre(self, genre_name: str) -> Genre | None:
+        if not isinstance(genre_name, str):
+            return None
+        return self.__genres_by_key.get(search_key(genre_name.strip()))
+
+    def add_game(self, game: Game) -> bool:
+        with self.__catalog_lock.write():
+            if isinstance(game, Game) and game.game_id not in self.__games_by_id:
+                self.__registry.intern_game(game)
+                self.__games_by_id[game.game_id] = game
+                insort_left(self.__games_by_title, game, key=TITLE_ORDER)
+                self.__titles_changed = True
+                self.__index_title(game)
+                self.__index_release(game)
+                self.__index_game(game)
+                return True
+            else:
+                return False
+
+    def add_games(self, games: Iterable[Game]) -> int:
+        """
+        add_game for many games: they're appended and the title ordered
+        indexes are sorted once at the end, rather than every game being
+        inserted into its place. Returns how many were added
+        """
+        with self.__catalog_lock.write():
+            return self.__add_games(games)[0]
+
+    def __add_games(self, games: Iterable[Game]) -> tuple[int, set[Genre], set[Publisher]]:
+        """add_games, also returning the genres and publishers of the games that were added"""
+        added = []
+        genres = set()
+        publishers = set()
         try:
-            # can binary search since sorted by username
-            target_genre = Genre(genre_name)
-            target_index = bisect_left(self.__genres, target_genre)
-            if self.__genres[target_index] == target_genre:
-                return self.__genres[target_index]
+            for game in games:
+                if isinstance(game, Game) and game.game_id not in self.__games_by_id:
+                    self.__registry.intern_game(game)
+                    self.__games_by_id[game.game_id] = game
+                    self.__index_title(game)
+                    self.__index_game(game, ordered=False)
+                    genres.update(game.genres)
+                    publishers.add(game.publisher)
+                    added.append(game)
+        finally:
+            # also when the stream fails part way, e.g. on an invalid csv row
+            if added:
+                added.sort(key=TITLE_ORDER)
+                _merge_in_title_order(self.__games_by_title, added)
+                self.__titles_changed = True
+                self.__merge_into_genres_and_publishers(added)
+                self.__merge_into_release_order(added)
+        return len(added), genres, publishers
+
+    def __merge_into_release_order(self, added: list[Game]):
+        """File games that are already in title order under their release days"""
+        dated = [game for game in added if game.release_date is not None]
+        if not dated:
+            return
+        if self.__games_by_release:
+            self.__games_by_release.extend(dated)
+            self.__games_by_release.sort(key=_release_order)
+        else:
+            # the sort is stable, so games out the same day stay in title order
+            dated.sort(key=_release_day)
+            self.__games_by_release = dated
+        self.__release_days = [_release_day(game) for game in self.__games_by_release]
+        self.__release_changed = True
+
+    def __merge_into_genres_and_publishers(self, added: list[Game]):
+        """File games that are already in title order under their genres and publishers"""
+        games_by_genre: dict[Genre, list[Game]] = {}
+        games_by_publisher: dict[Publisher, list[Game]] = {}
+        for game in added:
+            for genre in game.genres:
+                games_by_genre.setdefault(genre, []).append(game)
+            if game.publisher is not None:
+                games_by_publisher.setdefault(game.publisher, []).append(game)
+        for genre, genre_games in games_by_genre.items():
+            _merge_in_title_order(self.__games_by_genre.setdefault(genre, []), genre_games)
+        for publisher, publisher_games in games_by_publisher.items():
+            _merge_in_title_order(self.__games_by_publisher.setdefault(publisher, []), publisher_games)
+        self.__changed_genres.update(games_by_genre)
+        self.__changed_publishers.update(games_by_publisher)
+
+    def update_game(self, game: Game):
+        with self.__catalog_lock.write():
+            if not isinstance(game, Game):
+                return
+            existing_game = self.__games_by_id.get(game.game_id)
+            if existing_game is None:
+                self.add_game(game)
             else:
-                return None
-        except IndexError:
-            return None
+                # update in place, users' reviews and wishlists keep pointing at the same object
+                self.__registry.intern_game(game)
+                self.__unindex_game(existing_game)
+                title_index = bisect_left(self.__games_by_title, TITLE_ORDER(existing_game), key=TITLE_ORDER)
+                del self.__games_by_title[title_index]
+                self.__unindex_title(existing_game, title_index)
+                self.__unindex_release(existing_game)
+                existing_game.update_details(game)
+                insort_left(self.__games_by_title, existing_game, key=TITLE_ORDER)
+                self.__titles_changed = True
+                self.__index_title(existing_game)
+                self.__index_release(existing_game)
+                self.__index_game(existing_game)
 
+    def __index_release(self, game: Game):
+        if game.release_date is None:
+            return
+        index = bisect_left(self.__games_by_release, _release_order(game), key=_release_order)
+        self.__games_by_release.insert(index, game)
+        self.__release_days.insert(index, _release_day(game))
+        self.__release_changed = True
 
-    def add_game(self, game: Game) -> bool:
-        if isinstance(game, Game) and self.get_game_by_id(game.game_id) is None:
-            insort_left(self.__games, game)
-            return True
+    def __unindex_release(self, game: Game):
+        """Drop the game from the release order, before its details change"""
+        if game.release_date is None:
+            return
+        index = bisect_left(self.__games_by_release, _release_order(game), key=_release_order)
+        if index < len(self.__games_by_release) and self.__games_by_release[index] is game:
+            del self.__games_by_release[index]
+            del self.__release_days[index]
+            self.__release_changed = True
+
+    def __index_title(self, game: Game):
+        current = self.__games_by_title_key.get(game.title_key)
+        if current is None or game.game_id < current.game_id:
+            self.__games_by_title_key[game.title_key] = game
+
+    def __unindex_title(self, game: Game, title_index: int):
+        """Drop the game from the title key index, after taking it out of the title list at title_index"""
+        if self.__games_by_title_key.get(game.title_key) is not game:
+            return
+        # the next game with the same title, if any, sits where this one was
+        if title_index < len(self.__games_by_title) and self.__games_by_title[title_index].title_key == game.title_key:
+            self.__games_by_title_key[game.title_key] = self.__games_by_title[title_index]
         else:
-            return False
+            del self.__games_by_title_key[game.title_key]
+
+    def __index_game(self, game: Game, ordered: bool = True):
+        """Add the game to the tag and platform indexes, and unless ordered is False the title ordered ones"""
+        for tag_id in game.tag_ids:
+            if tag_id not in self.__games_by_tag:
+                self.__games_by_tag[tag_id] = {}
+                self.__tag_ids_by_name.setdefault(TAGS.name(tag_id).lower(), set()).add(tag_id)
+            self.__games_by_tag[tag_id][game.game_id] = game
+        platforms = int(game.platforms)
+        for platform, flag in PLATFORM_FLAGS:
+            if platforms & flag:
+                self.__games_by_platform[platform][game.game_id] = game
+        if not ordered:
+            return
+        for genre in game.genres:
+            insort_left(self.__games_by_genre.setdefault(genre, []), game, key=TITLE_ORDER)
+            self.__changed_genres.add(genre)
+        if game.publisher is not None:
+            insort_left(self.__games_by_publisher.setdefault(game.publisher, []), game, key=TITLE_ORDER)
+            self.__changed_publishers.add(game.publisher)
 
-    def get_games(self) -> List[Game]:
-        """return list of games in alphabetical order, case-insensitive"""
-        return sorted(self.__games, key=lambda g: g.title.lower())
+    def __unindex_game(self, game: Game):
+        for tag_id in game.tag_ids:
+            self.__games_by_tag.get(tag_id, {}).pop(game.game_id, None)
+        for platform_games in self.__games_by_platform.values():
+            platform_games.pop(game.game_id, None)
+        for genre in game.genres:
+            _remove_in_title_order(self.__games_by_genre.get(genre, []), game)
+            self.__changed_genres.add(genre)
+        if game.publisher is not None:
+            _remove_in_title_order(self.__games_by_publisher.get(game.publisher, []), game)
+            self.__changed_publishers.add(game.publisher)
+
+    def get_games(self) -> ReadOnlyView:
+        """return the games in alphabetical order, case-insensitive, as a read only view"""
+        return self.catalog.games
 
     def get_game_by_id(self, game_id: int) -> Game | None:
-        try:
-            # can binary search because it's id
-            target_game = Game(game_id, "")
-            target_index = bisect_left(self.__games, target_game)
-            if self.__games[target_index] == target_game:
-                return self.__games[target_index]
-            else:
-                return None
-        except IndexError:
-            return None
+        game = self.__games_by_id.get(game_id)
+        if game is None and (type(game_id) is not int or game_id < 0):
+            raise ValueError("Game ID should be a positive integer!")
+        return game
 
     def get_game_by_title(self, game_title: str) -> Game | None:
-        if isinstance(game_title, str):
-            # not sorted by title, has to look one by one
-            for game in self.__games:
-                if game.title.lower() == game_title.lower():
-                    return game
-        return None
+        if not isinstance(game_title, str):
+            return None
+        return self.__games_by_title_key.get(search_key(game_title.strip()))
 
-    def get_games_by_genre(self, genre: Genre) -> List[Game]:
+    def get_games_by_genre(self, genre: Genre) -> Sequence[Game]:
         """
         Return all games with the genre in alphabetical order,
         case-insensitive
         """
-        games = []
-
-        for game in self.__games:
-            if genre in game.genres:
-                games.append(game)
+        if not isinstance(genre, Genre):
+            return []
+        # the games are filed under the stored genre, whose name may differ in case or accents
+        genre = self.__genres_by_key.get(genre.name_key, genre)
+        return self.catalog.games_by_genre.get(genre, NO_GAMES)
 
-        return sorted(games, key=lambda g: g.title.lower())
-
-    def get_games_by_publisher(self, publisher: Publisher) -> List[Game]:
+    def get_games_by_publisher(self, publisher: Publisher) -> Sequence[Game]:
         """
         Return all games with the publisher in alphabetical order,
         case-insensitive
         """
-        games = []
+        if not isinstance(publisher, Publisher):
+            return []
+        publisher = self.__publishers_by_key.get(publisher.name_key, publisher)
+        return self.catalog.games_by_publisher.get(publisher, NO_GAMES)
+
+    def get_games_by_tags(self, tags: List[str], platforms: Platform = Platform(0)) -> List[Game]:
+        """
+        Return all games with every one of the tags that run on all of the
+        platforms, in alphabetical order, case-insensitive
+        """
+        with self.__catalog_lock.read():
+            buckets = []
+            for tag in tags:
+                tag_ids = list(self.__tag_ids_by_name.get(tag.strip().lower(), ()))
+                if len(tag_ids) == 1:
+                    buckets.append(self.__games_by_tag[tag_ids[0]])
+                else:
+                    # the same tag spelled differently, any spelling will do
+                    merged = {}
+                    for tag_id in tag_ids:
+                        merged.update(self.__games_by_tag.get(tag_id, {}))
+                    buckets.append(merged)
+            for platform in Platform:
+                if platform in platforms:
+                    buckets.append(self.__games_by_platform[platform])
+            if not buckets:
+                return []
+
+            # walk the smallest bucket and look the rest up, instead of scanning every game
+            buckets.sort(key=len)
+            games = [game for game_id, game in buckets[0].items()
+                     if all(game_id in bucket for bucket in buckets[1:])]
 
-        for game in self.__games:
-            if game.publisher == publisher:
-                games.append(game)
+        return sorted(games, key=TITLE_ORDER)
 
-        return sorted(games, key=lambda g: g.title.lower())
+    def get_games_by_release_range(self, start: date, end: date) -> List[Game]:
+        if not isinstance(start, date) or not isinstance(end, date):
+            return []
+        catalog = self.catalog
+        # both ends found by bisecting the days, then one slice
+        low = bisect_left(catalog.release_days, start.toordinal())
+        high = bisect_left(catalog.release_days, end.toordinal(), low)
+        return list(catalog.games_by_release[low:high])
 
     def get_number_of_games(self) -> int:
-        return len(self.__games)
+        return len(self.__games_by_id)
+
+    def attach_activity_log(self, activity_log: ActivityLog) -> int:
+        """
+        Replay the users, reviews and wishlist changes saved in the log, then
+        save every later one to it. Call after the catalog is loaded, so the
+        games the records refer to are there. Returns how many records were
+        applied; records for games that are no longer in the catalog are skipped
+        """
+        with self.__user_lock:
+            applied = sum(1 for record in activity_log.records() if self.__apply(record))
+            self.__activity_log = activity_log
+        return applied
+
+    def __apply(self, record: dict) -> bool:
+        try:
+            op = record['op']
+            if op == 'user':
+                return self.__users.add(User(record['user'], record['password']))
+            user = self.__users.get(record['user'])
+            game = self.__games_by_id.get(record['game'])
+            if user is None or game is None:
+                return False
+            if op == 'review':
+                review = Review(user, game, record['rating'], record['comment'], review_time(record))
+                user.add_review(review)
+                return game.add_review(review)
+            if op == 'wish':
+                user.add_favourite_game(game)
+                return True
+            if op == 'unwish':
+                user.remove_favourite_game(game)
+                return True
+        except (KeyError, TypeError, ValueError):
+            pass
+        return False
+
+    def __log(self, record: dict):
+        """
+        Write ahead: user writes check, log, then apply, so a change the log
+        couldn't take (e.g. the disk is full) is never made in memory either
+        """
+        if self.__activity_log is not None:
+            self.__activity_log.append(record)
 
     def add_user(self, user: User):
-        if isinstance(user, User) and self.get_user(user.username) is None:
-            insort_left(self.__users, user)
-            return True
-        else:
-            return False
+        with self.__user_lock:
+            if not isinstance(user, User) or user.username in self.__users:
+                return False
+            self.__log(user_record(user))
+            return self.__users.add(user)
 
     def get_user(self, username: str) -> User | None:
-        try:
-            # can binary search since sorted by username
-            target_user = User(username, 'dummy_password')
-            target_index = bisect_left(self.__users, target_user)
-            if self.__users[target_index] == target_user:
-                return self.__users[target_index]
-            else:
-                return None
-        except (IndexError, ValueError):
-            return None
+        return self.__users.get(username)
+
+    def add_users(self, users: Iterable[User]) -> int:
+        """add_user for many users, returns how many were added"""
+        with self.__user_lock:
+            added = 0
+            for user in users:
+                if isinstance(user, User) and user.username not in self.__users:
+                    self.__log(user_record(user))
+                    self.__users.add(user)
+                    added += 1
+            return added
+
+    def get_users(self) -> ReadOnlyView:
+        return ReadOnlyView(self.__users.ordered())
+
+    def user_might_exist(self, username: str) -> bool:
+        return self.__users.might_exist(username)
 
     def add_publisher(self, publisher: Publisher):
-        if isinstance(publisher, Publisher) and self.get_publisher(publisher.publisher_name) is None:
-            insort_left(self.__publishers, publisher)
-            return True
-        else:
-            return False
+        with self.__catalog_lock.write():
+            if isinstance(publisher, Publisher) and publisher.name_key not in self.__publishers_by_key:
+                self.__publishers_by_key[publisher.name_key] = self.__registry.intern_publisher(publisher)
+                return True
+            else:
+                return False
+
+    def add_publishers(self, publishers: Iterable[Publisher]) -> int:
+        """add_publisher for many publishers, returns how many were added"""
+        with self.__catalog_lock.write():
+            return sum(1 for publisher in publishers if self.add_publisher(publisher))
 
     def get_publisher(self, publisher_name: str) -> Publisher | None:
-        # binary search
-        try:
-            target_publisher = Publisher(publisher_name)
-            target_index = bisect_left(self.__publishers, target_publisher)
-            if self.__publishers[target_index] == target_publisher:
-                return self.__publishers[target_index]
-            else:
-                return None
-        except IndexError:
+        if not isinstance(publisher_name, str):
             return None
+        return self.__publishers_by_key.get(search_key(publisher_name.strip()))
 
     def add_to_wishlist(self, user: User, game: Game):
-        user.add_favourite_game(game)
+        with self.__user_lock:
+            if isinstance(game, Game) and game not in user.favourite_games:
+                self.__log(wishlist_record(user, game, added=True))
+                user.add_favourite_game(game)
 
     def remove_from_wishlist(self, user: User, game: Game):
-        user.remove_favourite_game(game)
+        with self.__user_lock:
+            if game in user.favourite_games:
+                self.__log(wishlist_record(user, game, added=False))
+                user.remove_favourite_game(game)
 
     def add_review(self, review: Review, user: User, game: Game):
-        user.add_review(review)
-        game.add_review(review)
+        with self.__user_lock:
+            if isinstance(review, Review) and review not in game.reviews:
+                self.__log(review_record(review))
+                game.add_review(review)
+            user.add_review(review)
+
+
+def _remove_in_title_order(games: list[Game], game: Game):
+    """Remove the game from a list kept in TITLE_ORDER, before the game is retitled"""
+    index = bisect_left(games, TITLE_ORDER(game), key=TITLE_ORDER)
+    if index < len(games) and games[index] is game:
+        del games[index]
+
+
+def _merge_in_title_order(games: list[Game], added: list[Game]):
+    """Merge games that are in TITLE_ORDER into a list that is too, in place"""
+    games.extend(added)
+    if len(games) > len(added):
+        # two sorted runs, which the sort merges in one pass
+        games.sort(key=TITLE_ORDER)
+
+
+def _release_day(game: Game) -> int:
+    """The day a game came out, as a date ordinal, so a time of day never matters"""
+    return game.release_date.toordinal()
+
+
+def _release_order(game: Game) -> tuple:
+    """By release day, games out the same day in TITLE_ORDER"""
+    return game.release_date.toordinal(), game.title_key, game.game_id
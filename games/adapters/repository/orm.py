@@ -1,13 +1,73 @@
+from types import MemberDescriptorType
+
 from sqlalchemy import (
     Column, Integer, String, Date, DateTime, Text, Numeric, SMALLINT,
-    ForeignKey, PrimaryKeyConstraint, Table, MetaData
+    ForeignKey, PrimaryKeyConstraint, Table, MetaData, TypeDecorator, bindparam, event, func, insert, inspect,
+    select, update
 )
 from sqlalchemy.orm import registry, relationship
-from games.domainmodel.model import Publisher, Genre, Game, User, Review
+from sqlalchemy.schema import CreateColumn
+from games.domainmodel.model import Publisher, Genre, Game, User, Review, Platform, TAGS, OrderedSet, NO_RATINGS
 
 metadata = MetaData()
 mapper_registry = registry(metadata=metadata)
 
+# name lists are stored as "\nname1\nname2\n", so a whole name can be matched with LIKE '%\nname\n%'
+NAME_SEPARATOR = '\n'
+
+
+class NameList(TypeDecorator):
+    """Tuple of names, e.g. developers, stored as text"""
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if not value:
+            return None
+        return NAME_SEPARATOR + NAME_SEPARATOR.join(value) + NAME_SEPARATOR
+
+    def process_result_value(self, value, dialect):
+        if not value:
+            return ()
+        return tuple(name for name in value.split(NAME_SEPARATOR) if name != '')
+
+
+class TagIdList(NameList):
+    """Tuple of tag ids, stored as tag names since ids are only meaningful within one process"""
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return super().process_bind_param(tuple(TAGS.name(tag_id) for tag_id in value or ()), dialect)
+
+    def process_result_value(self, value, dialect):
+        return tuple(TAGS.id(tag) for tag in super().process_result_value(value, dialect))
+
+
+class PlatformFlags(TypeDecorator):
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return int(value or 0)
+
+    def process_result_value(self, value, dialect):
+        return Platform(value or 0)
+
+
+class RatingHistogram(TypeDecorator):
+    """Review count per rating, stored as "count0,count1,..." """
+    impl = String(64)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return ','.join(str(count) for count in value or NO_RATINGS)
+
+    def process_result_value(self, value, dialect):
+        if not value:
+            return NO_RATINGS
+        return tuple(int(count) for count in value.split(','))
+
+
 genre_table = Table(
     'Genre', metadata,
     Column('genreName', String(64), primary_key=True)
@@ -23,11 +83,21 @@ game_table = Table(
     Column('gameID', Integer, primary_key=True, autoincrement=True),
     Column('title', String(128), nullable=False),
     Column('price', Numeric(10, 2), nullable=False),    # 10 digits, 2 are decimals
-    Column('releaseDate', Date, nullable=False),
+    # indexed for release date range queries
+    Column('releaseDate', Date, nullable=False, index=True),
     Column('description', Text, nullable=True),
     Column('imageURL', String(255), nullable=True),
     Column('websiteURL', String(255), nullable=True),
-    Column('publisherName', ForeignKey('Publisher.publisherName'))
+    Column('publisherName', ForeignKey('Publisher.publisherName')),
+    # indexed, a platform query matches the few bitmasks that include its platforms
+    Column('platforms', PlatformFlags, nullable=False, server_default='0', index=True),
+    Column('tags', TagIdList, nullable=True),
+    Column('categories', NameList, nullable=True),
+    Column('developers', NameList, nullable=True),
+    Column('supportedLanguages', NameList, nullable=True),
+    Column('ratingCount', Integer, nullable=False, server_default='0'),
+    Column('ratingSum', Integer, nullable=False, server_default='0'),
+    Column('ratingHistogram', RatingHistogram, nullable=True)
 )
 
 game_genre_table = Table(
@@ -37,6 +107,15 @@ game_genre_table = Table(
     PrimaryKeyConstraint('gameID', 'genreName')
 )
 
+# every game's tags, lowercased, so a tag query is an index lookup instead of a
+# LIKE over every game's tags column. The column still holds them as written
+game_tag_table = Table(
+    'GameTag', metadata,
+    Column('gameID', Integer, ForeignKey('Game.gameID')),
+    Column('tag', String(64), index=True),
+    PrimaryKeyConstraint('gameID', 'tag')
+)
+
 user_table = Table(
     'User', metadata,
     Column('username', String(64), primary_key=True),
@@ -61,7 +140,95 @@ wishlist_table = Table(
 )
 
 
+def upgrade_schema(engine) -> list[str]:
+    """
+    Bring a database created by an older version up to date: add the columns
+    and indexes its tables are missing, with their defaults, and the tables.
+    Returns the columns added, e.g. ['Game.tags']
+    """
+    inspector = inspect(engine)
+    added = []
+    created = []
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                table.create(connection)
+                created.append(table.name)
+                continue
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    # sqlite can add a NOT NULL column as long as it has a default
+                    table_name = connection.dialect.identifier_preparer.format_table(table)
+                    connection.exec_driver_sql(
+                        f'ALTER TABLE {table_name} ADD COLUMN {CreateColumn(column).compile(dialect=connection.dialect)}')
+                    added.append(f'{table.name}.{column.name}')
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(connection)
+        if 'Game.ratingCount' in added:
+            _count_stored_ratings(connection)
+        if 'GameTag' in created and 'Game' not in created:
+            _index_stored_tags(connection)
+    return added
+
+
+def tag_rows(game_id: int, tags) -> list[dict]:
+    """GameTag rows for a game's tags, one per lowercased tag"""
+    return [{'gameID': game_id, 'tag': tag} for tag in dict.fromkeys(tag.lower() for tag in tags)]
+
+
+def _index_stored_tags(connection):
+    """Fill in GameTag from the tags the games already have"""
+    rows = []
+    for game_id, tag_ids in connection.execute(select(game_table.c.gameID, game_table.c.tags)):
+        rows.extend(tag_rows(game_id, (TAGS.name(tag_id) for tag_id in tag_ids)))
+    if rows:
+        connection.execute(insert(game_tag_table), rows)
+
+
+def _count_stored_ratings(connection):
+    """Fill in the games' rating totals from the reviews already stored"""
+    histograms = {}
+    rating = review_table.c.rating
+    for game_id, stars, count in connection.execute(
+            select(review_table.c.gameID, rating, func.count()).group_by(review_table.c.gameID, rating)):
+        histograms.setdefault(game_id, list(NO_RATINGS))[stars] += count
+    if not histograms:
+        return
+    connection.execute(
+        update(game_table).where(game_table.c.gameID == bindparam('game_id')).values(
+            ratingCount=bindparam('rating_count'), ratingSum=bindparam('rating_sum'),
+            ratingHistogram=bindparam('rating_histogram', type_=RatingHistogram)),
+        [{'game_id': game_id, 'rating_count': sum(histogram),
+          'rating_sum': sum(stars * count for stars, count in enumerate(histogram)),
+          'rating_histogram': tuple(histogram)}
+         for game_id, histogram in histograms.items()])
+
+
+# the domain classes' slot descriptors. Mapping replaces them with instrumented
+# attributes and clear_mappers() deletes those, so they're put back afterwards
+_slot_descriptors: dict[type, dict] = {}
+
+
+def _keep_slot_descriptors(cls):
+    if cls in _slot_descriptors:
+        return
+    _slot_descriptors[cls] = {name: descriptor for name, descriptor in vars(cls).items()
+                              if isinstance(descriptor, MemberDescriptorType)}
+    event.listen(cls, 'class_uninstrument', _restore_slot_descriptors)
+
+
+def _restore_slot_descriptors(cls):
+    for name, descriptor in _slot_descriptors[cls].items():
+        setattr(cls, name, descriptor)
+
+
 def map_model_to_tables():
+    for cls in (Genre, Publisher, Game, User, Review):
+        _keep_slot_descriptors(cls)
+
     mapper_registry.map_imperatively(Genre, genre_table, properties={
         '_Genre__genre_name': genre_table.c.genreName
     })
@@ -78,21 +245,32 @@ def map_model_to_tables():
         '_Game__description': game_table.c.description,
         '_Game__image_url': game_table.c.imageURL,
         '_Game__website_url': game_table.c.websiteURL,
+        '_Game__platforms': game_table.c.platforms,
+        '_Game__tag_ids': game_table.c.tags,
+        '_Game__categories': game_table.c.categories,
+        '_Game__developers': game_table.c.developers,
+        '_Game__supported_languages': game_table.c.supportedLanguages,
+        '_Game__rating_count': game_table.c.ratingCount,
+        '_Game__rating_sum': game_table.c.ratingSum,
+        '_Game__rating_histogram': game_table.c.ratingHistogram,
         '_Game__publisher': relationship(Publisher, lazy='subquery'),
-        '_Game__genres': relationship(Genre, secondary=game_genre_table, lazy='subquery'),
-        '_Game__reviews': relationship(Review, back_populates='_Review__game')
+        '_Game__genres': relationship(Genre, secondary=game_genre_table, lazy='subquery',
+                                      collection_class=OrderedSet),
+        # not a backref of Review.game: a review only joins game.reviews through
+        # Game.add_review, which also keeps the rating totals
+        '_Game__reviews': relationship(Review, collection_class=OrderedSet, overlaps='_Review__game')
     })
 
     mapper_registry.map_imperatively(User, user_table, properties={
         '_User__username': user_table.c.username,
         '_User__password': user_table.c.password,
-        '_User__reviews': relationship(Review, back_populates='_Review__user'),
-        '_User__favourite_games': relationship(Game, secondary=wishlist_table)
+        '_User__reviews': relationship(Review, back_populates='_Review__user', collection_class=OrderedSet),
+        '_User__favourite_games': relationship(Game, secondary=wishlist_table, collection_class=OrderedSet)
     })
 
     mapper_registry.map_imperatively(Review, review_table, properties={
         '_Review__user': relationship(User, back_populates='_User__reviews'),
-        '_Review__game': relationship(Game, back_populates='_Game__reviews'),
+        '_Review__game': relationship(Game, overlaps='_Game__reviews'),
         '_Review__rating': review_table.c.rating,
         '_Review__comment': review_table.c.comment,
         '_Review__time': review_table.c.timestamp
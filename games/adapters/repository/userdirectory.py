@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import math
+from typing import Iterable
+
+from games.domainmodel.model import User
+
+
+def normalize_username(username: str) -> str:
+    """The key a username is stored under, the same normalisation User applies"""
+    return username.lower().strip()
+
+
+class BloomFilter:
+    """
+    Set membership in about 10 bits per name with no false negatives: if
+    might_contain() is False the name was never added. A True can be wrong,
+    at roughly error_rate once capacity names are in
+    """
+
+    def __init__(self, capacity: int = 1024, error_rate: float = 0.01):
+        self.__capacity = max(capacity, 1)
+        self.__error_rate = error_rate
+        bit_count = math.ceil(-self.__capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.__bit_count = max(bit_count, 64)
+        self.__hash_count = max(round(self.__bit_count / self.__capacity * math.log(2)), 1)
+        self.__bits = bytearray((self.__bit_count + 7) // 8)
+        self.__count = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def error_rate(self) -> float:
+        return self.__error_rate
+
+    def __len__(self) -> int:
+        """How many names were added, counting repeats"""
+        return self.__count
+
+    def add(self, name: str):
+        bits, bit_count = self.__bits, self.__bit_count
+        position, step = _probe(name)
+        for _ in range(self.__hash_count):
+            index = position % bit_count
+            bits[index >> 3] |= 1 << (index & 7)
+            position += step
+        self.__count += 1
+
+    def might_contain(self, name: str) -> bool:
+        bits, bit_count = self.__bits, self.__bit_count
+        position, step = _probe(name)
+        for _ in range(self.__hash_count):
+            index = position % bit_count
+            if not bits[index >> 3] & (1 << (index & 7)):
+                # most names that aren't in stop at the first or second probe
+                return False
+            position += step
+        return True
+
+
+def _probe(name: str) -> tuple[int, int]:
+    """First bit and step between bits for a name: double hashing, both come from the halves of one hash"""
+    hashed = hash(name) & 0xFFFFFFFFFFFFFFFF
+    return hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+
+
+class UserDirectory:
+    """
+    Users by normalised username: O(1) lookups and registration, and a
+    username ordered view for listing that is only sorted when asked for
+    after a change
+    """
+
+    def __init__(self, users: Iterable[User] = ()):
+        self.__users: dict[str, User] = {}
+        self.__ordered: list[User] | None = None
+        for user in users:
+            self.add(user)
+
+    def add(self, user: User) -> bool:
+        """Adds the user, False if the username is taken"""
+        if not isinstance(user, User) or user.username in self.__users:
+            return False
+        self.__users[user.username] = user
+        self.__ordered = None
+        return True
+
+    def get(self, username: str) -> User | None:
+        if not isinstance(username, str):
+            return None
+        return self.__users.get(normalize_username(username))
+
+    def might_exist(self, username: str) -> bool:
+        """
+        False means there is definitely no such user. In memory the dict
+        answers exactly, and faster than a Bloom filter would
+        """
+        return self.get(username) is not None
+
+    def ordered(self) -> list[User]:
+        """Every user, by username. Sorted on first use after a change, then cached"""
+        if self.__ordered is None:
+            self.__ordered = sorted(self.__users.values(), key=lambda user: user.username)
+        return self.__ordered
+
+    def __contains__(self, username) -> bool:
+        return self.get(username) is not None
+
+    def __len__(self) -> int:
+        return len(self.__users)
@@ -28,13 +28,14 @@ def login_required(view):
 
 def add_user(username: str, password: str):
     """Add new user to repo for registration"""
-    if repo.repo_instance.get_user(username) is None:
+    # most new names are definitely free, which skips looking them up
+    if not repo.repo_instance.user_might_exist(username) or repo.repo_instance.get_user(username) is None:
         # add new user, if user doesn't exist
         new_user = User(username, hash_password(password))
-        repo.repo_instance.add_user(new_user)
-    else:
-        # username taken, registration fail
-        raise NameNotUniqueException
+        if repo.repo_instance.add_user(new_user):
+            return
+    # username taken, registration fail
+    raise NameNotUniqueException
 
 
 def get_user(username: str) -> User | None:
@@ -0,0 +1,90 @@
+"""Flask CLI commands, e.g. `flask catalog load`."""
+
+from time import perf_counter
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+import games.adapters.repository.abstractrepo as repo
+from games.adapters.datareader.csvdatareader import GameFileCSVReader
+from games.adapters.datareader.rejects import InvalidRowError, RejectedRowReport
+from games.adapters.repository.databaserepo import DatabaseRepository
+
+catalog_cli = AppGroup('catalog', help='Manage the game catalog.')
+
+
+@catalog_cli.command('load')
+@click.option('--path', type=click.Path(exists=True, dir_okay=False),
+              help='csv file to load, defaults to games/adapters/data/games.csv')
+@click.option('--batch-size', type=click.IntRange(min=1),
+              help='games inserted per transaction, defaults to CATALOG_BATCH_SIZE')
+@click.option('--workers', type=click.IntRange(min=1), default=1, show_default=True,
+              help='processes parsing the csv in parallel')
+@click.option('--refresh', is_flag=True,
+              help='also update stored games whose details changed in the csv, keeping their reviews')
+@click.option('--strict', is_flag=True,
+              help='stop at the first invalid row instead of skipping it')
+@click.option('--rejects', 'rejects_path', type=click.Path(dir_okay=False, writable=True),
+              help='write the skipped rows to this file, one json object per line')
+def load_catalog(path, batch_size, workers, refresh, strict, rejects_path):
+    """Load the csv catalog into the database."""
+    repository = repo.repo_instance
+    if not isinstance(repository, DatabaseRepository):
+        raise click.UsageError("the catalog can only be preloaded with REPOSITORY = 'database'")
+
+    path = path or current_app.config['CATALOG_DATA_PATH']
+    batch_size = batch_size or current_app.config['CATALOG_BATCH_SIZE']
+    timings = {'parse': 0.0, 'write': 0.0, 'update': 0.0}
+    started = perf_counter()
+
+    stored_games = {game.game_id: game for game in repository.get_games()} if refresh else {}
+    changed_games = []
+
+    def new_games(games):
+        for game in games:
+            stored_game = stored_games.get(game.game_id)
+            if stored_game is None:
+                yield game
+            elif not stored_game.same_details(game):
+                # only rows that changed are written again
+                changed_games.append(game)
+
+    with RejectedRowReport(rejects_path) as rejects:
+        reader = GameFileCSVReader(path, strict=strict, rejects=rejects)
+        load_started = perf_counter()
+        try:
+            loaded = repository.load_games(new_games(_timed(reader.iter_games(workers), timings, 'parse')),
+                                           batch_size)
+        except InvalidRowError as e:
+            # batches before the invalid row are already committed
+            raise click.ClickException(f"invalid row, stopped loading: {e}")
+        timings['write'] = perf_counter() - load_started - timings['parse']
+
+    update_started = perf_counter()
+    for game in changed_games:
+        repository.update_game(game)
+    timings['update'] = perf_counter() - update_started
+
+    elapsed = perf_counter() - started
+    click.echo(f"Read {reader.rows_read} rows from {path}: {loaded} new games, "
+               f"{len(changed_games)} updated, {reader.rows_rejected} rejected rows")
+    if rejects.rejected > 0:
+        click.echo(f"  {rejects.summary()}" + (f", written to {rejects_path}" if rejects_path else ""))
+    for phase, seconds in timings.items():
+        click.echo(f"  {phase:<8}{seconds:8.2f}s")
+    click.echo(f"  {'total':<8}{elapsed:8.2f}s  ({reader.rows_read / elapsed if elapsed else 0:.0f} rows/sec)")
+
+
+def _timed(iterable, timings: dict, phase: str):
+    """Yield from iterable, adding the time spent producing each item to timings[phase]"""
+    iterator = iter(iterable)
+    while True:
+        started = perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[phase] += perf_counter() - started
+            return
+        timings[phase] += perf_counter() - started
+        yield item
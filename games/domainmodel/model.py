@@ -1,12 +1,233 @@
+from __future__ import annotations
+
+import re
+import sys
+import threading
+import unicodedata
 from datetime import datetime
+from enum import IntFlag
+from functools import lru_cache
+
+RELEASE_DATE_FORMAT = "%b %d, %Y"
+RELEASE_DATE_PATTERN = re.compile(r'([A-Za-z]{3}) ([0-9]{1,2}), ([0-9]{4})')
+MONTHS = {month: number for number, month in enumerate(
+    ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'), start=1)}
+# reviews are rated 0 to MAX_RATING stars
+MAX_RATING = 5
+NO_RATINGS = (0,) * (MAX_RATING + 1)
+
+
+@lru_cache(maxsize=8192)
+def parse_release_date(release_date: str) -> datetime:
+    """
+    Same result as datetime.strptime(release_date, "%b %d, %Y"), but the common
+    'Oct 21, 2008' shape is parsed directly and repeated dates come from cache.
+    Raises ValueError on malformed dates
+    """
+    match = RELEASE_DATE_PATTERN.fullmatch(release_date)
+    if match is not None:
+        month = MONTHS.get(match[1].lower())
+        if month is not None:
+            # datetime() rejects impossible days like Feb 30 just like strptime does
+            return datetime(int(match[3]), month, int(match[2]))
+    # anything unusual goes through strptime so it fails (or succeeds) exactly as before
+    return datetime.strptime(release_date, RELEASE_DATE_FORMAT)
+
+
+def search_key(text: str | None) -> str:
+    """
+    text casefolded and without accents, so 'Pokémon' and 'POKEMON' sort
+    together and match each other. Worked out once per name and kept on
+    the object, see Game.title_key
+    """
+    if not text:
+        return ""
+    if text.isascii():
+        key = text.lower()
+    else:
+        decomposed = unicodedata.normalize('NFKD', text.casefold())
+        key = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    # most titles already are their own key, don't keep a second copy
+    return text if key == text else key
+
+
+class Platform(IntFlag):
+    """Platforms a game runs on, combined into one bitmask"""
+    WINDOWS = 1
+    MAC = 2
+    LINUX = 4
+
+
+class Vocabulary:
+    """Gives every distinct name a small int id, so objects can hold ids instead of strings"""
+
+    def __init__(self):
+        self.__ids: dict[str, int] = {}
+        self.__names: list[str] = []
+        self.__lock = threading.Lock()
+
+    def id(self, name: str) -> int:
+        """Returns the id of the name, giving it a new one if it hasn't been seen"""
+        name_id = self.__ids.get(name)
+        if name_id is None:
+            with self.__lock:
+                name_id = self.__ids.get(name)
+                if name_id is None:
+                    name_id = len(self.__names)
+                    self.__names.append(sys.intern(name))
+                    self.__ids[name] = name_id
+        return name_id
+
+    def get_id(self, name: str) -> int | None:
+        return self.__ids.get(name)
+
+    def name(self, name_id: int) -> str:
+        return self.__names[name_id]
+
+    def __len__(self):
+        return len(self.__names)
+
+
+# shared by every game in the process, so tag ids mean the same thing everywhere
+TAGS = Vocabulary()
+
+
+def _interned_names(names) -> tuple:
+    """Strip, drop blanks and duplicates, and intern, since the same few values repeat across games"""
+    if isinstance(names, str):
+        names = [names]
+    interned = []
+    for name in names:
+        if isinstance(name, str) and name.strip() != "":
+            name = sys.intern(name.strip())
+            if name not in interned:
+                interned.append(name)
+    return tuple(interned)
+
+
+# mapped classes keep a __dict__ slot: SQLAlchemy stores the attributes it
+# instruments there, unmapped (memory mode) objects only use the slots
+ORM_SLOTS = ('__dict__', '__weakref__')
+
+
+def _day(value) -> int | None:
+    """A date or datetime as a day number, ignoring the time"""
+    return value.toordinal() if value is not None else None
+
+
+def _cents(price) -> int | None:
+    """A price as whole cents, however it's stored"""
+    return round(price * 100) if price is not None else None
+
+
+def _slot_state(obj) -> dict:
+    """Every attribute of obj, slotted or not, for classes that customise pickling"""
+    state = dict(getattr(obj, '__dict__', {}))
+    for cls in type(obj).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if name in ORM_SLOTS:
+                continue
+            if name.startswith('__'):
+                # __slots__ lists private names the way they're written in the class body
+                name = f'_{cls.__name__.lstrip("_")}{name}'
+            if hasattr(obj, name):
+                state[name] = getattr(obj, name)
+    return state
+
+
+class OrderedSet:
+    """
+    A list without duplicates: keeps insertion order like a list, but
+    membership tests, append and remove are O(1) because the items are the
+    keys of a dict. Compares equal to a list or tuple with the same items in
+    the same order. Positional access walks the items, so it is O(n)
+    """
+    # SQLAlchemy keeps its adapter in the instance dict when it's a relationship collection
+    __slots__ = ('__items',) + ORM_SLOTS
+
+    def __init__(self, items=()):
+        # no dict until there is something to keep, most games have no reviews
+        self.__items = dict.fromkeys(items) or None
+
+    def append(self, item):
+        """Add item at the end, unless it's already in"""
+        if self.__items is None:
+            self.__items = {}
+        self.__items[item] = None
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def remove(self, item):
+        """Raises ValueError if item isn't in, like list.remove"""
+        try:
+            del self.__items[item]
+        except (KeyError, TypeError):
+            raise ValueError(f"{item!r} is not in the set") from None
+
+    def discard(self, item):
+        if item in self:
+            del self.__items[item]
+
+    def clear(self):
+        self.__items = None
+
+    def __contains__(self, item):
+        try:
+            return self.__items is not None and item in self.__items
+        except TypeError:
+            # unhashable things can't be in here
+            return False
+
+    def __len__(self):
+        return len(self.__items) if self.__items is not None else 0
+
+    def __iter__(self):
+        # over a copy, taken in one step, so another thread adding a review
+        # or a wishlist game can't break a loop over this part way through
+        return iter(tuple(self.__items or ()))
+
+    def __reversed__(self):
+        return reversed(tuple(self.__items or ()))
+
+    def __getitem__(self, index):
+        if index == 0 and self.__items:
+            return next(iter(self.__items))
+        return list(self)[index]
+
+    def __setitem__(self, index, item):
+        """Replace the item at index, keeping its position"""
+        items = list(self)
+        items[index] = item
+        self.__items = dict.fromkeys(items)
+
+    def __eq__(self, other):
+        if isinstance(other, (OrderedSet, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __getstate__(self):
+        return list(self)
+
+    def __setstate__(self, state):
+        self.__items = dict.fromkeys(state) or None
 
 
 class Publisher:
+    __slots__ = ('__publisher_name', '__name_key') + ORM_SLOTS
+
     def __init__(self, publisher_name: str):
         if publisher_name == "" or type(publisher_name) is not str:
             self.__publisher_name = None
         else:
             self.__publisher_name = publisher_name.strip()
+        self.__name_key = search_key(self.__publisher_name)
 
     @property
     def publisher_name(self) -> str:
@@ -18,6 +239,17 @@ class Publisher:
             self.__publisher_name = None
         else:
             self.__publisher_name = new_publisher_name.strip()
+        self.__name_key = search_key(self.__publisher_name)
+
+    @property
+    def name_key(self) -> str:
+        """The name as a search_key"""
+        try:
+            return self.__name_key
+        except AttributeError:
+            # loaded from the database, __init__ didn't run
+            self.__name_key = search_key(self.__publisher_name)
+            return self.__name_key
 
     def __repr__(self):
         return f'<Publisher {self.__publisher_name}>'
@@ -37,16 +269,29 @@ class Publisher:
 
 
 class Genre:
+    __slots__ = ('__genre_name', '__name_key') + ORM_SLOTS
+
     def __init__(self, genre_name: str):
         if genre_name == "" or type(genre_name) is not str:
             self.__genre_name = None
         else:
             self.__genre_name = genre_name.strip()
+        self.__name_key = search_key(self.__genre_name)
 
     @property
     def genre_name(self) -> str:
         return self.__genre_name
 
+    @property
+    def name_key(self) -> str:
+        """The name as a search_key"""
+        try:
+            return self.__name_key
+        except AttributeError:
+            # loaded from the database, __init__ didn't run
+            self.__name_key = search_key(self.__genre_name)
+            return self.__name_key
+
     def __repr__(self) -> str:
         return f'<Genre {self.__genre_name}>'
 
@@ -65,6 +310,11 @@ class Genre:
 
 
 class Game:
+    __slots__ = ('__game_id', '__game_title', '__title_key', '__price', '__release_date', '__description', '__image_url',
+                 '__website_url', '__genres', '__reviews', '__publisher', '__tag_ids', '__platforms',
+                 '__categories', '__developers', '__supported_languages', '__rating_count', '__rating_sum',
+                 '__rating_histogram') + ORM_SLOTS
+
     def __init__(self, game_id: int, game_title: str):
         if type(game_id) is not int or game_id < 0:
             raise ValueError("Game ID should be a positive integer!")
@@ -74,16 +324,29 @@ class Game:
             self.__game_title = game_title.strip()
         else:
             self.__game_title = None
+        self.__title_key = search_key(self.__game_title)
 
         self.__price = None
         self.__release_date = None
         self.__description = None
         self.__image_url = None
         self.__website_url = None
-        self.__genres: list = []
-        self.__reviews: list = []
+        self.__genres = OrderedSet()
+        self.__reviews = OrderedSet()
         self.__publisher = None
 
+        self.__tag_ids: tuple = ()
+        self.__platforms = Platform(0)
+        self.__categories: tuple = ()
+        self.__developers: tuple = ()
+        self.__supported_languages: tuple = ()
+
+        # running totals of the reviews' ratings, kept by add_review and
+        # Review.rating so the average and star counts don't scan the reviews
+        self.__rating_count = 0
+        self.__rating_sum = 0
+        self.__rating_histogram: tuple = NO_RATINGS
+
     @property
     def publisher(self) -> Publisher:
         return self.__publisher
@@ -109,6 +372,21 @@ class Game:
             self.__game_title = new_title.strip()
         else:
             self.__game_title = None
+        self.__title_key = search_key(self.__game_title)
+
+    @property
+    def title_key(self) -> str:
+        """The title as a search_key, what games are sorted and searched by"""
+        try:
+            return self.__title_key
+        except AttributeError:
+            # loaded from the database, __init__ didn't run
+            self.__title_key = search_key(self.__game_title)
+            return self.__title_key
+
+    @property
+    def publisher_key(self) -> str:
+        return self.__publisher.name_key if self.__publisher is not None else ""
 
     @property
     def price(self):
@@ -126,14 +404,14 @@ class Game:
         return self.__release_date
 
     def release_date_formatted(self):
-        return self.__release_date.strftime("%b %d, %Y")
+        return self.__release_date.strftime(RELEASE_DATE_FORMAT)
 
     @release_date.setter
     def release_date(self, release_date: str):
         if isinstance(release_date, str):
             try:
                 # Check if the release_date string is in the correct date format (e.g., "Oct 21, 2008")
-                self.__release_date = datetime.strptime(release_date, "%b %d, %Y")
+                self.__release_date = parse_release_date(release_date)
 
             except ValueError:
                 raise ValueError("Release date must be in 'Oct 21, 2008' format!")
@@ -142,12 +420,18 @@ class Game:
 
     @property
     def description(self):
-        return self.__description
+        description = self.__description
+        if description is None or isinstance(description, str):
+            return description
+        # stored outside the heap (see TextStore), read it now
+        return description.resolve()
 
     @description.setter
     def description(self, description: str):
         if isinstance(description, str) and description.strip() != "":
             self.__description = description
+        elif hasattr(description, 'resolve'):
+            self.__description = description
         else:
             self.__description = None
 
@@ -174,17 +458,52 @@ class Game:
             self.__website_url = None
 
     @property
-    def reviews(self) -> list:
+    def reviews(self) -> OrderedSet:
         return self.__reviews
 
     def add_review(self, review) -> bool:
         if isinstance(review, Review) and review not in self.__reviews:
             self.__reviews.append(review)
+            self.__count_rating(review.rating, 1)
             return True
         return False
 
+    def change_review_rating(self, review, old_rating: int):
+        """Move an edited review from old_rating to its current rating in the totals"""
+        if review not in self.__reviews or review.rating == old_rating:
+            return
+        self.__count_rating(old_rating, -1)
+        self.__count_rating(review.rating, 1)
+
+    def __count_rating(self, rating: int, count: int):
+        self.__rating_count += count
+        self.__rating_sum += rating * count
+        histogram = list(self.__rating_histogram)
+        histogram[rating] += count
+        # replaced rather than changed in place, so the orm sees the change
+        self.__rating_histogram = tuple(histogram)
+
+    @property
+    def rating_count(self) -> int:
+        return self.__rating_count
+
+    @property
+    def rating_sum(self) -> int:
+        return self.__rating_sum
+
     @property
-    def genres(self) -> list:
+    def rating_histogram(self) -> tuple:
+        """Number of reviews with each rating, indexed 0 to 5"""
+        return self.__rating_histogram
+
+    @property
+    def average_rating(self) -> float:
+        if self.__rating_count == 0:
+            return 0.0
+        return self.__rating_sum / self.__rating_count
+
+    @property
+    def genres(self) -> OrderedSet:
         return self.__genres
 
     def add_genre(self, genre: Genre):
@@ -201,6 +520,111 @@ class Game:
             print(f"Could not find {genre} in list of genres.")
             pass
 
+    @property
+    def tag_ids(self) -> tuple:
+        return self.__tag_ids
+
+    @property
+    def tags(self) -> tuple:
+        return tuple(TAGS.name(tag_id) for tag_id in self.__tag_ids)
+
+    @tags.setter
+    def tags(self, tags):
+        self.__tag_ids = tuple(TAGS.id(tag) for tag in _interned_names(tags))
+
+    def has_tag(self, tag: str) -> bool:
+        tag_id = TAGS.get_id(tag)
+        return tag_id is not None and tag_id in self.__tag_ids
+
+    @property
+    def platforms(self) -> Platform:
+        return self.__platforms
+
+    @platforms.setter
+    def platforms(self, platforms: Platform):
+        if isinstance(platforms, int) and 0 <= platforms <= Platform.WINDOWS | Platform.MAC | Platform.LINUX:
+            self.__platforms = Platform(platforms)
+        else:
+            raise ValueError("Platforms must be a combination of Platform flags!")
+
+    @property
+    def categories(self) -> tuple:
+        return self.__categories
+
+    @categories.setter
+    def categories(self, categories):
+        self.__categories = _interned_names(categories)
+
+    @property
+    def developers(self) -> tuple:
+        return self.__developers
+
+    @developers.setter
+    def developers(self, developers):
+        self.__developers = _interned_names(developers)
+
+    @property
+    def supported_languages(self) -> tuple:
+        return self.__supported_languages
+
+    @supported_languages.setter
+    def supported_languages(self, supported_languages):
+        self.__supported_languages = _interned_names(supported_languages)
+
+    def __getstate__(self):
+        # tag ids are only meaningful within one process, pickles carry the names
+        state = _slot_state(self)
+        state['_Game__tag_ids'] = self.tags
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            if name != '_Game__tag_ids':
+                setattr(self, name, value)
+        # the names came from a game's tags, already cleaned up, so they go
+        # straight to ids without the setter's dedupe
+        self.__tag_ids = tuple(map(TAGS.id, state.get('_Game__tag_ids', ())))
+
+    def update_details(self, other: 'Game'):
+        """Copy the catalog details of another game onto this one, keeping id and reviews"""
+        if not isinstance(other, Game):
+            return
+        self.__game_title = other.title
+        self.__title_key = other.title_key
+        self.__price = other.price
+        self.__release_date = other.release_date
+        # copied as is, so a lazily stored description stays lazy
+        self.__description = other.__description
+        self.__image_url = other.image_url
+        self.__website_url = other.website_url
+        self.__publisher = other.publisher
+        self.__genres = OrderedSet(other.genres)
+        self.__tag_ids = other.tag_ids
+        self.__platforms = other.platforms
+        self.__categories = other.categories
+        self.__developers = other.developers
+        self.__supported_languages = other.supported_languages
+
+    def same_details(self, other: 'Game') -> bool:
+        """True if update_details(other) wouldn't change anything"""
+        if not isinstance(other, Game):
+            return False
+        # a stored price comes back as a Decimal, a parsed one is a float, and
+        # a stored release date is a date where a parsed one is a datetime
+        return (self.__game_title == other.title
+                and _cents(self.__price) == _cents(other.price)
+                and _day(self.__release_date) == _day(other.release_date)
+                and self.description == other.description
+                and self.__image_url == other.image_url
+                and self.__website_url == other.website_url
+                and self.__publisher == other.publisher
+                and list(self.__genres) == list(other.genres)
+                and self.__tag_ids == other.tag_ids
+                and self.__platforms == other.platforms
+                and self.__categories == other.categories
+                and self.__developers == other.developers
+                and self.__supported_languages == other.supported_languages)
+
     def __repr__(self):
         return f"<Game {self.__game_id}, {self.__game_title}>"
 
@@ -219,6 +643,8 @@ class Game:
 
 
 class User:
+    __slots__ = ('__username', '__password', '__reviews', '__favourite_games') + ORM_SLOTS
+
     def __init__(self, username: str, password: str):
         if not isinstance(username, str) or username.strip() == "":
             raise ValueError('Username cannot be empty or non-string!')
@@ -230,8 +656,8 @@ class User:
         else:
             raise ValueError('Password not valid!')
 
-        self.__reviews: list[Review] = []
-        self.__favourite_games: list[Game] = []
+        self.__reviews = OrderedSet()
+        self.__favourite_games = OrderedSet()
 
     @property
     def username(self):
@@ -242,7 +668,7 @@ class User:
         return self.__password
 
     @property
-    def reviews(self) -> list:
+    def reviews(self) -> OrderedSet:
         return self.__reviews
 
     def add_review(self, new_review):
@@ -256,7 +682,7 @@ class User:
         self.__reviews.remove(review)
 
     @property
-    def favourite_games(self) -> list:
+    def favourite_games(self) -> OrderedSet:
         return self.__favourite_games
 
     def add_favourite_game(self, game):
@@ -287,17 +713,21 @@ class User:
 
 
 class Review:
-    def __init__(self, user: User, game: Game, rating: int, comment: str):
+    __slots__ = ('__user', '__game', '__rating', '__comment', '__time', '__key') + ORM_SLOTS
+
+    def __init__(self, user: User, game: Game, rating: int, comment: str, time: datetime = None):
 
         if not isinstance(user, User):
             raise ValueError("User must be an instance of User class")
-        self.__user = user
-
         if not isinstance(game, Game):
             raise ValueError("Game must be an instance of Game class")
+        # before user and game are assigned: when mapped, assigning them adds
+        # this review to their collections, which hashes it
+        self.__key = (user.username, game.game_id)
+        self.__user = user
         self.__game = game
 
-        if not isinstance(rating, int) or not 0 <= rating <= 5:
+        if not isinstance(rating, int) or not 0 <= rating <= MAX_RATING:
             raise ValueError("Rating must be an integer between 0 and 5")
         self.__rating = rating
 
@@ -305,7 +735,8 @@ class Review:
             raise ValueError("Comment must be a string")
         self.__comment = comment.strip()
 
-        self.__time = datetime.now()
+        # given when a saved review is restored
+        self.__time = time if isinstance(time, datetime) else datetime.now()
 
     @property
     def game(self) -> Game:
@@ -339,8 +770,10 @@ class Review:
 
     @rating.setter
     def rating(self, new_rating: int):
-        if isinstance(new_rating, int) and 0 <= new_rating <= 5:
+        if isinstance(new_rating, int) and 0 <= new_rating <= MAX_RATING:
+            old_rating = self.__rating
             self.__rating = new_rating
+            self.__game.change_review_rating(self, old_rating)
         else:
             raise ValueError("Rating must be an integer between 0 and 5")
 
@@ -353,14 +786,25 @@ class Review:
             return False
         return other.user == self.__user and other.game == self.__game and other.comment == self.__comment
 
+    def __hash__(self):
+        # the comment can be edited, so only user and game count
+        try:
+            key = self.__key
+        except AttributeError:
+            # loaded from the database, __init__ didn't run
+            key = self.__key = (self.__user.username, self.__game.game_id)
+        return hash(key)
+
 
 class Wishlist:
+    __slots__ = ('__user', '__list_of_games', '__current')
+
     def __init__(self, user: User):
         if not isinstance(user, User):
             raise ValueError("User must be an instance of User class")
         self.__user = user
 
-        self.__list_of_games = []
+        self.__list_of_games = OrderedSet()
 
     def list_of_games(self):
         return self.__list_of_games
@@ -391,12 +835,8 @@ class Wishlist:
             return None
 
     def __iter__(self):
-        self.__current = 0
+        self.__current = iter(self.__list_of_games)
         return self
 
     def __next__(self):
-        if self.__current >= len(self.__list_of_games):
-            raise StopIteration
-        else:
-            self.__current += 1
-            return self.__list_of_games[self.__current - 1]
+        return next(self.__current)
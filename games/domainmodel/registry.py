@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from games.domainmodel.model import Genre, Publisher, Game
+
+
+class EntityRegistry:
+    """
+    Hands out one shared Genre and Publisher object per name, so games that
+    have the same genre hold the very same object and can be compared with `is`
+    """
+
+    def __init__(self):
+        self.__genres: dict[str, Genre] = {}
+        self.__publishers: dict[str, Publisher] = {}
+
+    def genre(self, genre_name: str) -> Genre:
+        """Returns the shared genre with this name, creating it if it's new"""
+        genre = self.__genres.get(genre_name)
+        if genre is None:
+            genre = self.intern_genre(Genre(genre_name))
+            if isinstance(genre_name, str):
+                # remember the unstripped spelling too, skips Genre() next time
+                self.__genres[genre_name] = genre
+        return genre
+
+    def publisher(self, publisher_name: str) -> Publisher:
+        """Returns the shared publisher with this name, creating it if it's new"""
+        publisher = self.__publishers.get(publisher_name)
+        if publisher is None:
+            publisher = self.intern_publisher(Publisher(publisher_name))
+            if isinstance(publisher_name, str):
+                self.__publishers[publisher_name] = publisher
+        return publisher
+
+    def get_genre(self, genre_name: str) -> Genre | None:
+        """Returns the shared genre with this name, or None if there isn't one"""
+        genre = self.__genres.get(genre_name)
+        if genre is None and isinstance(genre_name, str):
+            genre = self.__genres.get(genre_name.strip())
+        return genre
+
+    def get_publisher(self, publisher_name: str) -> Publisher | None:
+        """Returns the shared publisher with this name, or None if there isn't one"""
+        publisher = self.__publishers.get(publisher_name)
+        if publisher is None and isinstance(publisher_name, str):
+            publisher = self.__publishers.get(publisher_name.strip())
+        return publisher
+
+    def intern_genre(self, genre: Genre) -> Genre:
+        """Returns the shared genre equal to this one, registering it if it's the first"""
+        return self.__genres.setdefault(genre.genre_name, genre)
+
+    def intern_publisher(self, publisher: Publisher) -> Publisher:
+        """Returns the shared publisher equal to this one, registering it if it's the first"""
+        return self.__publishers.setdefault(publisher.publisher_name, publisher)
+
+    def intern_game(self, game: Game):
+        """Swap the game's genres and publisher for the shared objects"""
+        genres = game.genres
+        for index, genre in enumerate(genres):
+            shared = self.intern_genre(genre)
+            if shared is not genre:
+                genres[index] = shared
+
+        if game.publisher is not None:
+            game.publisher = self.intern_publisher(game.publisher)
@@ -4,7 +4,7 @@ from games.authentication.services import login_required
 from games.search.services import get_game_by_id
 from games.game.services import add_review
 from games.authentication.services import get_user
-from games.adapters.repository.abstractrepo import repo_instance as repo
+import games.adapters.repository.abstractrepo as repo
 from games.domainmodel.model import User
 
 game_blueprint = Blueprint('game_bp', __name__)
@@ -12,7 +12,7 @@ game_blueprint = Blueprint('game_bp', __name__)
 
 @game_blueprint.route('/<int:game_id>', methods=['GET'])
 def home(game_id):
-    current_game = get_game_by_id(game_id, repo)
+    current_game = get_game_by_id(game_id, repo.repo_instance)
     selected_review_sorting_order = request.args.get('review_sorting_order')
 
     reviews = []
@@ -28,12 +28,8 @@ def home(game_id):
     elif selected_review_sorting_order == "user_name":
         reviews = sorted(current_game.reviews, key=lambda x: x.user.username, reverse=False)
 
-    number_of_reviews = len(reviews)
-    if number_of_reviews == 0:
-        average_rating = 0.0
-    else:
-        sum_of_ratings = sum([int(r.rating) for r in reviews])
-        average_rating = round(sum_of_ratings * 1.0 / number_of_reviews, 1)
+    number_of_reviews = current_game.rating_count
+    average_rating = round(current_game.average_rating, 1)
 
     comment_status = ""
     in_wishlist = False
@@ -56,6 +52,7 @@ def home(game_id):
     return render_template('game/game.html', current_game=current_game, reviews=reviews, average_rating=average_rating,
                            number_of_reviews=number_of_reviews,
                            number_of_stars=round(average_rating),
+                           rating_histogram=current_game.rating_histogram,
                            current_review_sorting_order=selected_review_sorting_order,
                            comment_status=comment_status, in_wishlist=in_wishlist)
 
@@ -63,10 +60,10 @@ def home(game_id):
 @game_blueprint.route('/<int:game_id>', methods=['POST'])
 @login_required
 def comment(game_id):
-    current_game = get_game_by_id(game_id, repo)
+    current_game = get_game_by_id(game_id, repo.repo_instance)
     user_name = session['username']
     data = request.form
     review_text = data['review_text']
     rating = int(data['rate'])
-    add_review(current_game, user_name, rating, review_text, repo)
+    add_review(current_game, user_name, rating, review_text, repo.repo_instance)
     return redirect(url_for('game_bp.home', game_id=game_id))
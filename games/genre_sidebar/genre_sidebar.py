@@ -2,9 +2,9 @@ from flask import Blueprint, render_template, redirect, url_for, request
 from games.pagination.pagination import Pagination
 from games.pagination.services import create_pagination_list
 import games.adapters.repository.abstractrepo as repo
+from games.domainmodel.model import Genre
 
 genre_sidebar_blueprint = Blueprint('genre_sidebar_bp', __name__)
-all_games = repo.repo_instance.get_games()
 
 @genre_sidebar_blueprint.route('/genre')
 def genre():
@@ -14,7 +14,7 @@ def genre():
 @genre_sidebar_blueprint.route('/genre/<int:page_num>')
 def go_to_page(page_num):
     genre_name = request.args.get('genre_name')
-    games = [game for game in all_games if genre_name in [genre.genre_name for genre in game.genres]]
+    games = repo.repo_instance.get_games_by_genre(Genre(genre_name)) if genre_name else []
     # paginate game list and return the specified page
     pagination = Pagination(games)
     pagination.go_to_page(page_num)
@@ -5,10 +5,6 @@ from games.pagination.services import create_pagination_list
 
 library_blueprint = Blueprint('library_bp', __name__)
 
-games = repo.repo_instance.get_games()
-# pagination
-pagination = Pagination(games)
-
 
 # doubles as go to first page function
 @library_blueprint.route('/library/')
@@ -18,6 +14,7 @@ def library():
 
 @library_blueprint.route('/library/<page_num>')
 def go_to_page(page_num):
+    pagination = Pagination(repo.repo_instance.get_games())
     pagination.go_to_page(int(page_num))
     page_content = pagination.get_page_content()
     pages = create_pagination_list(pagination.current_page,
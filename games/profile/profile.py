@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, redirect, url_for, session
 from games.authentication.services import login_required
-from games.adapters.repository.abstractrepo import repo_instance as repo
+import games.adapters.repository.abstractrepo as repo
 
 
 
@@ -11,7 +11,7 @@ profile_blueprint = Blueprint('profile_bp', __name__)
 @login_required
 def profile():
     username = session['username']
-    user = repo.get_user(username)
+    user = repo.repo_instance.get_user(username)
     reviews = user.reviews
     wishlist_games = user.favourite_games
     return render_template('profile/profile.html', current_page='profile', reviews=reviews, wishlist_games=wishlist_games)
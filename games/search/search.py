@@ -1,7 +1,7 @@
 from games.pagination.pagination import Pagination
 from games.pagination.services import create_pagination_list
 from flask import Blueprint, render_template, request, redirect, url_for
-from games.adapters.repository.abstractrepo import repo_instance as repo
+import games.adapters.repository.abstractrepo as repo
 from games.search.services import *
 
 search_blueprint = Blueprint('search_bp', __name__)
@@ -21,13 +21,15 @@ def go_to_page(page_num):
 
     # generate a list of eligible games
     if criteria == 'title':
-        games = get_games_by_title(term, repo)
+        games = get_games_by_title(term, repo.repo_instance)
     elif criteria == 'publisher':
-        games = get_games_by_publisher(term, repo)
+        games = get_games_by_publisher(term, repo.repo_instance)
     elif criteria == 'year':
-        games = get_games_by_year(term, repo)
+        games = get_games_by_year(term, repo.repo_instance)
     elif criteria == 'genre':
-        games = get_games_by_genre(term, repo)
+        games = get_games_by_genre(term, repo.repo_instance)
+    elif criteria == 'tag':
+        games = get_games_by_tag(term, repo.repo_instance, request.args.get('platform'))
     else:
         games = []
 
@@ -1,19 +1,28 @@
-from games.domainmodel.model import Game, Publisher, Genre
+from datetime import date
+from operator import attrgetter
+
+from games.domainmodel.model import Game, Publisher, Genre, Platform, search_key
 from games.adapters.repository.abstractrepo import AbstractRepository
 
 
 def get_games_by_title(title: str, repo: AbstractRepository) -> list[Game]:
     if not isinstance(title, str):
         return []
-    return [game for game in repo.get_games() if title.lower() in game.title.lower()]
+    title = search_key(title)
+    return [game for game in repo.get_games() if title in game.title_key]
 
 
 def get_games_by_genre(genre: str, repo: AbstractRepository) -> list[Game]:
-    genre = str(genre)
+    genre = search_key(str(genre))
+    # games share genre objects, so each distinct genre's name is only checked once
+    genre_matches = {}
     games_by_genre = []
     for game in repo.get_games():
         for game_genre in game.genres:
-            if genre.lower() in game_genre.genre_name.lower():
+            is_match = genre_matches.get(game_genre)
+            if is_match is None:
+                is_match = genre_matches[game_genre] = genre in game_genre.name_key
+            if is_match:
                 games_by_genre.append(game)
                 break
     return games_by_genre
@@ -22,26 +31,49 @@ def get_games_by_genre(genre: str, repo: AbstractRepository) -> list[Game]:
 def get_games_by_publisher(publisher: str, repo: AbstractRepository) -> list[Game]:
     if not isinstance(publisher, str):
         return []
-    return [game for game in repo.get_games() if publisher.lower() in game.publisher.publisher_name.lower()]
+    publisher = search_key(publisher)
+    # games share publisher objects, so each distinct publisher's name is only checked once
+    publisher_matches = {}
+    games_by_publisher = []
+    for game in repo.get_games():
+        is_match = publisher_matches.get(game.publisher)
+        if is_match is None:
+            is_match = publisher_matches[game.publisher] = publisher in game.publisher_key
+        if is_match:
+            games_by_publisher.append(game)
+    return games_by_publisher
 
 
 def get_games_by_year(year: str, repo: AbstractRepository) -> list[Game]:
     # rule out rubbish input
     try:
-        if 1900 > int(year) or int(year) > 3000:
-            return []
+        year = int(year)
     except ValueError:
         return []
-    else:
-        # in case argument is a reasonable integer
-        year = str(year)
+    if 1900 > year or year > 3000:
+        return []
 
-    games_by_year = []
-    for game in repo.get_games():
-        game_year = str(game.release_date.year)
-        if year in game_year:
-            games_by_year.append(game)
-    return games_by_year
+    # bisected out of the release date index, then listed alphabetically like every other search
+    games_by_year = repo.get_games_by_release_range(date(year, 1, 1), date(year + 1, 1, 1))
+    return sorted(games_by_year, key=attrgetter('title_key', 'game_id'))
+
+
+def get_games_by_tag(tags: str, repo: AbstractRepository, platform: str = None) -> list[Game]:
+    """tags is a comma separated list, games need all of them; platform is e.g. 'linux'"""
+    if not isinstance(tags, str):
+        return []
+    tags = [tag for tag in tags.split(",") if tag.strip() != ""]
+
+    platforms = Platform(0)
+    if platform:
+        try:
+            platforms = Platform[platform.strip().upper()]
+        except KeyError:
+            return []
+
+    if not tags and not platforms:
+        return []
+    return repo.get_games_by_tags(tags, platforms)
 
 
 def get_game_by_id(game_id: str, repo: AbstractRepository) -> Game:
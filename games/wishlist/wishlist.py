@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash, session
 from games.authentication.services import login_required
-from games.adapters.repository.abstractrepo import repo_instance as repo
+import games.adapters.repository.abstractrepo as repo
 import games.wishlist.services as services
 wishlist_blueprint = Blueprint('wishlist_bp', __name__)
 
@@ -9,10 +9,10 @@ wishlist_blueprint = Blueprint('wishlist_bp', __name__)
 def add_to_wishlist():
     game_id = request.form.get('game_id')
     username = session['username']
-    user = repo.get_user(username)
-    game = repo.get_game_by_id(int(game_id))
+    user = repo.repo_instance.get_user(username)
+    game = repo.repo_instance.get_game_by_id(int(game_id))
 
-    services.add_to_wishlist(game, user, repo)
+    services.add_to_wishlist(game, user, repo.repo_instance)
 
     return redirect(url_for('game_bp.home', game_id=game_id))
 
@@ -21,9 +21,9 @@ def add_to_wishlist():
 def remove_from_wishlist():
     game_id = request.form.get('game_id')
     username = session['username']
-    user = repo.get_user(username)
-    game = repo.get_game_by_id(int(game_id))
+    user = repo.repo_instance.get_user(username)
+    game = repo.repo_instance.get_game_by_id(int(game_id))
 
-    services.remove_from_wishlist(game, user, repo)
+    services.remove_from_wishlist(game, user, repo.repo_instance)
 
     return redirect(url_for('profile_bp.profile'))
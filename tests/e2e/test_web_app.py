@@ -1,16 +1,13 @@
 import pytest
 from flask import session
-from games.adapters.repository.memoryrepo import MemoryRepository
-from games.adapters.repository.abstractrepo import populate
+import games.adapters.repository.abstractrepo as repo
 import time
 
-TEST_CSV_PATH = "../../games/adapters/data/games.csv"
 
 @pytest.fixture
-def in_memory_repo():
-    repo = MemoryRepository()
-    populate(TEST_CSV_PATH, repo)
-    return repo
+def in_memory_repo(app):
+    # the repository the running app reads from and writes to
+    return repo.repo_instance
 def test_register(client):
     # Check that we retrieve the register page.
     response_code = client.get('/register').status_code
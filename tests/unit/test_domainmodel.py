@@ -1,7 +1,19 @@
 import pytest
 import os
-from games.domainmodel.model import Publisher, Genre, Game, Review, User, Wishlist
-from games.adapters.datareader.csvdatareader import GameFileCSVReader
+import json
+import mmap
+import pickle
+import subprocess
+import sys
+from games.domainmodel.model import (
+    Publisher, Genre, Game, Review, User, Wishlist, Platform, OrderedSet, parse_release_date,
+    search_key
+)
+from datetime import datetime
+from games.domainmodel.registry import EntityRegistry
+from games.adapters.datareader import csvdatareader
+from games.adapters.datareader.csvdatareader import GameFileCSVReader, find_record_boundaries
+from games.adapters.datareader.rejects import InvalidRowError, RejectedRowReport
 
 
 def test_publisher_init():
@@ -165,6 +177,19 @@ def test_game_release_date_setter():
         game.release_date = "21/08/2008"
 
 
+def test_parse_release_date():
+    # same results as strptime
+    for date in ["Oct 21, 2008", "oct 1, 2008", "Feb 29, 2020", "May 05, 1999", "Dec 31,  2001"]:
+        assert parse_release_date(date) == datetime.strptime(date, "%b %d, %Y")
+
+    # malformed dates still raise ValueError
+    for date in ["21/08/2008", "Foo 21, 2008", "Feb 30, 2021", "Oct 0, 2008", "Oct 21 2008", ""]:
+        with pytest.raises(ValueError):
+            parse_release_date(date)
+        with pytest.raises(ValueError):
+            Game(1, "Super Soccer Blast").release_date = date
+
+
 def test_game_description_setter():
     game = Game(1, "Domino House")
     game.description = "This is a domino game"
@@ -262,6 +287,21 @@ def test_game_add_remove_genre():
     assert len(game1.genres) == 0
 
 
+def test_game_same_details():
+    game1 = Game(1, "Super Soccer Blast")
+    game1.price = 4.99
+    game1.release_date = "Oct 21, 2008"
+    game1.add_genre(Genre("Sports"))
+    game2 = Game(1, "Super Soccer Blast")
+    assert not game1.same_details(game2)
+
+    game2.update_details(game1)
+    assert game1.same_details(game2)
+    game2.tags = ["Football"]
+    assert not game1.same_details(game2)
+    assert not game1.same_details("Super Soccer Blast")
+
+
 def test_user_initialization():
     user1 = User("Shyamli", "pw12345")
     user2 = User("asma", "pw67890")
@@ -483,3 +523,319 @@ def test_genres_dataset():
     sorted_genres = sorted(genres_set)
     sorted_genre_sample = str(sorted_genres[:3])
     assert sorted_genre_sample == "[<Genre Action>, <Genre Adventure>, <Genre Animation & Modeling>]"
+
+
+def test_iter_games():
+    dir_name = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    games_file_name = os.path.join(dir_name, "games/adapters/data/games.csv")
+    reader = GameFileCSVReader(games_file_name)
+
+    # streaming doesn't fill the reader's datasets
+    games = reader.iter_games()
+    game = next(games)
+    assert game.game_id == 7940
+    assert game.publisher == Publisher("Activision")
+    assert game.genres == [Genre("Action")]
+    assert reader.get_unique_games_count() == 0
+
+    # the rest of the file streams through as well
+    assert sum(1 for _ in games) == 980
+
+
+def test_iter_rows():
+    dir_name = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    games_file_name = os.path.join(dir_name, "games/adapters/data/games.csv")
+    reader = GameFileCSVReader(games_file_name)
+
+    row = next(reader.iter_rows())
+    assert row["AppID"] == "7940"
+    assert row["Publishers"] == "Activision"
+
+    # non-existent file yields nothing
+    assert list(GameFileCSVReader("does/not/exist.csv").iter_rows()) == []
+
+
+def test_iter_games_parallel(monkeypatch):
+    dir_name = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    games_file_name = os.path.join(dir_name, "games/adapters/data/games.csv")
+
+    sequential = list(GameFileCSVReader(games_file_name).iter_games())
+    parallel = list(GameFileCSVReader(games_file_name).iter_games(workers=2))
+
+    # same games, in the same order, with the same contents
+    assert [game.game_id for game in parallel] == [game.game_id for game in sequential]
+    assert [game.description for game in parallel] == [game.description for game in sequential]
+    assert [game.genres for game in parallel] == [game.genres for game in sequential]
+    assert [game.tags for game in parallel] == [game.tags for game in sequential]
+
+    # many small chunks, more than are ever in flight at once
+    monkeypatch.setattr(csvdatareader, "CHUNK_SIZE", 16 * 1024)
+    parallel = list(GameFileCSVReader(games_file_name).iter_games(workers=2))
+    assert [game.game_id for game in parallel] == [game.game_id for game in sequential]
+    assert [game.description for game in parallel] == [game.description for game in sequential]
+
+
+def test_csv_reader_reads_tags_and_platforms():
+    dir_name = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    games_file_name = os.path.join(dir_name, "games/adapters/data/games.csv")
+    game = next(GameFileCSVReader(games_file_name).iter_games())
+
+    assert game.game_id == 7940
+    assert game.tags[:3] == ("FPS", "Action", "Multiplayer")
+    assert game.has_tag("Zombies") and not game.has_tag("zombies")
+    assert game.platforms == Platform.WINDOWS | Platform.MAC
+    assert game.categories == ("Single-player", "Multi-player")
+    assert game.developers == ("Infinity Ward",)
+    assert "Spanish - Spain" in game.supported_languages
+
+    # ids survive pickling into another process's vocabulary
+    assert pickle.loads(pickle.dumps(game)).tags == game.tags
+
+    with pytest.raises(ValueError):
+        game.platforms = 8
+
+
+def test_csv_reader_reports_rejected_rows(tmp_path):
+    dir_name = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    with open(os.path.join(dir_name, "games/adapters/data/games.csv"), encoding="utf-8-sig") as file:
+        lines = file.readlines()
+    header, good_row = lines[0], lines[1]
+    csv_path = tmp_path / "games.csv"
+    with open(csv_path, "w", encoding="utf-8") as file:
+        file.write(header)
+        file.write('1,"Multi\nline title",Oct 21 2008,1.99\n')       # line 2, bad date, spans two lines
+        file.write(good_row)                                          # line 4
+        file.write('2,Cheap,"Oct 21, 2008",free\n')                  # line 5, bad price
+        file.write('x,Broken\n')                                      # line 6, bad id
+
+    # lenient: invalid rows are skipped and streamed to the sidecar file
+    with RejectedRowReport(tmp_path / "rejects.ndjson") as rejects:
+        reader = GameFileCSVReader(csv_path, rejects=rejects)
+        assert [game.game_id for game in reader.iter_games()] == [7940]
+    assert reader.rows_read == 4 and reader.rows_rejected == 3
+    assert rejects.by_column == {"Release date": 1, "Price": 1, "AppID": 1}
+
+    with open(tmp_path / "rejects.ndjson", encoding="utf-8") as file:
+        records = [json.loads(line) for line in file]
+    assert [(record["line"], record["column"]) for record in records] == [
+        (2, "Release date"), (5, "Price"), (6, "AppID")]
+    assert records[1]["row"]["Price"] == "free"
+
+    # the parallel reader reports the same lines
+    parallel_rejects = RejectedRowReport()
+    list(GameFileCSVReader(csv_path, rejects=parallel_rejects).iter_games(workers=2))
+    assert parallel_rejects.by_column == rejects.by_column
+
+    # strict: stop at the first invalid row
+    with pytest.raises(InvalidRowError) as error:
+        list(GameFileCSVReader(csv_path, strict=True).iter_games())
+    assert error.value.line == 2 and error.value.column == "Release date"
+
+    # strict parallel parsing still yields the games before the invalid row,
+    # including the ones parsed in the same chunk
+    with open(csv_path, "w", encoding="utf-8") as file:
+        file.writelines(lines[:21])
+        file.write('2,Cheap,"Oct 21, 2008",free\n')
+        file.writelines(lines[21:31])
+    for workers in (1, 2):
+        yielded = []
+        with pytest.raises(InvalidRowError):
+            for game in GameFileCSVReader(csv_path, strict=True).iter_games(workers):
+                yielded.append(game.game_id)
+        assert len(yielded) == 20
+
+
+# run in a fresh interpreter: once the ORM has mapped Game in this process,
+# new instances keep room for the attributes SQLAlchemy put in their
+# __dict__, even after clear_mappers(), and the numbers no longer show slots
+FOOTPRINT_SCRIPT = """
+import json
+import tracemalloc
+from games.domainmodel.model import Game
+
+count = 10000
+
+
+class UnslottedGame:
+    # a game laid out the way Game was before it had __slots__, attributes in a __dict__
+    pass
+
+
+template = Game(0, "game")
+template_state = {name: getattr(template, name) for name in dir(template) if name.startswith("_Game__")}
+
+
+def make_unslotted(game_id):
+    game = UnslottedGame()
+    game.__dict__.update(template_state)
+    game._Game__game_id = game_id
+    game._Game__genres = []
+    game._Game__reviews = []
+    return game
+
+
+def bytes_per_game(make_game):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    games = [make_game(game_id) for game_id in range(1000, 1000 + count)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del games
+    return size / count
+
+
+print(json.dumps({
+    "unslotted": bytes_per_game(make_unslotted),
+    "slotted": bytes_per_game(lambda game_id: Game(game_id, "game")),
+    "instance_dict": Game(1, "game").__dict__,
+}))
+"""
+
+
+def test_game_memory_footprint():
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    result = subprocess.run([sys.executable, "-c", FOOTPRINT_SCRIPT], cwd=project_root,
+                            env={**os.environ, "PYTHONPATH": project_root},
+                            capture_output=True, text=True, check=True)
+    footprint = json.loads(result.stdout)
+
+    # in memory mode every attribute lives in a slot, nothing goes to the instance dict
+    assert footprint["instance_dict"] == {}
+    assert footprint["slotted"] < footprint["unslotted"] * 0.75
+
+
+def test_ordered_set():
+    games = OrderedSet()
+    for game_id in (3, 1, 2, 1):
+        games.append(Game(game_id, f"game{game_id}"))
+
+    # insertion order, no duplicates, and it still looks like a list
+    assert games == [Game(3, "game3"), Game(1, "game1"), Game(2, "game2")]
+    assert repr(games) == "[<Game 3, game3>, <Game 1, game1>, <Game 2, game2>]"
+    assert games[0] == Game(3, "x") and games[-1] == Game(2, "x")
+    assert Game(1, "x") in games and "not a game" not in games and [] not in games
+
+    games.remove(Game(1, "x"))
+    assert games == [Game(3, "game3"), Game(2, "game2")]
+    with pytest.raises(ValueError):
+        games.remove(Game(1, "x"))
+    games.discard(Game(1, "x"))
+
+    # replacing in place keeps the position
+    games[1] = Game(5, "game5")
+    assert games == (Game(3, "game3"), Game(5, "game5"))
+    assert pickle.loads(pickle.dumps(games)) == games
+
+    games.clear()
+    assert len(games) == 0 and list(games) == [] and games == []
+
+
+def test_review_hash_ignores_comment():
+    user = User("reviewer", "password1")
+    game = Game(1, "game")
+    review = Review(user, game, 5, "good")
+    assert review in OrderedSet([Review(user, game, 1, "good")])
+
+    # editing the comment doesn't lose the review
+    user.add_review(review)
+    review.comment = "better"
+    assert review in user.reviews
+
+
+def test_game_rating_totals():
+    game = Game(1, "game")
+    assert game.rating_count == 0 and game.average_rating == 0.0
+    assert game.rating_histogram == (0, 0, 0, 0, 0, 0)
+
+    first = Review(User("first", "password1"), game, 5, "good")
+    second = Review(User("second", "password1"), game, 2, "meh")
+    assert game.add_review(first) and game.add_review(second)
+    assert not game.add_review(first)
+    assert (game.rating_count, game.rating_sum) == (2, 7)
+    assert game.average_rating == 3.5
+    assert game.rating_histogram == (0, 0, 1, 0, 0, 1)
+
+    # editing a rating moves it in the histogram
+    second.rating = 4
+    assert (game.rating_count, game.rating_sum) == (2, 9)
+    assert game.rating_histogram == (0, 0, 0, 0, 1, 1)
+
+    # a review that wasn't added doesn't count
+    Review(User("third", "password1"), game, 1, "bad").rating = 0
+    assert game.rating_count == 2
+
+
+def test_search_keys():
+    assert search_key("Pokémon ÉDITION") == "pokemon edition"
+    assert search_key("STRASSE") == search_key("Straße")
+    assert search_key(None) == ""
+    # an already folded title is kept rather than copied
+    title = "portal 2"
+    assert search_key(title) is title
+
+    game = Game(1, "Élite Dangerous")
+    assert game.title_key == "elite dangerous"
+    game.title = "Half-Life"
+    assert game.title_key == "half-life"
+    assert game.publisher_key == ""
+    game.publisher = Publisher("Ubisoft Montréal")
+    assert game.publisher_key == "ubisoft montreal"
+    assert Genre("Acción").name_key == "accion"
+
+    # the key survives pickling, e.g. into a catalog snapshot
+    assert pickle.loads(pickle.dumps(game)).title_key == "half-life"
+
+
+def test_find_record_boundaries_respects_quoted_newlines():
+    data = b'AppID,About the game\n1,"line one\nline two"\n2,"say ""hi""\nthere"\n3,plain\n'
+    boundaries = find_record_boundaries(data, data.index(b'1,'), 10)
+
+    # every boundary lands at the start of a record, never inside a quoted field
+    assert boundaries[0] == data.index(b'1,')
+    assert boundaries[-1] == len(data)
+    for boundary in boundaries[1:-1]:
+        assert data[boundary:boundary + 2] in (b'2,', b'3,')
+
+
+def test_find_record_boundaries_in_a_mapped_file(tmp_path, monkeypatch):
+    data = b'AppID,About the game\n' + b''.join(b'%d,"line one\nsay ""hi""\n"\n' % app_id for app_id in range(200))
+    csv_path = tmp_path / "games.csv"
+    csv_path.write_bytes(data)
+    # quotes and newlines are counted a few bytes at a time
+    monkeypatch.setattr(csvdatareader, "COUNT_BLOCK_SIZE", 7)
+
+    with open(csv_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        boundaries = find_record_boundaries(mapped, data.index(b'0,'), 10)
+    assert boundaries == find_record_boundaries(data, data.index(b'0,'), 10)
+    assert len(boundaries) > 5
+    for boundary in boundaries[1:-1]:
+        assert data[boundary:].split(b',')[0].isdigit()
+
+
+def test_entity_registry():
+    registry = EntityRegistry()
+
+    # same name, same object
+    assert registry.genre("Action") is registry.genre(" Action ")
+    assert registry.publisher("Activision") is registry.publisher("Activision")
+    assert registry.genre("Action") is not registry.genre("Indie")
+
+    # interning returns the object that is already registered
+    assert registry.intern_genre(Genre("Action")) is registry.genre("Action")
+    assert registry.get_genre("Sports") is None
+    assert registry.get_publisher("Activision") == Publisher("Activision")
+
+    game = Game(1, "Domino House")
+    game.add_genre(Genre("Action"))
+    game.publisher = Publisher("Activision")
+    registry.intern_game(game)
+    assert game.genres[0] is registry.genre("Action")
+    assert game.publisher is registry.publisher("Activision")
+
+
+def test_csv_reader_shares_genres():
+    reader = create_csv_reader()
+    action = reader.registry.get_genre("Action")
+    action_games = [game for game in reader.dataset_of_games if Genre("Action") in game.genres]
+    assert all(action in game.genres and any(genre is action for genre in game.genres) for game in action_games)
@@ -1,7 +1,29 @@
 import pytest
-from games.domainmodel.model import Publisher, Genre, Game, User
-from games.adapters.repository.abstractrepo import populate
+from games.domainmodel.model import Publisher, Genre, Game, User, Review, Platform
+from games.adapters.repository.abstractrepo import populate, reload
+from games.adapters.datareader.incremental import IncrementalCSVReader
+from games.adapters.datareader.snapshot import SNAPSHOT_MAGIC, SNAPSHOT_VERSION, csv_fingerprint
+from games.adapters.datareader.textstore import TextStore
+from games.adapters.repository.memoryrepo import MemoryRepository
+from games.adapters.repository.userdirectory import BloomFilter, UserDirectory
+from games.adapters.repository.locking import ReadWriteLock
+from games.adapters.repository.activitylog import CHECKPOINT_MAGIC, ActivityLog
+import games.adapters.repository.abstractrepo as repo
+from games.authentication import services as auth_services
+from games.game import services as game_services
+from games.search import services as search_services
+from games.wishlist import services as wishlist_services
+from datetime import date, datetime
 from os.path import exists, join, dirname, abspath
+from threading import Barrier, Thread
+import errno
+import pickle
+import shutil
+import sys
+import time
+
+# found from this file rather than the working directory, so these run from anywhere
+CATALOG_CSV_PATH = join(dirname(dirname(dirname(abspath(__file__)))), 'games/adapters/data/games.csv')
 
 
 def test_add_genre_and_get_genre(empty_repo):
@@ -51,6 +73,27 @@ def test_add_game_and_get_games(empty_repo):
     assert sorted(empty_repo.get_games()) == sorted([Game(1, 'foo'), Game(2, 'bar')])
 
 
+def test_get_games_keeps_title_order(empty_repo):
+    for game_id, title in ((1, 'Zork'), (2, 'alpha'), (3, 'Échec'), (4, 'beta')):
+        empty_repo.add_game(Game(game_id, title))
+    games = empty_repo.get_games()
+    assert [game.title for game in games] == ['alpha', 'beta', 'Échec', 'Zork']
+
+    # a read only snapshot, later changes show up in the next one
+    with pytest.raises(TypeError):
+        games[0] = Game(5, 'aardvark')
+    empty_repo.add_game(Game(5, 'aardvark'))
+    assert games[0] == Game(2, 'alpha')
+    assert empty_repo.get_games()[0] == Game(5, 'aardvark')
+
+    # retitling a game moves it
+    empty_repo.update_game(Game(1, 'Act'))
+    assert [game.title for game in empty_repo.get_games()] == ['aardvark', 'Act', 'alpha', 'beta', 'Échec']
+    assert empty_repo.get_game_by_title('ACT') == Game(1, 'Act')
+    assert empty_repo.get_game_by_title('echec') == Game(3, 'Échec')
+    assert empty_repo.get_game_by_title('Zork') is None
+
+
 def test_get_game_by_id(empty_repo):
     empty_repo.add_game(Game(1, 'foo'))
     empty_repo.add_game(Game(2, 'bar'))
@@ -153,6 +196,452 @@ def test_add_user_and_get_user(empty_repo):
     assert empty_repo.get_user("James") == User(username="James", password="123456Abc!")
 
 
+def test_user_directory():
+    directory = UserDirectory()
+    for number in range(100):
+        assert directory.add(User(f"User{number:03}", "password1"))
+    assert not directory.add(User("user007", "password1"))
+    assert len(directory) == 100
+    assert directory.get(" USER042 ") is directory.get("user042")
+    assert "user099" in directory and "user100" not in directory
+
+    # exact in memory
+    assert all(directory.might_exist(f"user{number:03}") for number in range(100))
+    assert not directory.might_exist(42)
+    assert not any(directory.might_exist(f"someone{number}") for number in range(1000))
+
+    # ordered view for listing, re-sorted after a change
+    assert [user.username for user in directory.ordered()[:2]] == ["user000", "user001"]
+    directory.add(User("aaron", "password1"))
+    assert directory.ordered()[0].username == "aaron"
+
+
+def test_bloom_filter():
+    names = BloomFilter(capacity=1000, error_rate=0.01)
+    for number in range(1000):
+        names.add(f"name{number}")
+    assert all(names.might_contain(f"name{number}") for number in range(1000))
+    assert sum(names.might_contain(f"other{number}") for number in range(10000)) < 300
+
+
+def test_get_users_and_user_might_exist(empty_repo):
+    for username in ("zoe", "Adam", "mia"):
+        empty_repo.add_user(User(username, "password1"))
+    assert [user.username for user in empty_repo.get_users()] == ["adam", "mia", "zoe"]
+    assert empty_repo.user_might_exist("ADAM")
+    assert empty_repo.get_user("nobody") is None
+
+
+def test_read_write_lock():
+    lock = ReadWriteLock()
+    events = []
+
+    def write():
+        with lock.write():
+            events.append("write")
+
+    with lock.read(), lock.read():
+        writer = Thread(target=write)
+        writer.start()
+        writer.join(timeout=0.2)
+        # still waiting for the readers
+        assert events == []
+    writer.join()
+    assert events == ["write"]
+
+    # the writer can take it again, for reading too
+    with lock.write(), lock.write(), lock.read():
+        events.append("nested")
+    assert events == ["write", "nested"]
+
+
+def test_concurrent_registration_reviews_and_searches(monkeypatch):
+    in_memory_repo = MemoryRepository()
+    populate(CATALOG_CSV_PATH, in_memory_repo)
+    monkeypatch.setattr(repo, 'repo_instance', in_memory_repo)
+    thread_count = 8
+    rounds = 150
+    games = list(in_memory_repo.get_games()[:5])
+    start = Barrier(thread_count + 1)
+    # visitors keep in step, so they really do race for the same names and games
+    next_round = Barrier(thread_count - 1)
+    contested = []
+    errors = []
+
+    def visitor(number):
+        try:
+            start.wait()
+            for round_number in range(rounds):
+                next_round.wait()
+                username = f"visitor{number}x{round_number}"
+                auth_services.add_user(username, "Password123")
+                try:
+                    # every visitor tries to take this one
+                    auth_services.add_user(f"contested{round_number}", "Password123")
+                    contested.append(round_number)
+                except auth_services.NameNotUniqueException:
+                    pass
+                game = games[round_number % len(games)]
+                assert game_services.add_review(game, username, round_number % 5 + 1, "ok", in_memory_repo)
+                user = in_memory_repo.get_user(username)
+                wishlist_services.add_to_wishlist(game, user, in_memory_repo)
+                if round_number % 2:
+                    wishlist_services.remove_from_wishlist(game, user, in_memory_repo)
+                assert search_services.get_games_by_title(game.title, in_memory_repo)
+                search_services.get_games_by_genre("action", in_memory_repo)
+                search_services.get_games_by_tag("Indie", in_memory_repo)
+                len(list(game.reviews))
+        except Exception as error:
+            errors.append(error)
+
+    def reloader():
+        # a catalog writer, re-applying the same details like a reload does
+        try:
+            start.wait()
+            for round_number in range(rounds):
+                in_memory_repo.update_game(games[round_number % len(games)])
+        except Exception as error:
+            errors.append(error)
+
+    threads = [Thread(target=visitor, args=(number,)) for number in range(thread_count - 1)]
+    threads.append(Thread(target=reloader))
+    switch_interval = sys.getswitchinterval()
+    # switch threads far more often than usual, to make races likely
+    sys.setswitchinterval(1e-6)
+    try:
+        for thread in threads:
+            thread.start()
+        start.wait()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+    assert errors == []
+    assert sorted(contested) == list(range(rounds))
+    assert len(in_memory_repo.get_users()) == thread_count * rounds
+    for game in games:
+        # no review or rating lost to a race
+        assert game.rating_count == len(game.reviews)
+        assert game.rating_sum == sum(review.rating for review in game.reviews)
+    assert sum(len(game.reviews) for game in games) == (thread_count - 1) * rounds
+
+
+def test_catalog_versions(empty_repo):
+    for game_id, genre in ((1, 'Action'), (2, 'Puzzle')):
+        game = Game(game_id, f'game {game_id}')
+        game.add_genre(Genre(genre))
+        empty_repo.add_game(game)
+    before = empty_repo.catalog
+    assert before is empty_repo.catalog
+
+    game = Game(3, 'another')
+    game.add_genre(Genre('Action'))
+    empty_repo.add_game(game)
+    after = empty_repo.catalog
+    assert before.games == [Game(1, 'x'), Game(2, 'x')]
+    assert after.games == [Game(3, 'x'), Game(1, 'x'), Game(2, 'x')]
+    # lists the write didn't touch are shared
+    assert after.games_by_genre[Genre('Puzzle')] is before.games_by_genre[Genre('Puzzle')]
+    assert after.genres is before.genres
+
+    # a batch of writes is published once, as it ends
+    with empty_repo.batch_writes():
+        empty_repo.add_game(Game(4, 'batched'))
+        empty_repo.update_game(Game(1, 'renamed'))
+        assert empty_repo.catalog is after
+
+        # reading the catalog doesn't wait for the write in progress
+        read = []
+        reader = Thread(target=lambda: read.append(empty_repo.catalog))
+        reader.start()
+        reader.join(timeout=5)
+        assert read == [after]
+    assert [game.title for game in empty_repo.catalog.games] == ['another', 'batched', 'game 2', 'renamed']
+
+
+def test_reads_see_whole_versions_while_games_are_added(empty_repo):
+    added = 2000
+    errors = []
+
+    def writer():
+        for game_id in range(added):
+            empty_repo.add_game(Game(game_id, f'title {(game_id * 7919) % added:05}'))
+
+    def reader():
+        try:
+            while len(empty_repo.get_games()) < added:
+                games = empty_repo.get_games()
+                titles = [game.title for game in games]
+                assert len(titles) == len(games)
+                assert titles == sorted(titles)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [Thread(target=writer)] + [Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def make_catalog_repo() -> MemoryRepository:
+    return MemoryRepository(games=[Game(1, 'Myst'), Game(2, 'Zork'), Game(3, 'Doom')])
+
+
+def test_user_writes_the_log_refuses_are_not_made(tmp_path, monkeypatch):
+    repo = make_catalog_repo()
+    activity_log = ActivityLog(tmp_path / 'users.log', sync_interval=0)
+    repo.attach_activity_log(activity_log)
+    james = User('james', 'Password123')
+    repo.add_user(james)
+    myst = repo.get_game_by_id(1)
+    repo.add_to_wishlist(james, myst)
+
+    def disk_full(record):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(activity_log, 'append', disk_full)
+    with pytest.raises(OSError):
+        repo.add_user(User('ann', 'Password123'))
+    assert repo.get_user('ann') is None
+    with pytest.raises(OSError):
+        repo.add_users([User('ann', 'Password123')])
+    assert repo.get_user('ann') is None
+    with pytest.raises(OSError):
+        repo.add_review(Review(james, myst, 5, 'great'), james, myst)
+    assert list(james.reviews) == [] and list(myst.reviews) == [] and myst.rating_count == 0
+    with pytest.raises(OSError):
+        repo.add_to_wishlist(james, repo.get_game_by_id(2))
+    with pytest.raises(OSError):
+        repo.remove_from_wishlist(james, myst)
+    assert james.favourite_games == [myst]
+    monkeypatch.undo()
+    activity_log.close()
+
+
+def test_activity_log_leaves_nothing_of_a_failed_append(tmp_path, monkeypatch):
+    activity_log = ActivityLog(tmp_path / 'users.log', sync_interval=0)
+    activity_log.append({'op': 'user', 'user': 'james', 'password': 'Password123'})
+
+    # the line reaches the file, then the sync fails
+    def fsync_fails(fd):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr('games.adapters.repository.activitylog.os.fsync', fsync_fails)
+    with pytest.raises(OSError):
+        activity_log.append({'op': 'user', 'user': 'ann', 'password': 'Password123'})
+    monkeypatch.undo()
+
+    activity_log.append({'op': 'user', 'user': 'mia', 'password': 'Password123'})
+    activity_log.close()
+    reopened = ActivityLog(tmp_path / 'users.log', sync_interval=0)
+    assert [record['user'] for record in reopened.records()] == ['james', 'mia']
+    reopened.close()
+
+
+def test_activity_log_replays_user_data(tmp_path):
+    log_path = tmp_path / 'users.log'
+    repo = make_catalog_repo()
+    assert repo.attach_activity_log(ActivityLog(log_path, sync_interval=0)) == 0
+    user = User('James', 'Password123')
+    assert repo.add_user(user)
+    assert not repo.add_user(User('james', 'Password456'))
+    myst, zork = repo.get_game_by_id(1), repo.get_game_by_id(2)
+    review = Review(user, myst, 4, 'atmospheric')
+    repo.add_review(review, user, myst)
+    repo.add_to_wishlist(user, myst)
+    repo.add_to_wishlist(user, zork)
+    repo.remove_from_wishlist(user, myst)
+    repo.add_to_wishlist(user, zork)
+
+    # a restart: the catalog is loaded again, then the log replayed
+    restarted = make_catalog_repo()
+    activity_log = ActivityLog(log_path)
+    try:
+        assert restarted.attach_activity_log(activity_log) == 5
+        restored = restarted.get_user('james')
+        assert restored.password == 'Password123'
+        assert restored.favourite_games == [Game(2, 'x')]
+        [restored_review] = restored.reviews
+        assert (restored_review.rating, restored_review.comment, restored_review.time) == (4, 'atmospheric', review.time)
+        assert restarted.get_game_by_id(1).rating_count == 1
+
+        # and writes after the replay go on to the end of the log
+        restarted.add_user(User('mia', 'Password123'))
+    finally:
+        activity_log.close()
+    # and a line naming the log
+    assert len(log_path.read_text().splitlines()) == 7
+
+
+def test_activity_log_skips_a_torn_last_line(tmp_path):
+    log_path = tmp_path / 'users.log'
+    log_path.write_text('{"op":"user","user":"zoe","password":"Password123"}\n{"op":"user","us')
+    repo = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=0)
+    try:
+        assert repo.attach_activity_log(activity_log) == 1
+        repo.add_user(User('mia', 'Password123'))
+    finally:
+        activity_log.close()
+    # cut off before the new record was appended
+    assert log_path.read_text().splitlines()[1] == '{"op":"user","user":"mia","password":"Password123"}'
+
+
+def add_user_activity(repo: MemoryRepository, username: str):
+    user = User(username, 'Password123')
+    repo.add_user(user)
+    myst, zork = repo.get_game_by_id(1), repo.get_game_by_id(2)
+    repo.add_review(Review(user, myst, 5, 'classic'), user, myst)
+    repo.add_to_wishlist(user, myst)
+    repo.add_to_wishlist(user, zork)
+    repo.remove_from_wishlist(user, myst)
+
+
+def user_state(repo: MemoryRepository) -> list:
+    return [(user.username, [(review.game.game_id, review.rating, review.time) for review in user.reviews],
+             [game.game_id for game in user.favourite_games]) for user in repo.get_users()]
+
+
+def test_activity_log_checkpoint(tmp_path):
+    log_path = tmp_path / 'users.log'
+    repo = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=0)
+    repo.attach_activity_log(activity_log)
+    for username in ('ann', 'bob'):
+        add_user_activity(repo, username)
+    activity_log.checkpoint()
+    add_user_activity(repo, 'cat')
+    activity_log.close()
+
+    # the checkpoint keeps each user's final state, the log only what came after
+    assert len(log_path.read_text().splitlines()) == 1 + 5
+    restarted = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=0)
+    assert restarted.attach_activity_log(activity_log) == 2 * 3 + 5
+    assert user_state(restarted) == user_state(repo)
+
+    # a crash after the checkpoint was written but before the log it holds was removed
+    shutil.copy(log_path, tmp_path / 'sealed')
+    activity_log.checkpoint()
+    activity_log.close()
+    (tmp_path / 'sealed').replace(tmp_path / 'users.log.compacting')
+    restarted = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=0)
+    try:
+        restarted.attach_activity_log(activity_log)
+        assert not exists(tmp_path / 'users.log.compacting')
+        assert user_state(restarted) == user_state(repo)
+    finally:
+        activity_log.close()
+
+
+def test_activity_log_checkpoint_keeps_every_review_of_a_game(tmp_path):
+    log_path = tmp_path / 'users.log'
+    repo = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=0)
+    repo.attach_activity_log(activity_log)
+    user = User('ann', 'Password123')
+    repo.add_user(user)
+    myst = repo.get_game_by_id(1)
+    for rating, comment in ((5, 'classic'), (2, 'dated on replay'), (1, 'classic')):
+        repo.add_review(Review(user, myst, rating, comment), user, myst)
+    assert len(myst.reviews) == 2
+    activity_log.checkpoint()
+    activity_log.close()
+
+    restarted = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=0)
+    try:
+        restarted.attach_activity_log(activity_log)
+        restored = restarted.get_game_by_id(1)
+        assert [(review.rating, review.comment) for review in restored.reviews] == [
+            (5, 'classic'), (2, 'dated on replay')]
+        assert (restored.rating_count, restored.rating_sum) == (2, 7)
+    finally:
+        activity_log.close()
+
+
+def test_activity_log_reads_a_version_1_checkpoint(tmp_path):
+    log_path = tmp_path / 'users.log'
+    with open(f'{log_path}.snapshot', 'wb') as file:
+        file.write(CHECKPOINT_MAGIC)
+        pickle.dump((1, None), file)
+        pickle.dump({'ann': ['Password123', {1: (4, 'classic', None)}, {2: None}]}, file)
+
+    repo = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=0)
+    try:
+        assert repo.attach_activity_log(activity_log) == 3
+        ann = repo.get_user('ann')
+        assert [(review.game.game_id, review.rating, review.comment) for review in ann.reviews] == [
+            (1, 4, 'classic')]
+        assert ann.favourite_games == [Game(2, 'x')]
+    finally:
+        activity_log.close()
+
+
+def test_activity_log_checkpoints_in_the_background(tmp_path):
+    log_path = tmp_path / 'users.log'
+    repo = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=60, checkpoint_every=10)
+    try:
+        repo.attach_activity_log(activity_log)
+        for username in ('ann', 'bob', 'cat'):
+            add_user_activity(repo, username)
+        for _ in range(100):
+            if exists(activity_log.checkpoint_path):
+                break
+            time.sleep(0.05)
+        assert exists(activity_log.checkpoint_path)
+    finally:
+        activity_log.close()
+    restarted = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=0)
+    try:
+        restarted.attach_activity_log(activity_log)
+        assert user_state(restarted) == user_state(repo)
+    finally:
+        activity_log.close()
+
+
+def test_activity_log_keeps_working_after_a_failed_checkpoint(tmp_path, caplog):
+    log_path = tmp_path / 'users.log'
+    checkpoint_path = tmp_path / 'users.log.snapshot'
+    repo = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=0.01, checkpoint_every=2)
+    try:
+        repo.attach_activity_log(activity_log)
+        # a checkpoint the worker can't read, e.g. written by another program
+        checkpoint_path.write_bytes(b'not a checkpoint')
+        add_user_activity(repo, 'ann')
+        for _ in range(100):
+            if "Failed to checkpoint" in caplog.text:
+                break
+            time.sleep(0.05)
+        assert "is not a user data checkpoint" in caplog.text
+
+        # the worker is still there, the next checkpoint goes through
+        checkpoint_path.unlink()
+        add_user_activity(repo, 'bob')
+        for _ in range(100):
+            if exists(checkpoint_path):
+                break
+            time.sleep(0.05)
+        assert exists(checkpoint_path)
+    finally:
+        activity_log.close()
+    restarted = make_catalog_repo()
+    activity_log = ActivityLog(log_path, sync_interval=0)
+    try:
+        restarted.attach_activity_log(activity_log)
+        assert user_state(restarted) == user_state(repo)
+    finally:
+        activity_log.close()
+
+
 def test_add_publisher_and_get_publisher(empty_repo):
     # test garbage inputs
     assert empty_repo.add_publisher("") is False
@@ -169,6 +658,82 @@ def test_add_publisher_and_get_publisher(empty_repo):
     assert empty_repo.get_genres() == [Genre("paradox"), Genre("rock and stone"), ]
 
 
+def test_genre_and_publisher_indexes_follow_updates(empty_repo):
+    for game_id, title in ((1, 'Zork'), (2, 'alpha'), (3, 'Myst')):
+        game = Game(game_id, title)
+        game.add_genre(Genre('Adventure'))
+        game.publisher = Publisher('Infocom')
+        empty_repo.add_game(game)
+    adventures = empty_repo.get_games_by_genre(Genre('Adventure'))
+    # the old snapshot keeps its games, which are updated in place
+    assert [game.game_id for game in adventures] == [2, 3, 1]
+
+    # retitled and moved to another genre and publisher
+    changed = Game(1, 'Beyond Zork')
+    changed.add_genre(Genre('RPG'))
+    changed.publisher = Publisher('Activision')
+    empty_repo.update_game(changed)
+    # the old snapshot keeps its games, which are updated in place
+    assert [game.game_id for game in adventures] == [2, 3, 1]
+    assert [game.title for game in empty_repo.get_games_by_genre(Genre('Adventure'))] == ['alpha', 'Myst']
+    assert empty_repo.get_games_by_genre(Genre('RPG')) == [changed]
+    assert empty_repo.get_games_by_publisher(Publisher('Infocom')) == [Game(2, 'x'), Game(3, 'x')]
+    assert empty_repo.get_games_by_publisher(Publisher('Activision')) == [changed]
+
+
+def make_released_game(game_id: int, title: str, release_date: str) -> Game:
+    game = Game(game_id, title)
+    game.release_date = release_date
+    return game
+
+
+def test_get_games_by_release_range(empty_repo):
+    empty_repo.add_game(make_released_game(1, 'Myst', 'Sep 24, 1993'))
+    empty_repo.load_games([make_released_game(2, 'Doom', 'Dec 10, 1993'), Game(3, 'No date'),
+                           make_released_game(4, 'Alone in the Dark', 'Dec 10, 1993')])
+    empty_repo.add_game(make_released_game(5, 'Quake', 'Jun 22, 1996'))
+
+    # ordered by day then title, the end is exclusive and a time of day doesn't count
+    assert empty_repo.get_games_by_release_range(date(1993, 1, 1), date(1994, 1, 1)) == [
+        Game(1, 'x'), Game(4, 'x'), Game(2, 'x')]
+    assert empty_repo.get_games_by_release_range(date(1993, 12, 1), datetime(1993, 12, 10, 12)) == []
+    assert empty_repo.get_games_by_release_range(datetime(1993, 12, 10, 12), date(1993, 12, 11)) == [
+        Game(4, 'x'), Game(2, 'x')]
+    assert empty_repo.get_games_by_release_range(date(1994, 1, 1), date(1993, 1, 1)) == []
+    assert empty_repo.get_games_by_release_range('1993', '1994') == []
+
+    # follows a changed release date
+    empty_repo.update_game(make_released_game(1, 'Myst', 'Mar 01, 1996'))
+    assert empty_repo.get_games_by_release_range(date(1996, 1, 1), date(1997, 1, 1)) == [Game(1, 'x'), Game(5, 'x')]
+    assert empty_repo.get_games_by_release_range(date(1993, 1, 1), date(1994, 1, 1)) == [Game(4, 'x'), Game(2, 'x')]
+
+
+def test_bulk_add(empty_repo):
+    empty_repo.add_game(Game(5, 'Myst'))
+    games = empty_repo.get_games()
+
+    new_games = [Game(3, 'Civilization'), Game(1, 'alpha'), Game(5, 'duplicate id'), Game(2, 'Zork'), 'not a game']
+    for game in new_games[:2]:
+        game.add_genre(Genre('Strategy'))
+        game.publisher = Publisher('MicroProse')
+    assert empty_repo.load_games(new_games) == 3
+    assert empty_repo.load_games([Game(1, 'again')]) == 0
+
+    # sorted once at the end, views handed out before keep their snapshot
+    assert [game.title for game in games] == ['Myst']
+    assert [game.title for game in empty_repo.get_games()] == ['alpha', 'Civilization', 'Myst', 'Zork']
+    strategy = empty_repo.get_games_by_genre(Genre('Strategy'))
+    assert [game.title for game in strategy] == ['alpha', 'Civilization']
+    assert empty_repo.get_genres() == [Genre('Strategy')]
+    assert empty_repo.get_publisher('microprose') == Publisher('MicroProse')
+    assert empty_repo.get_game_by_title('zork').game_id == 2
+
+    assert empty_repo.add_games([Game(4, 'Beta'), Game(4, 'Beta again')]) == 1
+    assert empty_repo.add_users([User('James', '123456Abc!'), User('james', '123456Abc!')]) == 1
+    assert empty_repo.add_genres([Genre('RPG'), Genre('Action'), Genre('rpg')]) == 2
+    assert empty_repo.get_genres() == [Genre('Action'), Genre('RPG'), Genre('Strategy')]
+
+
 def test_populate(empty_repo):
     # test empty repo
     assert empty_repo.get_number_of_games() == 0
@@ -189,3 +754,273 @@ def test_populate(empty_repo):
 
     # test repo filled with imported data
     assert empty_repo.get_number_of_games() > 500
+
+
+def test_populate_from_snapshot(tmp_path):
+    source_data_path = CATALOG_CSV_PATH
+    csv_path = tmp_path / 'games.csv'
+    shutil.copy(source_data_path, csv_path)
+    snapshot_path = tmp_path / 'games.snapshot'
+
+    # first run parses the csv and writes the snapshot
+    repo = MemoryRepository([], [], [], [])
+    populate(csv_path, repo, snapshot_path=snapshot_path)
+    assert snapshot_path.exists()
+    assert repo.get_number_of_games() == 981
+
+    # second run loads the same catalog from the snapshot
+    parsed_repo = repo
+    repo = MemoryRepository([], [], [], [])
+    populate(csv_path, repo, snapshot_path=snapshot_path)
+    assert repo.get_number_of_games() == 981
+    assert repo.get_game_by_id(7940).publisher == Publisher("Activision")
+    assert len(repo.get_genres()) == 26
+    assert repo.get_game_by_id(7940).tags == parsed_repo.get_game_by_id(7940).tags
+    assert repo.get_games_by_tags(["fps"]) == parsed_repo.get_games_by_tags(["fps"])
+
+    # changing the csv makes the snapshot stale, so it is rebuilt
+    with open(csv_path, 'r', encoding='utf-8-sig') as file:
+        lines = file.readlines()
+    with open(csv_path, 'w', encoding='utf-8') as file:
+        file.writelines(lines[:1] + lines[2:])
+    repo = MemoryRepository([], [], [], [])
+    populate(csv_path, repo, snapshot_path=snapshot_path)
+    assert repo.get_number_of_games() == 980
+    assert repo.get_game_by_id(7940) is None
+
+    # so is one whose catalog doesn't hold what a snapshot should
+    with open(snapshot_path, 'wb') as file:
+        file.write(SNAPSHOT_MAGIC)
+        pickle.dump((SNAPSHOT_VERSION, csv_fingerprint(csv_path)), file)
+        pickle.dump({'games': []}, file)
+    repo = MemoryRepository([], [], [], [])
+    populate(csv_path, repo, snapshot_path=snapshot_path)
+    assert repo.get_number_of_games() == 980
+
+    # a missing csv leaves the repo empty, like populating without a snapshot
+    missing_snapshot_path = tmp_path / 'missing.snapshot'
+    repo = MemoryRepository([], [], [], [])
+    populate(tmp_path / 'missing.csv', repo, snapshot_path=missing_snapshot_path)
+    assert repo.get_number_of_games() == 0
+    assert not missing_snapshot_path.exists()
+
+
+def test_point_lookups_ignore_case(empty_repo):
+    empty_repo.add_genre(Genre('Acción'))
+    empty_repo.add_publisher(Publisher('Ubisoft Montréal'))
+    empty_repo.add_user(User('James', '123456Abc!'))
+    assert empty_repo.get_genre(' accion ') == Genre('Acción')
+    assert empty_repo.get_publisher('UBISOFT MONTREAL') == Publisher('Ubisoft Montréal')
+    assert empty_repo.get_user(' JAMES ') == User('james', '123456Abc!')
+    assert empty_repo.add_genre(Genre('ACCIÓN')) is False
+    assert empty_repo.get_genre(None) is None and empty_repo.get_publisher(42) is None
+
+    # listing games by genre or publisher ignores case and accents the same way
+    game = Game(4, 'Far Cry')
+    game.add_genre(Genre('Acción'))
+    game.publisher = Publisher('Ubisoft Montréal')
+    empty_repo.add_game(game)
+    assert empty_repo.get_games_by_genre(Genre('accion')) == [game]
+    assert empty_repo.get_games_by_publisher(Publisher('ubisoft montreal')) == [game]
+
+    # games sharing a title: the lowest id wins, the next one takes over when it's retitled
+    empty_repo.add_game(Game(3, 'Portal'))
+    empty_repo.add_game(Game(1, 'portal'))
+    empty_repo.add_game(Game(2, 'Doom'))
+    assert empty_repo.get_game_by_title('PORTAL').game_id == 1
+    empty_repo.update_game(Game(1, 'Portal 2'))
+    assert empty_repo.get_game_by_title('portal').game_id == 3
+    assert empty_repo.get_game_by_title('portal 2').game_id == 1
+    empty_repo.update_game(Game(2, 'Quake'))
+    assert empty_repo.get_game_by_title('doom') is None
+
+
+def test_genres_and_publishers_are_shared(empty_repo):
+    game1 = Game(1, 'foo')
+    game2 = Game(2, 'bar')
+    game1.add_genre(Genre('action'))
+    game2.add_genre(Genre('action'))
+    game1.publisher = Publisher('EA Games')
+    game2.publisher = Publisher('EA Games')
+
+    empty_repo.add_genre(Genre('action'))
+    empty_repo.add_game(game1)
+    empty_repo.add_game(game2)
+    empty_repo.add_publisher(Publisher('EA Games'))
+
+    # every game holds the repo's one genre and publisher object
+    genre = empty_repo.get_genre('action')
+    assert game1.genres[0] is genre
+    assert game2.genres[0] is genre
+    assert game1.publisher is game2.publisher
+    assert empty_repo.get_publisher('EA Games') is game1.publisher
+
+    # lookups with equal but separate objects still work
+    assert empty_repo.get_games_by_genre(Genre('action')) == [game2, game1]
+    assert empty_repo.get_games_by_publisher(Publisher('EA Games')) == [game2, game1]
+
+
+def test_reload_appended_and_changed_rows(tmp_path):
+    source_data_path = CATALOG_CSV_PATH
+    with open(source_data_path, 'r', encoding='utf-8-sig') as file:
+        lines = file.readlines()
+    csv_path = tmp_path / 'games.csv'
+    with open(csv_path, 'w', encoding='utf-8') as file:
+        file.writelines(lines[:11])
+
+    repo = MemoryRepository()
+    reader = IncrementalCSVReader(csv_path)
+
+    # first reload loads everything
+    assert reload(reader, repo) == 10
+    assert repo.get_number_of_games() == 10
+    offset = reader.offset
+
+    # nothing changed, nothing to do
+    assert reload(reader, repo) == 0
+
+    # only appended rows are read
+    with open(csv_path, 'a', encoding='utf-8') as file:
+        file.writelines(lines[11:16])
+    assert reload(reader, repo) == 5
+    assert reader.offset > offset
+    assert repo.get_number_of_games() == 15
+
+    # a half written row waits until it is complete
+    with open(csv_path, 'a', encoding='utf-8') as file:
+        file.write(lines[16][:40])
+    assert reload(reader, repo) == 0
+    with open(csv_path, 'a', encoding='utf-8') as file:
+        file.write(lines[16][40:])
+    assert reload(reader, repo) == 1
+    assert repo.get_number_of_games() == 16
+
+    # an appended row for a known game updates it in place, keeping its reviews
+    game = repo.get_game_by_id(7940)
+    user = User("james", "123456Abc!")
+    repo.add_user(user)
+    repo.add_review(Review(user, game, 5, "good"), user, game)
+    with open(csv_path, 'a', encoding='utf-8') as file:
+        file.write(lines[1].replace("Call of Duty® 4", "Call of Duty® 5"))
+    assert reload(reader, repo) == 1
+    assert repo.get_game_by_id(7940) is game
+    assert game.title == "Call of Duty® 5: Modern Warfare®"
+    assert len(game.reviews) == 1
+    assert repo.get_number_of_games() == 16
+
+    # a rewritten file is rescanned, and only the rows that changed are loaded
+    with open(csv_path, 'w', encoding='utf-8') as file:
+        file.writelines([lines[0], lines[1].replace("Call of Duty® 4", "Call of Duty® 6")] + lines[2:17])
+    assert reload(reader, repo) == 1
+    assert game.title == "Call of Duty® 6: Modern Warfare®"
+    assert repo.get_number_of_games() == 16
+
+
+def test_reload_loads_new_games_in_one_batch(tmp_path, monkeypatch, capsys):
+    with open(CATALOG_CSV_PATH, 'r', encoding='utf-8-sig') as file:
+        lines = file.readlines()
+    csv_path = tmp_path / 'games.csv'
+    with open(csv_path, 'w', encoding='utf-8') as file:
+        file.writelines(lines[:11])
+
+    repo = MemoryRepository()
+    reader = IncrementalCSVReader(csv_path)
+    batches = []
+    load_games = repo.load_games
+    monkeypatch.setattr(repo, 'load_games', lambda games, *args: batches.append(len(games)) or load_games(games))
+    monkeypatch.setattr(repo, 'add_game', lambda game: pytest.fail("games are loaded in a batch"))
+
+    assert reload(reader, repo) == 10
+    assert batches == [10]
+    assert repo.get_number_of_games() == 10
+
+    # a game appended twice in one read is added, then updated by the later row,
+    # and an invalid row is reported like a populate() reports it
+    with open(csv_path, 'a', encoding='utf-8') as file:
+        file.writelines([lines[11], lines[11].replace(",Action,", ",Indie,", 1), "not,a,game\n"])
+    assert reload(reader, repo) == 2
+    assert batches == [10, 1]
+    game_id = int(lines[11].split(',')[0])
+    assert [genre.genre_name for genre in repo.get_game_by_id(game_id).genres] == ["Indie"]
+    assert reader.rows_read == 3 and reader.rows_rejected == 1
+    assert f"Skipped 1 of 3 rows in {csv_path}" in capsys.readouterr().out
+
+
+def test_reload_after_loading_a_snapshot(tmp_path):
+    source_data_path = CATALOG_CSV_PATH
+    with open(source_data_path, 'r', encoding='utf-8-sig') as file:
+        lines = file.readlines()
+    csv_path = tmp_path / 'games.csv'
+    with open(csv_path, 'w', encoding='utf-8') as file:
+        file.writelines(lines[:11])
+
+    repo = MemoryRepository()
+    reader = IncrementalCSVReader(csv_path)
+    reader.skip_existing()
+    populate(csv_path, repo, snapshot_path=tmp_path / 'games.snapshot')
+    assert repo.get_number_of_games() == 10
+
+    # the rows the snapshot loaded aren't read again, appended ones are
+    assert reload(reader, repo) == 0
+    with open(csv_path, 'a', encoding='utf-8') as file:
+        file.writelines(lines[11:13])
+    assert reload(reader, repo) == 2
+    assert repo.get_number_of_games() == 12
+
+
+def test_populate_with_lazy_descriptions():
+    in_memory_repo = MemoryRepository()
+    populate(CATALOG_CSV_PATH, in_memory_repo)
+    repo = MemoryRepository()
+    store = TextStore()
+    populate(CATALOG_CSV_PATH, repo, text_store=store)
+
+    # descriptions live in the store, and read back the same as when kept in memory
+    assert len(store) > 0
+    for game in repo.get_games():
+        assert game.description == in_memory_repo.get_game_by_id(game.game_id).description
+
+    # setting a plain description replaces the stored one
+    game = repo.get_game_by_id(7940)
+    game.description = "new description"
+    assert game.description == "new description"
+    store.close()
+
+
+def test_text_store():
+    store = TextStore()
+    first = store.add("first text")
+    assert first.resolve() == "first text"
+
+    # texts added after a read are mapped in when they're read
+    second = store.add("второй")
+    assert second.resolve() == "второй"
+    assert first.resolve() == "first text"
+
+    store.close()
+    with pytest.raises(ValueError):
+        first.resolve()
+
+
+def test_get_games_by_tags():
+    in_memory_repo = MemoryRepository()
+    populate(CATALOG_CSV_PATH, in_memory_repo)
+    games = in_memory_repo.get_games()
+
+    # same answer as a full scan
+    expected = [game for game in games
+                if any(tag.lower() == "puzzle" for tag in game.tags) and Platform.LINUX in game.platforms]
+    assert len(expected) > 0
+    assert in_memory_repo.get_games_by_tags(["puzzle"], Platform.LINUX) == expected
+    assert in_memory_repo.get_games_by_tags(["no such tag"]) == []
+    assert in_memory_repo.get_games_by_tags([], Platform.MAC) == [game for game in games
+                                                                   if Platform.MAC in game.platforms]
+
+    # updating a game moves it between index buckets
+    game = expected[0]
+    changed = Game(game.game_id, game.title)
+    changed.tags = ["Racing"]
+    changed.platforms = Platform.WINDOWS
+    in_memory_repo.update_game(changed)
+    assert game not in in_memory_repo.get_games_by_tags(["puzzle"], Platform.LINUX)
+    assert game in in_memory_repo.get_games_by_tags(["racing"])
@@ -23,6 +23,8 @@ def default_game_list():
         game.add_genre(Genre(f"genre{i % 5}"))
         game.publisher = Publisher(f"publisher{i % 5}")
         game.release_date = f"Jun {random.randint(1, 29)}, {1980 + i % 40}"
+        game.tags = [f"tag{i % 3}", "Indie"]
+        game.platforms = Platform.WINDOWS | (Platform.LINUX if i % 2 == 0 else 0)
         game_list.append(game)
 
     return game_list
@@ -39,6 +41,9 @@ def test_get_games_by_title(new_repo):
     # test retrieving games by supplying partial keywords
     assert len(get_games_by_title('e1', new_repo)) > 1
 
+    # accents are ignored
+    assert len(get_games_by_title('GÁME1', new_repo)) == 11
+
     # test supplying wrong data type
     assert len(get_games_by_title(3.14, new_repo)) == 0
 
@@ -63,6 +68,10 @@ def test_get_games_by_year(new_repo):
     assert len(get_games_by_year('2010', new_repo)) > 0
     assert len(get_games_by_year(2010, new_repo)) > 0
 
+    # the same games a scan would find, listed alphabetically
+    expected = [game for game in new_repo.get_games() if game.release_date.year == 2010]
+    assert get_games_by_year('2010', new_repo) == expected
+
     # test supplying rubbish input
     assert len(get_games_by_year('1890', new_repo)) == 0
     assert len(get_games_by_year('foo', new_repo)) == 0
@@ -93,3 +102,23 @@ def test_get_games_by_genre(new_repo):
     # test supplying wrong data type
     # arguments are expected to be automatically converted into strings
     assert len(get_games_by_genre(2234234324, new_repo)) == 0
+
+
+def test_get_games_by_tag(new_repo):
+    # every game has to have all the tags
+    assert len(get_games_by_tag('indie', new_repo)) == GAME_LIST_SIZE
+    assert len(get_games_by_tag('Tag1, INDIE', new_repo)) == len(range(1, GAME_LIST_SIZE, 3))
+    assert get_games_by_tag('tag1,tag2', new_repo) == []
+
+    # platform narrows it down further
+    linux_games = get_games_by_tag('tag1', new_repo, 'linux')
+    assert [game.game_id for game in linux_games] == sorted(
+        [i for i in range(GAME_LIST_SIZE) if i % 3 == 1 and i % 2 == 0], key=lambda i: f"game{i}")
+    assert len(get_games_by_tag('', new_repo, 'Windows')) == GAME_LIST_SIZE
+    assert get_games_by_tag('tag1', new_repo, 'mac') == []
+
+    # rubbish input
+    assert get_games_by_tag('no such tag', new_repo) == []
+    assert get_games_by_tag('tag1', new_repo, 'amiga') == []
+    assert get_games_by_tag('', new_repo) == []
+    assert get_games_by_tag(None, new_repo) == []
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy.orm import clear_mappers
+
+import config
+import games.adapters.repository.abstractrepo as repo
+from games import create_app
+from tests_db.conftest import TEST_DATA_PATH_DATABASE_LIMITED
+
+
+@pytest.fixture
+def database_app(tmp_path, monkeypatch):
+    clear_mappers()
+    monkeypatch.setattr(config.Config, 'REPOSITORY', 'database')
+    monkeypatch.setattr(config.Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'games.db'}")
+    monkeypatch.setattr(config.Config, 'CATALOG_LOAD_ON_STARTUP', False)
+    yield create_app()
+    repo.repo_instance.close_session()
+    clear_mappers()
+
+
+def test_catalog_load(database_app, tmp_path):
+    # the app starts with an empty catalog
+    assert repo.repo_instance.get_number_of_games() == 0
+
+    runner = database_app.test_cli_runner()
+    result = runner.invoke(args=['catalog', 'load', '--path', str(TEST_DATA_PATH_DATABASE_LIMITED),
+                                 '--batch-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert "7 new games, 0 updated, 0 rejected rows" in result.output
+    assert "rows/sec" in result.output
+    assert repo.repo_instance.get_number_of_games() == 7
+
+    # loading again only updates what's there when asked to
+    result = runner.invoke(args=['catalog', 'load', '--path', str(TEST_DATA_PATH_DATABASE_LIMITED)])
+    assert "0 new games, 0 updated" in result.output
+    result = runner.invoke(args=['catalog', 'load', '--path', str(TEST_DATA_PATH_DATABASE_LIMITED), '--refresh'])
+    assert "0 new games, 0 updated" in result.output
+
+    # a refresh only rewrites the games that changed
+    changed_path = tmp_path / 'changed.csv'
+    changed_path.write_text(TEST_DATA_PATH_DATABASE_LIMITED.read_text(encoding='utf-8-sig')
+                            .replace("Red Veil", "Blue Veil"), encoding='utf-8')
+    result = runner.invoke(args=['catalog', 'load', '--path', str(changed_path), '--refresh'])
+    assert "0 new games, 1 updated" in result.output
+    assert repo.repo_instance.get_game_by_id(311120).title == "The Stalin Subway: Blue Veil"
+    assert repo.repo_instance.get_number_of_games() == 7
+
+    result = runner.invoke(args=['catalog', 'load', '--batch-size', '0'])
+    assert result.exit_code != 0
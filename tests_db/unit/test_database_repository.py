@@ -1,4 +1,9 @@
+from datetime import date, datetime
+
+from sqlalchemy import text
+
 from games.adapters.repository.databaserepo import DatabaseRepository
+from games.domainmodel.model import Platform, User
 from tests_db.unit.test_orm import make_game, make_user, make_genre, make_review, make_publisher
 
 
@@ -13,6 +18,18 @@ def test_add_and_get_user(session_factory):
 
     # test getting non-existent user
     assert repo.get_user('some user') is None
+    assert repo.get_users() == [user]
+
+    # the Bloom filter of usernames has no false negatives
+    assert repo.user_might_exist(user.username.upper())
+    other = make_user()
+    assert repo.add_user(other) is True
+    assert repo.user_might_exist(other.username)
+    assert sum(repo.user_might_exist(f'nobody{number}') for number in range(1000)) < 50
+
+    # a taken name isn't overwritten
+    assert repo.add_user(User(user.username, 'another password')) is False
+    assert repo.get_user(user.username).password == user.password
 
 def test_get_and_add_genre(session_factory):
     repo = DatabaseRepository(session_factory)
@@ -72,3 +89,81 @@ def test_add_review(session_factory):
     repo.add_review(review, user, game)
     assert review in game.reviews
     assert review in user.reviews
+    assert list(user.reviews) == [review]
+
+
+def test_rating_totals_are_stored(session_factory):
+    repo = DatabaseRepository(session_factory)
+    users = [make_user(), make_user()]
+    for user in users:
+        repo.add_user(user)
+    first, second = (repo.get_user(user.username) for user in users)
+    game = repo.get_games()[0]
+    assert (game.rating_count, game.rating_sum) == (0, 0)
+
+    review = make_review(first, game, r=4)
+    repo.add_review(review, first, game)
+    review.rating = 2
+    repo.add_review(make_review(second, game, r=5), second, game)
+
+    stored = DatabaseRepository(session_factory).get_game_by_id(game.game_id)
+    assert (stored.rating_count, stored.rating_sum) == (2, 7)
+    assert stored.rating_histogram == (0, 0, 1, 0, 0, 1)
+    assert len(stored.reviews) == 2
+
+
+def test_get_games_by_release_range(session_factory):
+    repo = DatabaseRepository(session_factory)
+    games = repo.get_games()
+
+    # the answer a full scan would give
+    expected = sorted((game for game in games if game.release_date.year == 2010),
+                      key=lambda game: (game.release_date, game.title.lower(), game.game_id))
+    assert len(expected) > 0
+    assert repo.get_games_by_release_range(date(2010, 1, 1), datetime(2011, 1, 1, 12)) == expected
+    assert repo.get_games_by_release_range(date(2011, 1, 1), date(2010, 1, 1)) == []
+    assert repo.get_games_by_release_range('2010', '2011') == []
+
+
+def test_get_games_by_tags(session_factory):
+    repo = DatabaseRepository(session_factory)
+    games = repo.get_games()
+
+    # the answer a full scan would give
+    expected = sorted(
+        (game for game in games
+         if any(tag.lower() == "puzzle" for tag in game.tags) and Platform.LINUX in game.platforms),
+        key=lambda game: game.title.lower())
+    assert len(expected) > 0
+    assert repo.get_games_by_tags(["PuZZle"], Platform.LINUX) == expected
+
+    # whole tags only, "puzz" is not "puzzle"
+    assert repo.get_games_by_tags(["puzz"]) == []
+    assert repo.get_games_by_tags(["no such tag"]) == []
+
+    # wildcards in a tag are matched literally
+    assert repo.get_games_by_tags(["puzz_e"]) == []
+    assert repo.get_games_by_tags(["%"]) == []
+
+    # a new or updated game's tags are found straight away
+    game = make_game()
+    game.tags = ["Brand New Tag"]
+    game.platforms = Platform.MAC | Platform.LINUX
+    repo.add_game(game)
+    assert repo.get_games_by_tags(["brand new tag"], Platform.LINUX) == [game]
+    assert repo.get_games_by_tags(["brand new tag"], Platform.WINDOWS) == []
+    updated = make_game(game.game_id, game.title)
+    updated.tags = ["Another Tag"]
+    repo.update_game(updated)
+    assert repo.get_games_by_tags(["brand new tag"]) == []
+    assert [tagged.game_id for tagged in repo.get_games_by_tags(["another tag"])] == [game.game_id]
+
+
+def test_get_games_by_tags_uses_the_indexes(session_factory):
+    with session_factory() as session:
+        plan = " ".join(str(row[-1]) for row in session.execute(text(
+            'EXPLAIN QUERY PLAN SELECT gameID FROM "Game" WHERE platforms IN (4, 5, 6, 7) '
+            'AND gameID IN (SELECT gameID FROM "GameTag" WHERE tag = \'puzzle\')')))
+    # looked up through the tag or platforms index, never a scan of every game
+    assert "SCAN Game" not in plan
+    assert "ix_GameTag_tag" in plan or "ix_Game_platforms" in plan
@@ -4,13 +4,14 @@ import datetime
 
 from sqlalchemy.exc import IntegrityError
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, clear_mappers, sessionmaker
 
-from sqlalchemy import select, insert
+from sqlalchemy import create_engine, inspect, select, insert
 
 from sqlalchemy.sql import text
 
-from games.domainmodel.model import User, Game, Review, Publisher, Genre
+from games.domainmodel.model import User, Game, Review, Publisher, Genre, Platform
+from games.adapters.repository.orm import map_model_to_tables, metadata, upgrade_schema
 
 import games.domainmodel.model
 
@@ -296,3 +297,69 @@ def test_saving_of_review(empty_session):
     # verify that the Review table is updated correctly
     rows = list(empty_session.execute(text('SELECT username, gameID FROM Review')))
     assert rows == [(review1.user.username, review1.game.game_id), ]
+
+
+def test_slots_survive_clear_mappers(empty_session):
+    # mapped games keep their attributes in the instance dict, where SQLAlchemy puts them
+    game = make_game()
+    empty_session.add(game)
+    empty_session.commit()
+    assert empty_session.get(Game, game.game_id).title == game.title
+
+    # once unmapped, games go back to keeping them in slots
+    clear_mappers()
+    unmapped_game = Game(1, "game")
+    assert unmapped_game.title == "game"
+    assert unmapped_game.__dict__ == {}
+
+
+def test_upgrade_schema_adds_missing_columns():
+    # a Game table as the first version of the app created it
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text(
+            'CREATE TABLE "Game" (gameID INTEGER PRIMARY KEY, title VARCHAR(128) NOT NULL, '
+            'price NUMERIC(10, 2) NOT NULL, releaseDate DATE NOT NULL, description TEXT, '
+            'imageURL VARCHAR(255), websiteURL VARCHAR(255), publisherName VARCHAR(64))'))
+        connection.execute(text(
+            'CREATE TABLE "Review" (username VARCHAR(64), gameID INTEGER, rating SMALLINT NOT NULL, '
+            'comment TEXT, timestamp DATETIME NOT NULL, PRIMARY KEY (username, gameID))'))
+        connection.execute(text(
+            "INSERT INTO \"Game\" (gameID, title, price, releaseDate) VALUES (1, 'old game', 1.5, '2020-01-01')"))
+        connection.execute(text(
+            "INSERT INTO \"Review\" (username, gameID, rating, timestamp) "
+            "VALUES ('user1', 1, 4, '2020-01-02 00:00:00'), ('user2', 1, 5, '2020-01-03 00:00:00')"))
+
+    added = upgrade_schema(engine)
+    assert 'Game.tags' in added and 'Game.platforms' in added
+    assert {index['name'] for index in inspect(engine).get_indexes('Game')} == {
+        'ix_Game_releaseDate', 'ix_Game_platforms'}
+    assert upgrade_schema(engine) == []
+
+    # the old rows read back with empty new details
+    clear_mappers()
+    map_model_to_tables()
+    with sessionmaker(bind=engine)() as session:
+        game = session.get(Game, 1)
+        assert game.title == 'old game'
+        assert game.tags == () and game.platforms == Platform(0)
+        # the reviews already stored are counted
+        assert (game.rating_count, game.rating_sum) == (2, 9)
+        assert game.rating_histogram == (0, 0, 0, 0, 1, 1)
+
+
+def test_upgrade_schema_indexes_stored_tags():
+    # a database from before the GameTag table, its games' tags only in the tags column
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text('DROP TABLE "GameTag"'))
+        connection.execute(text(
+            "INSERT INTO \"Game\" (gameID, title, price, releaseDate, tags) "
+            "VALUES (1, 'old game', 1.5, '2020-01-01', '\nFPS\nAction\nfps\n'), "
+            "(2, 'untagged game', 1.5, '2020-01-01', NULL)"))
+
+    assert upgrade_schema(engine) == []
+    with engine.connect() as connection:
+        rows = connection.execute(text('SELECT gameID, tag FROM "GameTag" ORDER BY tag')).all()
+    assert [tuple(row) for row in rows] == [(1, 'action'), (1, 'fps')]
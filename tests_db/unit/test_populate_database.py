@@ -1,13 +1,19 @@
+import pytest
 from sqlalchemy import select, inspect
+from sqlalchemy.orm import sessionmaker
 
+from games.adapters.datareader.csvdatareader import GameFileCSVReader
+from games.adapters.repository.databaserepo import DatabaseRepository
 from games.adapters.repository.orm import metadata
+from games.domainmodel.model import Publisher, Platform
+from tests_db.conftest import TEST_DATA_PATH_DATABASE_FULL
 
 
 def test_database_populate_inspect_table_names(database_engine):
     # Get table information
     inspector = inspect(database_engine)
     assert sorted(inspector.get_table_names()) == sorted(
-        ['User', 'Review', 'Game', 'Genre', 'Publisher', 'GameGenre', 'Wishlist'])
+        ['User', 'Review', 'Game', 'Genre', 'Publisher', 'GameGenre', 'GameTag', 'Wishlist'])
 
 
 def test_database_populate_select_all_games(database_engine):
@@ -41,3 +47,28 @@ def test_database_populate_select_all_genres(database_engine):
             all_genre_names.append(row[0])
 
         assert 'Action' in all_genre_names
+
+
+def test_database_bulk_load_in_batches(empty_session):
+    repo = DatabaseRepository(sessionmaker(bind=empty_session.get_bind()))
+    games = list(GameFileCSVReader(TEST_DATA_PATH_DATABASE_FULL).iter_games())
+
+    # batches smaller than the file still load every game, genre and publisher once
+    game_ids = {game.game_id for game in games}
+    assert repo.load_games(games, batch_size=64) == len(game_ids)
+    assert repo.get_number_of_games() == len(game_ids)
+    assert len(repo.get_genres()) == len({genre for game in games for genre in game.genres})
+
+    # loaded games read back like ones added through the ORM
+    game = repo.get_game_by_id(7940)
+    assert game.title == "Call of Duty® 4: Modern Warfare®"
+    assert game.publisher == Publisher("Activision")
+    assert game.tags[:3] == ("FPS", "Action", "Multiplayer")
+    assert game.platforms == Platform.WINDOWS | Platform.MAC
+
+    # loading again leaves stored rows alone
+    assert repo.load_games(games, batch_size=1000) == 0
+    assert repo.get_number_of_games() == len(game_ids)
+
+    with pytest.raises(ValueError):
+        repo.load_games(games, batch_size=0)